@@ -3,6 +3,9 @@ import streamlit as st
 from config import Config
 # --- CORRECTION : Mise à jour des modules importés ---
 from modules import studio, gallery, ai_chat, importer
+from utils.fs_watcher import start_fs_watcher
+from utils.http_client import get_http_client
+from utils.job_worker import start_job_worker
 
 # --- Initialisation et Vérification ---
 Config.initialize_project()
@@ -26,6 +29,11 @@ except Exception as e:
     st.error(f"Erreur de configuration : {e}")
     st.stop()
 
+# Surveillance des sorties, de la galerie et des modèles (une seule fois par processus)
+start_fs_watcher()
+# La file de génération avance en arrière-plan, quelle que soit la page affichée
+start_job_worker()
+
 # --- Barre Latérale et Nouvelle Navigation ---
 with st.sidebar:
     st.title("🪄 Zenith Pro")
@@ -42,6 +50,12 @@ with st.sidebar:
         st.session_state['page'] = choice
         st.rerun()
 
+    if http_stats := get_http_client().stats():
+        with st.expander("🌐 Réseau", expanded=False):
+            for endpoint, s in http_stats.items():
+                st.caption(f"`{endpoint}` · {s['calls']} appel(s) · {s['avg_ms']:.0f} ms moy. · max {s['max_ms']:.0f} ms"
+                           + (f" · ⚠️ {s['errors']} erreur(s), {s['retries']} retry" if s['errors'] else ""))
+
 # --- Routage des pages mis à jour ---
 if st.session_state['page'] == "Studio":
     studio.render()
@@ -13,18 +13,84 @@ class Config:
     WF_DIR = PROJECT_ROOT / "workflows" / "API"
     LOG_DIR = PROJECT_ROOT / "logs"
     HIDDEN_FILES_DB = LOG_DIR / ".hidden_images.json"
+    GALLERY_INDEX_DB = LOG_DIR / "gallery_index.sqlite3"
+    THUMBNAIL_DIR = LOG_DIR / "thumbnails"
+    JOB_STORE_DB = LOG_DIR / "jobs.sqlite3"
+    SWEEP_DIR = LOG_DIR / "sweeps"
+    RESULT_CACHE_DB = LOG_DIR / "result_cache.sqlite3"
+    MODEL_INVENTORY_DB = LOG_DIR / "model_inventory.sqlite3"
+    MODEL_METADATA_DB = LOG_DIR / "model_metadata.sqlite3"
     
     # --- NOUVEAU : Dossier pour les configurations sauvegardées ---
     PRESETS_DIR = PROJECT_ROOT / "presets"
 
     # --- Configuration externe depuis .env ---
     BASE_PATH_STR = os.getenv("COMFYUI_BASE_PATH")
-    COMFYUI_URL = os.getenv("COMFYUI_URL", "http://127.0.0.1:8188")
+    # Plusieurs instances (une par GPU/machine), séparées par des virgules ; la première est l'instance locale
+    COMFYUI_URLS = [u.strip().rstrip("/") for u in os.getenv("COMFYUI_URLS", os.getenv("COMFYUI_URL", "http://127.0.0.1:8188")).split(",") if u.strip()]
+    COMFYUI_URL = COMFYUI_URLS[0]
+    BACKEND_CHECK_INTERVAL = float(os.getenv("BACKEND_CHECK_INTERVAL", "5"))
     GALLERY_PATH_STR = os.getenv("GALLERY_PATH")
     LOCAL_STORAGE_PATH_STR = os.getenv("LOCAL_STORAGE_PATH")
+    # Récupération des images générées : "auto" (disque si présent, sinon HTTP), "local" ou "http"
+    OUTPUT_RETRIEVAL = os.getenv("COMFYUI_OUTPUT_RETRIEVAL", "auto").lower()
     OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/chat")
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
 
+    # --- Galerie ---
+    GALLERY_PAGE_SIZE = int(os.getenv("GALLERY_PAGE_SIZE", "24"))
+    THUMBNAIL_SIZES = tuple(int(s) for s in os.getenv("THUMBNAIL_SIZES", "256,512").split(","))
+    THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+    # --- Inventaire des modèles (sous-dossiers de models/) ---
+    MODEL_TYPES = tuple(t.strip() for t in os.getenv("MODEL_TYPES", "checkpoints,loras,vae,embeddings,controlnet,upscale_models").split(",") if t.strip())
+    MODEL_INVENTORY_CHECK_INTERVAL = float(os.getenv("MODEL_INVENTORY_CHECK_INTERVAL", "10"))
+    # Lecture des en-têtes safetensors (architecture, rang des LoRA) en arrière-plan
+    MODEL_METADATA_WORKERS = int(os.getenv("MODEL_METADATA_WORKERS", "4"))
+
+    # --- Surveillance des dossiers (inotify via watchdog, polling sinon ou pour les montages réseau) ---
+    FS_WATCH_POLL_INTERVAL = float(os.getenv("FS_WATCH_POLL_INTERVAL", "2"))
+    FS_WATCH_FORCE_POLLING = os.getenv("FS_WATCH_FORCE_POLLING", "").lower() in ("1", "true", "yes")
+    GALLERY_NOTIFY_INTERVAL = float(os.getenv("GALLERY_NOTIFY_INTERVAL", "3"))
+    # Distances de Hamming maximales (sur 64 bits) entre empreintes perceptuelles
+    SIMILARITY_MAX_DISTANCE = int(os.getenv("SIMILARITY_MAX_DISTANCE", "12"))
+    DUPLICATE_MAX_DISTANCE = int(os.getenv("DUPLICATE_MAX_DISTANCE", "6"))
+
+    # --- File de génération (worker de fond) ---
+    JOB_WORKER_INTERVAL = float(os.getenv("JOB_WORKER_INTERVAL", "0.5"))
+    JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "50"))
+    # Rafraîchissement du panneau de file (fragment Streamlit, indépendant du reste de la page Studio)
+    QUEUE_REFRESH_INTERVAL = float(os.getenv("QUEUE_REFRESH_INTERVAL", "1"))
+    # Aperçus latents (ComfyUI lancé avec --preview-method auto) : cadence max par travail et nombre de travaux gardés
+    PREVIEW_FPS = float(os.getenv("PREVIEW_FPS", "2"))
+    PREVIEW_MAX_JOBS = int(os.getenv("PREVIEW_MAX_JOBS", "16"))
+    # Miniatures des résultats affichées par la file : taille et budget mémoire partagé par toutes les sessions
+    QUEUE_THUMBNAIL_SIZE = int(os.getenv("QUEUE_THUMBNAIL_SIZE", "160"))
+    QUEUE_SHEET_PREVIEW_SIZE = int(os.getenv("QUEUE_SHEET_PREVIEW_SIZE", "1024"))
+    QUEUE_THUMBNAIL_CACHE_MB = int(os.getenv("QUEUE_THUMBNAIL_CACHE_MB", "32"))
+    # Contrôle d'admission AIMD : travaux en parallèle par instance, ajustés entre MIN et MAX
+    ADMISSION_INITIAL = int(os.getenv("ADMISSION_INITIAL", "2"))
+    ADMISSION_MIN = int(os.getenv("ADMISSION_MIN", "1"))
+    ADMISSION_MAX = int(os.getenv("ADMISSION_MAX", "8"))
+    ADMISSION_TARGET_BACKLOG = int(os.getenv("ADMISSION_TARGET_BACKLOG", "1"))   # prompts prêts derrière celui en cours
+    ADMISSION_MAX_BACKLOG = int(os.getenv("ADMISSION_MAX_BACKLOG", "3"))
+    ADMISSION_MIN_VRAM_FREE = float(os.getenv("ADMISSION_MIN_VRAM_FREE", "0.10"))  # fraction de VRAM libre
+    ADMISSION_MAX_RAM = float(os.getenv("ADMISSION_MAX_RAM", "90"))                # % de RAM locale
+    ADMISSION_LATENCY_FACTOR = float(os.getenv("ADMISSION_LATENCY_FACTOR", "2.5"))
+    SWEEP_MAX_JOBS = int(os.getenv("SWEEP_MAX_JOBS", "256"))
+    # Images max par soumission quand des travaux ne diffèrent que par la seed (1 = pas de regroupement)
+    COALESCE_MAX_BATCH = int(os.getenv("COALESCE_MAX_BATCH", "8"))
+    # Affinité de modèles : travaux en file examinés, et dépassements tolérés avant de repasser en tête (0 = FIFO strict)
+    AFFINITY_WINDOW = int(os.getenv("AFFINITY_WINDOW", "32"))
+    AFFINITY_MAX_BYPASS = int(os.getenv("AFFINITY_MAX_BYPASS", "4"))
+    # Cache de résultats : références aux images déjà produites (les fichiers eux-mêmes ne sont jamais supprimés)
+    RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "2048"))
+    RESULT_CACHE_MAX_AGE_DAYS = float(os.getenv("RESULT_CACHE_MAX_AGE_DAYS", "30"))
+
+    # --- Réseau (client HTTP partagé) ---
+    HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+
     # --- API Keys pour les importations ---
     CIVITAI_API_KEY = os.getenv("CIVITAI_API_KEY")
     HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY")
@@ -51,9 +117,12 @@ class Config:
 
     @staticmethod
     def is_comfyui_reachable():
+        """Vrai si au moins une des instances ComfyUI configurées répond."""
         try:
-            import requests
-            response = requests.get(f'{Config.COMFYUI_URL}/queue', timeout=5)
-            return response.status_code == 200
+            from utils.backends import get_backend_pool
+            pool = get_backend_pool()
+            # L'état est tenu à jour par le thread de contrôle ; premier appel : contrôle immédiat
+            if not any(b.last_check for b in pool.backends.values()): pool.refresh()
+            return any(b.healthy and b.failures == 0 for b in pool.backends.values())
         except:
             return False
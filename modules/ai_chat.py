@@ -1,8 +1,9 @@
-# modules/ai_chat.py (V3.3 - Protection contre surcharge système)
+# modules/ai_chat.py (V3.4 - Client HTTP partagé)
 import streamlit as st
 import requests
 import json
 from config import Config
+from utils.http_client import get_http_client
 from utils.system import is_system_overloaded, check_generation_queue_active
 
 # Constantes pour optimisations
@@ -13,7 +14,7 @@ class OllamaChat:
     def list_models():
         try:
             tags_url = Config.OLLAMA_URL.replace("/api/chat", "/api/tags")
-            response = requests.get(tags_url, timeout=5)
+            response = get_http_client().get(tags_url, endpoint="ollama.tags")
             response.raise_for_status()
             return [model["name"] for model in response.json().get("models", [])]
         except Exception as e:
@@ -31,7 +32,7 @@ class OllamaChat:
 
         payload = {"model": model_name, "messages": messages, "stream": True}
         try:
-            with requests.post(Config.OLLAMA_URL, json=payload, stream=True, timeout=30) as response:  # Timeout réduit à 30s
+            with get_http_client().post(Config.OLLAMA_URL, endpoint="ollama.chat", json=payload, stream=True) as response:  # Timeout de lecture 30s
                 response.raise_for_status()
                 for line in response.iter_lines():
                     if line:
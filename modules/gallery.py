@@ -1,41 +1,189 @@
-# modules/gallery.py (V18.3 - Thumbnails et gestion d'erreurs)
+# modules/gallery.py (V20.3 - Sélection multiple, actions groupées et export ZIP)
 import streamlit as st
 import json
-from PIL import Image
+import os
+import numpy as np
 from config import Config
 from pathlib import Path
+from utils.gallery_index import get_gallery_index, load_hidden_names
+from utils.thumbnails import get_thumbnail_service
+from utils.png_meta import read_generation_metadata
+from utils.fs_watcher import get_fs_watcher
+from utils.image_hash import cluster_duplicates, hamming_distances
+from utils.system import copy_to_local_storage
+from utils.zip_export import export_zip
+
+PAGE_SIZE_OPTIONS = [12, 24, 48, 96]
+# Grille en 3 colonnes : la plus grande des tailles générées (THUMBNAIL_SIZES est configurable)
+GRID_THUMBNAIL_SIZE = max(Config.THUMBNAIL_SIZES)
+SEARCH_HELP = """Mots libres (nom de fichier, prompt positif, checkpoint, LoRA, sampler, scheduler), `-mot` pour exclure.
+Filtres : `ckpt:juggernaut` `lora:detail` `neg:blurry` `sampler:euler` `scheduler:karras`
+`steps:>30` `cfg:7` `seed:1234` `steps:20..30` `width:1024` `dim:832x1216`"""
 
 def _get_hidden_list():
-    if Config.HIDDEN_FILES_DB.exists():
-        try:
-            with open(Config.HIDDEN_FILES_DB, 'r', encoding='utf-8') as f: return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError): return []
-    return []
+    return load_hidden_names()
 
 def _set_hidden_list(hidden_list):
-    with open(Config.HIDDEN_FILES_DB, 'w', encoding='utf-8') as f: json.dump(hidden_list, f)
+    # Écriture atomique : un fichier temporaire remplacé d'un coup, jamais de JSON à moitié écrit
+    tmp_path = Config.HIDDEN_FILES_DB.with_suffix(".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(hidden_list, f)
+    os.replace(tmp_path, Config.HIDDEN_FILES_DB)
+
+def _set_hidden_state(filenames, hidden_state):
+    """Masque ou affiche un lot d'images : une seule lecture et une seule écriture du fichier JSON."""
+    hidden, names = _get_hidden_list(), set(filenames)
+    if hidden_state:
+        known = set(hidden)
+        hidden += [f for f in dict.fromkeys(filenames) if f not in known]
+    else:
+        hidden = [f for f in hidden if f not in names]
+    _set_hidden_list(hidden)
+    get_gallery_index().set_hidden(filenames, hidden_state)
+
+def _hide_image(filename): _set_hidden_state([filename], True)
 
-def _hide_image(filename):
-    hidden = _get_hidden_list()
-    if filename not in hidden:
-        hidden.append(filename)
-        _set_hidden_list(hidden)
+def _unhide_image(filename): _set_hidden_state([filename], False)
 
-def _unhide_image(filename):
-    hidden = _get_hidden_list()
-    if filename in hidden:
-        hidden.remove(filename)
-        _set_hidden_list(hidden)
+def _delete_images(source_path, filenames):
+    for name in filenames:
+        (source_path / name).unlink(missing_ok=True)
+    get_gallery_index().remove(source_path, filenames)
+    _get_selection().difference_update(filenames)
+
+def _prompt_log_text(img_path):
+    return read_generation_metadata(img_path)['prompt_raw'] or 'Aucune métadonnée de prompt trouvée.'
 
 def _create_txt_log(img_path):
     log_path = Config.LOG_DIR / f"{img_path.stem}.txt"
     try:
-        img = Image.open(img_path)
-        content = img.info.get('prompt', 'Aucune métadonnée de prompt trouvée.')
+        content = _prompt_log_text(img_path)
         with open(log_path, 'w', encoding='utf-8') as f: f.write(content)
         st.toast(f"Log TXT créé : {log_path.name}")
     except Exception as e: st.error(f"Erreur lors de la création du log : {e}")
 
+def _copy_images_to_storage(source_path, filenames):
+    copied = sum(1 for name in filenames if copy_to_local_storage(source_path / name))
+    st.toast(f"📥 {copied}/{len(filenames)} image(s) copiée(s) vers le stockage local")
+
+def _export_images(source_path, filenames):
+    """Archive ZIP écrite en flux sur disque : images telles quelles et leurs logs de prompt."""
+    paths = [source_path / name for name in filenames if (source_path / name).exists()]
+
+    def logs():
+        for path in paths:
+            try: yield f"logs/{path.stem}.txt", _prompt_log_text(path)
+            except Exception as e: print(f"Log ignoré pour {path.name}: {e}")
+
+    return export_zip(paths, logs())
+
+def _get_selection():
+    return st.session_state.setdefault('gallery_selection', set())
+
+def _toggle_selection(name):
+    selection = _get_selection()
+    if st.session_state.get(f"sel_{name}"): selection.add(name)
+    else: selection.discard(name)
+
+def _set_selection(names):
+    st.session_state.gallery_selection = set(names)
+    st.session_state.pop('gallery_export', None)
+
+def _render_bulk_actions(source_path, page_names, all_names_loader):
+    """Barre de sélection : une seule action (et un seul rerun) pour tout un lot d'images."""
+    selection = _get_selection()
+    bc1, bc2, bc3, bc4 = st.columns([0.34, 0.22, 0.22, 0.22])
+    with bc1: st.markdown(f"**☑️ {len(selection)} image(s) sélectionnée(s)**")
+    with bc2:
+        if st.button("Sélectionner la page", key="select_page", use_container_width=True):
+            _set_selection(selection | set(page_names)); st.rerun()
+    with bc3:
+        if st.button("Tout sélectionner", key="select_all", help="Toutes les images correspondant aux filtres", use_container_width=True):
+            _set_selection(all_names_loader()); st.rerun()
+    with bc4:
+        if st.button("Vider la sélection", key="select_none", disabled=not selection, use_container_width=True):
+            _set_selection(()); st.rerun()
+    if not selection:
+        return
+
+    names = sorted(selection)
+    ac1, ac2, ac3, ac4, ac5 = st.columns(5)
+    with ac1:
+        if st.button("🔼 Masquer", key="bulk_hide", use_container_width=True):
+            _set_hidden_state(names, True); st.rerun()
+    with ac2:
+        if st.button("🔽 Afficher", key="bulk_unhide", use_container_width=True):
+            _set_hidden_state(names, False); st.rerun()
+    with ac3:
+        with st.popover("🗑️ Supprimer", use_container_width=True):
+            st.warning(f"Supprimer définitivement {len(names)} image(s) ?")
+            if st.button("Confirmer la suppression", key="bulk_delete", type="primary", use_container_width=True):
+                _delete_images(source_path, names); _set_selection(()); st.rerun()
+    with ac4:
+        if st.button("📥 Copier", key="bulk_copy", help="Copier vers le stockage local", disabled=not Config.LOCAL_STORAGE_PATH, use_container_width=True):
+            _copy_images_to_storage(source_path, names)
+    with ac5:
+        if st.button("📦 Exporter ZIP", key="bulk_export", use_container_width=True):
+            with st.spinner(f"Création de l'archive ({len(names)} image(s))..."):
+                try: st.session_state.gallery_export = str(_export_images(source_path, names))
+                except Exception as e: st.error(f"Erreur lors de l'export : {e}")
+
+    if (export := st.session_state.get('gallery_export')) and Path(export).exists():
+        export_path = Path(export)
+        st.download_button(
+            f"⬇️ Télécharger {export_path.name} ({export_path.stat().st_size / 1024**2:.1f} Mo)",
+            # Lu seulement au clic, pas à chaque rerun
+            data=lambda: open(export_path, 'rb'),
+            file_name=export_path.name, mime="application/zip", key="bulk_download", use_container_width=True,
+        )
+
+def _render_pagination(total, total_pages, key):
+    if total_pages <= 1:
+        st.caption(f"{total} image(s)")
+        return
+    pc1, pc2, pc3 = st.columns([0.3, 0.4, 0.3])
+    with pc1:
+        if st.button("⬅️ Précédente", key=f"gallery_prev_{key}", disabled=st.session_state.gallery_page == 0, use_container_width=True):
+            st.session_state.gallery_page -= 1; st.rerun()
+    with pc2: st.markdown(f"<div style='text-align:center'>Page {st.session_state.gallery_page + 1}/{total_pages} · {total} image(s)</div>", unsafe_allow_html=True)
+    with pc3:
+        if st.button("Suivante ➡️", key=f"gallery_next_{key}", disabled=st.session_state.gallery_page >= total_pages - 1, use_container_width=True):
+            st.session_state.gallery_page += 1; st.rerun()
+
+# Groupes de quasi-doublons partagés entre sessions, recalculés quand l'index ou les empreintes changent
+_duplicate_groups_cache = {}
+
+def _duplicate_groups(index, source_path, search, show_hidden):
+    key = (str(source_path), search, show_hidden, index.generation, Config.DUPLICATE_MAX_DISTANCE)
+    if key not in _duplicate_groups_cache:
+        if len(_duplicate_groups_cache) > 16: _duplicate_groups_cache.clear()
+        _duplicate_groups_cache[key] = cluster_duplicates(index.perceptual_hashes(source_path, search, show_hidden), Config.DUPLICATE_MAX_DISTANCE)
+    return _duplicate_groups_cache[key]
+
+def _similar_images(index, source_path, target_phash, show_hidden):
+    """Retourne [(id, distance)] triés par distance, via un parcours NumPy de toutes les empreintes."""
+    items = [(i, h) for i, h in index.perceptual_hashes(source_path, show_hidden=show_hidden) if h is not None]
+    if not items:
+        return []
+    ids = np.fromiter((i for i, _ in items), dtype=np.int64, count=len(items))
+    hashes = np.fromiter((h for _, h in items), dtype=np.int64, count=len(items))
+    distances = hamming_distances(hashes, target_phash)
+    order = np.argsort(distances, kind="stable")
+    order = order[distances[order] <= Config.SIMILARITY_MAX_DISTANCE]
+    return [(int(ids[i]), int(distances[i])) for i in order]
+
+@st.fragment(run_every=Config.GALLERY_NOTIFY_INTERVAL)
+def _watch_new_images(tag):
+    """Relance la page quand le watcher signale des changements dans le dossier affiché."""
+    watcher = get_fs_watcher()
+    if not watcher: return
+    version, created = watcher.version(tag), watcher.created_count(tag)
+    seen = st.session_state.setdefault('gallery_watch_state', {})
+    if tag in seen and seen[tag][0] != version:
+        st.session_state.gallery_new_images = created - seen[tag][1]
+        seen[tag] = (version, created)
+        st.rerun(scope="app")
+    seen[tag] = (version, created)
+
 def render():
     st.subheader("🖼️ Galerie d'Images & Actions")
     
@@ -48,35 +196,100 @@ def render():
         st.warning(f"Le répertoire d'images '{source_path}' est introuvable. Vérifiez votre configuration.")
         return
 
-    hidden_list = _get_hidden_list()
-    c1, c2 = st.columns([0.7, 0.3])
-    with c1: search = st.text_input("🔍 Rechercher par nom...")
+    _watch_new_images("gallery" if use_custom_gallery else "outputs")
+    if new_images := st.session_state.pop('gallery_new_images', 0):
+        st.toast(f"🆕 {new_images} nouvelle(s) image(s)")
+
+    index = get_gallery_index()
+    index.sync(source_path, hidden_loader=_get_hidden_list)
+    thumbnails = get_thumbnail_service()
+    c1, c2, c3, c4 = st.columns([0.45, 0.2, 0.2, 0.15])
+    with c1: search = st.text_input("🔍 Rechercher (nom, prompt, modèles, paramètres)...", help=SEARCH_HELP)
     with c2: show_hidden = st.checkbox("Voir les images masquées", value=False)
-    
-    all_images = sorted(source_path.glob("*.png"), key=lambda p: p.stat().st_mtime, reverse=True)
-    images_to_display = [p for p in all_images if (show_hidden or p.name not in hidden_list) and (not search or search.lower() in p.name.lower())]
+    with c3: collapse = st.checkbox("🧬 Regrouper les doublons", value=False, help="N'afficher qu'une image par groupe de quasi-doublons (empreintes perceptuelles).")
+    with c4:
+        page_size_options = sorted(set(PAGE_SIZE_OPTIONS + [Config.GALLERY_PAGE_SIZE]))
+        page_size = st.selectbox("Images par page", page_size_options, index=page_size_options.index(Config.GALLERY_PAGE_SIZE))
+
+    similar_to = st.session_state.get('gallery_similar_to')
+    # Revenir à la première page quand les filtres changent
+    filters = (str(source_path), search, show_hidden, collapse, page_size, similar_to)
+    if st.session_state.get('gallery_filters') != filters:
+        st.session_state.gallery_filters, st.session_state.gallery_page = filters, 0
 
-    if not images_to_display:
+    groups, distances = {}, {}
+    if similar_to:
+        name, target_phash = similar_to
+        sc1, sc2 = st.columns([0.8, 0.2])
+        with sc1: st.markdown(f"##### 🧬 Images similaires à `{name}`")
+        with sc2:
+            if st.button("✖️ Fermer", key="close_similar", use_container_width=True):
+                del st.session_state.gallery_similar_to; st.rerun()
+        ranked = _similar_images(index, source_path, target_phash, show_hidden)
+        distances = dict(ranked)
+        page_ids = [i for i, _ in ranked]
+    elif collapse:
+        all_groups = _duplicate_groups(index, source_path, search, show_hidden)
+        duplicate_groups = [g for g in all_groups if len(g) > 1]
+        if duplicate_groups:
+            extra = sum(len(g) - 1 for g in duplicate_groups)
+            dc1, dc2, dc3 = st.columns([0.5, 0.25, 0.25])
+            with dc1: st.caption(f"{len(duplicate_groups)} groupe(s) de quasi-doublons · {extra} image(s) en trop")
+            with dc2:
+                if st.button("🔼 Masquer tous les doublons", key="hide_all_duplicates", use_container_width=True):
+                    _set_hidden_state([e['name'] for g in duplicate_groups for e in index.get_many(g[1:])], True); st.rerun()
+            with dc3:
+                with st.popover("🗑️ Supprimer tous les doublons", use_container_width=True):
+                    st.warning(f"Supprimer définitivement {extra} image(s) ? Seule la première image de chaque groupe est conservée.")
+                    if st.button("Confirmer la suppression", key="delete_all_duplicates", type="primary", use_container_width=True):
+                        _delete_images(source_path, [e['name'] for g in duplicate_groups for e in index.get_many(g[1:])]); st.rerun()
+        groups = {g[0]: g for g in all_groups}
+        page_ids = [g[0] for g in all_groups]
+    else:
+        page_ids = None
+
+    total = len(page_ids) if page_ids is not None else index.count(source_path, search=search, show_hidden=show_hidden)
+    if not total:
+        # La sélection reste accessible (ex. afficher à nouveau des images qui viennent d'être masquées)
+        if _get_selection(): _render_bulk_actions(source_path, [], list)
         st.info("Aucune image à afficher dans ce répertoire.")
         return
 
+    total_pages = (total + page_size - 1) // page_size
+    st.session_state.gallery_page = min(st.session_state.gallery_page, total_pages - 1)
+    offset = st.session_state.gallery_page * page_size
+    if page_ids is not None:
+        entries = index.get_many(page_ids[offset:offset + page_size])
+    else:
+        entries = index.query(source_path, search=search, show_hidden=show_hidden, limit=page_size, offset=offset)
+    images_to_display = [(source_path / e['name'], e) for e in entries]
+
+    def all_names():
+        if page_ids is not None: return [e['name'] for e in index.get_many(page_ids)]
+        return [e['name'] for e in index.query(source_path, search=search, show_hidden=show_hidden)]
+
+    _render_bulk_actions(source_path, [e['name'] for e in entries], all_names)
+    _render_pagination(total, total_pages, key="top")
+    selection = _get_selection()
+
     cols = st.columns(3)
-    for idx, path in enumerate(images_to_display):
+    for idx, (path, entry) in enumerate(images_to_display):
+        is_hidden = bool(entry['hidden'])
         with cols[idx % 3]:
             try:
-                # Utiliser la miniature si elle existe
-                thumb_path = Config.GALLERY_PATH / "thumbnails" / path.name if Config.GALLERY_PATH else None
-                image_path = str(thumb_path) if thumb_path and thumb_path.exists() else str(path)
-                st.image(image_path, use_column_width='always')
+                # Utiliser la miniature si elle existe, sinon la demander en priorité pour la page visible
+                thumb_path = thumbnails.get(entry, GRID_THUMBNAIL_SIZE)
+                if not thumb_path: thumbnails.submit(source_path, path.name)
+                st.image(str(thumb_path or path), use_column_width='always')
+                st.session_state[f"sel_{path.name}"] = path.name in selection
+                st.checkbox(path.name, key=f"sel_{path.name}", on_change=_toggle_selection, args=(path.name,))
+                if entry['id'] in distances:
+                    st.caption(f"Distance : {distances[entry['id']]} bit(s)")
 
-                is_hidden = path.name in hidden_list
-                action_cols = st.columns(4)
+                action_cols = st.columns(5)
 
                 if action_cols[0].button("🗑️", key=f"del_{path.name}", help="Supprimer l'image"):
-                    if path.exists():
-                        path.unlink()
-                        if thumb_path and thumb_path.exists():
-                            thumb_path.unlink()
+                    _delete_images(source_path, [path.name])
                     st.rerun()
 
                 button_char, help_text = ("🔽", "Afficher") if is_hidden else ("🔼", "Masquer")
@@ -86,9 +299,9 @@ def render():
 
                 if action_cols[2].button("🔄", key=f"play_{path.name}", help="Rejouer dans le Studio"):
                     if path.exists():
-                        img = Image.open(path)
-                        if 'prompt' in img.info:
-                            st.session_state['active_workflow'] = json.loads(img.info['prompt'])
+                        workflow = read_generation_metadata(path)['prompt']
+                        if workflow:
+                            st.session_state['active_workflow'] = workflow
                             st.session_state['page'] = "Studio"
                             st.rerun()
                         else: st.warning("Aucun workflow trouvé dans les métadonnées.")
@@ -96,5 +309,34 @@ def render():
                 if action_cols[3].button("📝", key=f"log_{path.name}", help="Créer un log .txt"):
                     if path.exists():
                         _create_txt_log(path)
-            except FileNotFoundError: st.rerun()
+
+                if action_cols[4].button("🧬", key=f"similar_{path.name}", help="Trouver les images similaires", disabled=entry['phash'] is None):
+                    st.session_state.gallery_similar_to = (path.name, entry['phash'])
+                    st.rerun()
+
+                group = groups.get(entry['id'], [])
+                if len(group) > 1:
+                    duplicates = [e['name'] for e in index.get_many(group[1:])]
+                    with st.expander(f"+{len(duplicates)} quasi-doublon(s)"):
+                        st.caption(", ".join(duplicates[:10]) + (" …" if len(duplicates) > 10 else ""))
+                        gc1, gc2 = st.columns(2)
+                        if gc1.button("🔼 Masquer", key=f"hide_group_{path.name}", help="Masquer les doublons et garder cette image", use_container_width=True):
+                            _set_hidden_state(duplicates, True); st.rerun()
+                        if gc2.button("🗑️ Supprimer", key=f"del_group_{path.name}", help="Supprimer les doublons et garder cette image", use_container_width=True):
+                            _delete_images(source_path, duplicates); st.rerun()
+            except FileNotFoundError:
+                index.remove(source_path, [path.name])
+                st.rerun()
             except Exception as e: st.error(f"Erreur avec {path.name}: {e}")
+
+    _render_pagination(total, total_pages, key="bottom")
+
+    # Les pages suivantes sont préparées en arrière-plan
+    thumbnails.backfill(source_path)
+    pending = thumbnails.pending_count()
+    tc1, tc2 = st.columns([0.7, 0.3])
+    with tc1:
+        if pending: st.caption(f"⏳ {pending} miniature(s) en cours de génération")
+    with tc2:
+        if st.button("♻️ Régénérer les miniatures", key="rebuild_thumbnails", use_container_width=True):
+            st.toast(f"{thumbnails.rebuild(source_path)} miniature(s) planifiée(s)")
@@ -1,4 +1,4 @@
-# modules/importer.py (V18.0)
+# modules/importer.py (V18.1 - Client HTTP partagé)
 import streamlit as st
 import requests
 import json
@@ -7,6 +7,7 @@ import re
 import os
 from pathlib import Path
 from config import Config
+from utils.http_client import get_http_client
 
 def format_size(bytes):
     if not bytes or bytes == 0:
@@ -33,7 +34,7 @@ def _search_civitai_models(query: str, limit: int = 10):
     results = []
 
     try:
-        response = requests.get(api_url, timeout=30)
+        response = get_http_client().get(api_url, endpoint="civitai.search")
         response.raise_for_status()
         data = response.json().get('items', [])
 
@@ -71,7 +72,7 @@ def _search_civitai_models(query: str, limit: int = 10):
             if download_url:
                 try:
                     headers = {"Authorization": f"Bearer {Config.CIVITAI_API_KEY}"} if Config.CIVITAI_API_KEY else {}
-                    head = requests.head(download_url, headers=headers, timeout=5)
+                    head = get_http_client().head(download_url, endpoint="model.head", headers=headers, retries=0)
                     size_bytes = int(head.headers.get('content-length', 0))
                 except:
                     size_bytes = file_to_download.get('sizeKB')
@@ -113,7 +114,7 @@ def _search_huggingface_models(query: str, limit: int = 10):
         headers["Authorization"] = f"Bearer {Config.HUGGINGFACE_API_KEY}"
 
     try:
-        response = requests.get(api_url, headers=headers, timeout=30)
+        response = get_http_client().get(api_url, endpoint="hf.search", headers=headers)
         response.raise_for_status()
         data = response.json()
 
@@ -148,7 +149,7 @@ def _search_huggingface_models(query: str, limit: int = 10):
 
             size_bytes = None
             try:
-                head = requests.head(download_url, timeout=5)
+                head = get_http_client().head(download_url, endpoint="model.head", retries=0)
                 size_bytes = int(head.headers.get('content-length', 0))
             except:
                 pass
@@ -201,7 +202,7 @@ def download_model(download_url, model_name, model_type, filename, source=""):
         headers["Authorization"] = f"Bearer {Config.HUGGINGFACE_API_KEY}"
 
     try:
-        response = requests.get(download_url, headers=headers, stream=True, timeout=60)
+        response = get_http_client().get(download_url, endpoint="model.download", headers=headers, stream=True)
         response.raise_for_status()
         total_size = int(response.headers.get('content-length', 0))
 
@@ -1,4 +1,4 @@
-# modules/studio.py (V32.5.1 - Correction de st.dialog)
+# modules/studio.py (V40.3 - File filtrée sur les travaux de la session)
 import streamlit as st
 import json
 import uuid
@@ -6,14 +6,23 @@ import time
 import threading
 from pathlib import Path
 from datetime import datetime
+from urllib.parse import urlsplit
 from config import Config
-from utils.api_comfy import send_to_comfy, track_progress, get_latest_image, poll_job_status
-from utils.system import get_model_maps, update_workflow_paths, validate_workflow_models, copy_to_gallery, copy_to_local_storage
+from utils.admission import get_admission_controller
+from utils.backends import get_backend_pool
+from utils.comfy_events import get_job_registry, get_preview_buffer
+from utils.job_store import get_job_store, ACTIVE_STATUSES, FINISHED_STATUSES, PRIORITY_BATCH, PRIORITY_LABELS, PRIORITY_NORMAL, PRIORITY_URGENT
+from utils.job_worker import get_job_worker, start_job_worker
+from utils.model_metadata import get_model_metadata_cache, lora_compatible, model_details, model_info
+from utils.result_cache import get_result_cache
+from utils.sweep import available_axes, expand_sweep, parse_values
+from utils.thumbnails import get_thumbnail_memory_cache
+from utils.system import get_model_maps, update_workflow_paths, validate_workflow_models
 
 # (Listes et fonctions de base inchangées)
 COMMON_SAMPLERS = ["euler", "euler_ancestral", "dpmpp_2s_ancestral", "dpmpp_2m_sde", "ddim", "lcm"]
 COMMON_SCHEDULERS = ["normal", "karras", "exponential", "simple", "ddim_uniform"]
-def load_model_maps(): return get_model_maps(["checkpoints", "loras", "vae"])
+def load_model_maps(): return get_model_maps()
 
 def add_lora_node_to_workflow(wf: dict, lora_options: list):
     if not lora_options: st.warning("Aucune LoRA disponible à ajouter."); return
@@ -133,24 +142,34 @@ def render_model_selectors(wf, model_maps, version):
         if ckpt_nodes:
             st.markdown("##### 💠 Checkpoint(s)")
             for i, node in enumerate(ckpt_nodes):
-                options, current_val = list(model_maps["checkpoints"].keys()), node['inputs']['ckpt_name']
-                try: current_index = options.index(current_val)
-                except ValueError: current_index = 0
+                options, current_index = model_maps["checkpoints"].options, model_maps["checkpoints"].position(node['inputs']['ckpt_name'])
                 node['inputs']['ckpt_name'] = st.selectbox("Checkpoint", options, current_index, lambda x: model_maps["checkpoints"][x], key=f"sel_ckpt_{i}_{version}")
+                if details := model_details(model_info("checkpoints", node['inputs']['ckpt_name'])):
+                    st.caption(details)
+        # Architecture lue dans l'en-tête du premier checkpoint (None tant que la lecture en arrière-plan n'a pas abouti)
+        ckpt_arch = (model_info("checkpoints", ckpt_nodes[0]['inputs']['ckpt_name']) or {}).get('arch') if ckpt_nodes else None
         if lora_nodes:
             st.markdown("##### 🎨 LoRA(s)")
+            lora_infos = {key: model_info("loras", key) for key in model_maps["loras"].options}
+            only_compatible = st.toggle("Compatibles avec le checkpoint uniquement", value=True, disabled=not ckpt_arch, key=f"lora_compat_{version}",
+                                        help="Masquer les LoRA entraînées pour une autre architecture que le checkpoint (architecture inconnue : toujours proposées)")
             for i, node in enumerate(lora_nodes):
-                options, current_val = list(model_maps["loras"].keys()), node['inputs']['lora_name']
-                try: current_index = options.index(current_val)
-                except ValueError: current_index = 0
+                current_val = node['inputs']['lora_name']
+                if only_compatible and ckpt_arch:
+                    options = tuple(k for k in model_maps["loras"].options if k == current_val or lora_compatible(lora_infos[k], ckpt_arch))
+                    current_index = options.index(current_val) if current_val in options else 0
+                else:
+                    options, current_index = model_maps["loras"].options, model_maps["loras"].position(current_val)
                 node['inputs']['lora_name'] = st.selectbox("LoRA", options, current_index, lambda x: model_maps["loras"][x], key=f"sel_lora_{i}_{version}")
+                if details := model_details(lora_infos.get(node['inputs']['lora_name'])):
+                    st.caption(details)
+        if pending := get_model_metadata_cache().pending_count():
+            st.caption(f"🔎 Lecture des en-têtes safetensors : {pending} fichier(s) en attente")
         if st.button("➕ Ajouter une LoRA", use_container_width=True): add_lora_node_to_workflow(wf, list(model_maps["loras"].keys())); st.rerun()
         if vae_nodes:
             st.markdown("##### ✨ VAE(s)")
             for i, node in enumerate(vae_nodes):
-                options, current_val = list(model_maps["vae"].keys()), node['inputs']['vae_name']
-                try: current_index = options.index(current_val)
-                except ValueError: current_index = 0
+                options, current_index = model_maps["vae"].options, model_maps["vae"].position(node['inputs']['vae_name'])
                 node['inputs']['vae_name'] = st.selectbox("VAE", options, current_index, lambda x: model_maps["vae"][x], key=f"sel_vae_{i}_{version}")
 
 def render_advanced_settings(wf, version):
@@ -177,112 +196,177 @@ def render_advanced_settings(wf, version):
             with c2: inputs['height'] = st.number_input("Hauteur", value=inputs['height'], min_value=64, step=8, key=f"widget_height_{version}")
             with c3: inputs['batch_size'] = st.slider("Lot", 1, 10, value=inputs['batch_size'], key=f"widget_batch_{version}")
 
+def render_sweep_settings(wf, model_maps, version) -> dict | None:
+    """Axes du balayage {axe: valeurs} si le mode est activé, sinon None."""
+    with st.expander("🧪 Balayage de Paramètres"):
+        if not st.toggle("Activer le balayage", key=f"sweep_on_{version}", help="Une génération par combinaison des valeurs ci-dessous"):
+            return None
+        axes_ok = available_axes(wf)
+        sampler = next((n['inputs'] for n in wf.values() if isinstance(n, dict) and "KSampler" in n.get("class_type", "")), {})
+        ckpt = next((n['inputs'] for n in wf.values() if isinstance(n, dict) and "ckpt_name" in n.get("inputs", {})), {})
+        lora = next((n['inputs'] for n in wf.values() if isinstance(n, dict) and "lora_name" in n.get("inputs", {})), {})
+        axes = {}
+        try:
+            if 'ckpt_name' in axes_ok:
+                options = list(model_maps["checkpoints"].keys())
+                default = [ckpt['ckpt_name']] if ckpt['ckpt_name'] in options else []
+                axes['ckpt_name'] = st.multiselect("Checkpoints", options, default, lambda x: model_maps["checkpoints"][x], key=f"sweep_ckpt_{version}")
+            if 'sampler_name' in axes_ok:
+                c1, c2 = st.columns(2)
+                with c1: axes['sampler_name'] = st.multiselect("Samplers", COMMON_SAMPLERS, [sampler['sampler_name']], key=f"sweep_sampler_{version}")
+                with c2: axes['scheduler'] = st.multiselect("Schedulers", COMMON_SCHEDULERS, [sampler['scheduler']], key=f"sweep_scheduler_{version}")
+            if 'steps' in axes_ok:
+                st.caption("Listes « 20, 30 », plages « 1-4 » ou « début:fin:pas » (ex. 5:9:1.5)")
+                c1, c2 = st.columns(2)
+                with c1: axes['steps'] = parse_values(st.text_input("Steps", str(sampler['steps']), key=f"sweep_steps_{version}"), int)
+                with c2: axes['cfg'] = parse_values(st.text_input("CFG", f"{sampler['cfg']:g}", key=f"sweep_cfg_{version}"), float)
+            if 'lora_strength' in axes_ok:
+                # Vide par défaut : les forces du workflow (modèle et CLIP) restent intactes tant que l'axe n'est pas saisi
+                current = f"{lora.get('strength_model', 1.0):g} / {lora.get('strength_clip', 1.0):g}"
+                axes['lora_strength'] = parse_values(st.text_input("Force LoRA", "", key=f"sweep_lora_{version}", placeholder=f"actuelle : {current}",
+                                                                   help="Appliquée à la force modèle et CLIP de la première LoRA"), float)
+            if 'seed' in axes_ok:
+                axes['seed'] = parse_values(st.text_input("Seeds", str(sampler['seed']), key=f"sweep_seed_{version}"), int)
+        except ValueError as e:
+            st.error(f"Valeurs invalides : {e}")
+            return {}
+        total = 1
+        for values in axes.values():
+            total *= max(1, len(values))
+        if total > Config.SWEEP_MAX_JOBS:
+            st.warning(f"⚠️ {total} combinaisons : limite de {Config.SWEEP_MAX_JOBS} dépassée (SWEEP_MAX_JOBS).")
+        else:
+            st.caption(f"{total} génération(s) seront ajoutées à la file.")
+        return axes
+
 def initialize_generation_queue():
-    """Initialize the generation queue in session state."""
-    if 'generation_jobs' not in st.session_state:
-        st.session_state.generation_jobs = []
-    if 'job_counter' not in st.session_state:
-        st.session_state.job_counter = 0
+    """La file vit dans le JobStore ; le worker de fond (un par processus) la fait avancer."""
+    start_job_worker()
+    if 'notified_jobs' not in st.session_state:
+        # Pas de notification pour les travaux déjà terminés avant l'ouverture de la page
+        st.session_state.notified_jobs = {job['id'] for job in get_job_store().recent(st.session_state.client_id) if job['status'] in FINISHED_STATUSES}
+        st.session_state.notified_groups = {g['id'] for g in get_job_store().recent_groups(st.session_state.client_id) if g['status'] != 'running'}
+
+def _to_view(job: dict) -> dict:
+    """Travail persistant -> enregistrement affiché par la file (mêmes clés qu'auparavant)."""
+    images = job['images']
+    first = images[0] if images else {}
+    return dict(
+        job,
+        start_time=datetime.fromtimestamp(job['started']) if job['started'] else None,
+        image=first.get('path'),
+        image_name=first.get('name'),
+        source_path=Path(first['path']) if first.get('path') else None,
+    )
 
 def update_job_statuses():
-    """Update the status of all running jobs."""
-    jobs = st.session_state.generation_jobs
-    running_jobs = [job for job in jobs if job['status'] == 'running']
-
-    for job in running_jobs:
-        status_info = poll_job_status(job['prompt_id'])
-        job['progress'] = status_info['progress']
-
-        if status_info['status'] == 'completed':
-            job['status'] = 'completed'
-            # Fetch the image
-            img_data, img_name, source_path = get_latest_image(job['prompt_id'])
-            if img_data:
-                job['image'] = img_data
-                job['image_name'] = img_name
-                job['source_path'] = source_path
-                # Show toast with thumbnail
-                st.toast(f"✅ Génération terminée: {img_name}", icon="🎉")
-                # Copy to destinations
-                if copy_to_gallery(source_path):
-                    st.toast(f"📁 Image copiée dans la galerie")
-                if copy_to_local_storage(source_path):
-                    st.toast(f"💾 Image copiée dans le stockage local")
-            else:
-                job['status'] = 'failed'
-                st.toast("❌ Échec de récupération de l'image", icon="⚠️")
-
-        elif status_info['status'] == 'failed':
-            job['status'] = 'failed'
-            st.toast(f"❌ Génération échouée: {status_info.get('error', 'Erreur inconnue')}", icon="⚠️")
-
-def start_pending_jobs():
-    """Start jobs that are queued if slots are available."""
-    jobs = st.session_state.generation_jobs
-    running_count = sum(1 for job in jobs if job['status'] == 'running')
-    max_concurrent = 5
-
-    queued_jobs = [job for job in jobs if job['status'] == 'queued']
-    for job in queued_jobs:
-        if running_count >= max_concurrent:
-            break
-
-        # Start the job
-        prompt_id = send_to_comfy(job['workflow'], st.session_state.client_id)
-        if prompt_id != "ERROR_CONNECTION":
-            job['prompt_id'] = prompt_id
-            job['status'] = 'running'
-            job['start_time'] = datetime.now()
-            running_count += 1
-        else:
-            job['status'] = 'failed'
-            st.toast("❌ Connexion à ComfyUI échouée", icon="⚠️")
-
-def add_generation_job(workflow, model_maps, turbo_mode):
-    """Add a new generation job to the queue."""
-    job_id = st.session_state.job_counter
-    st.session_state.job_counter += 1
-
-    # Prepare workflow (same as before)
-    final_wf = workflow.copy()
-
-    job = {
-        'id': job_id,
-        'workflow': final_wf,
-        'status': 'queued',
-        'progress': 0.0,
-        'prompt_id': None,
-        'start_time': None,
-        'image': None,
-        'image_name': None,
-        'source_path': None,
-        'turbo_mode': turbo_mode
-    }
-
-    st.session_state.generation_jobs.append(job)
-    start_pending_jobs()
+    """Lit l'état des travaux de la session tenu par le worker et notifie ceux terminés depuis le dernier affichage."""
+    st.session_state.generation_jobs = [_to_view(job) for job in get_job_store().recent(st.session_state.client_id)]
+    notified = st.session_state.notified_jobs
+    for job in st.session_state.generation_jobs:
+        if job['status'] not in FINISHED_STATUSES or job['id'] in notified:
+            continue
+        notified.add(job['id'])
+        if job['status'] == 'completed':
+            names = ", ".join(img['name'] for img in job['images'])
+            st.toast(f"✅ Génération terminée: {names}", icon="🎉")
+        elif job['status'] == 'failed':
+            st.toast(f"❌ Génération échouée: {job.get('error') or 'Erreur inconnue'}", icon="⚠️")
+    st.session_state.sweep_groups = get_job_store().recent_groups(st.session_state.client_id)
+    for group in st.session_state.sweep_groups:
+        if group['status'] != 'running' and group['id'] not in st.session_state.notified_groups:
+            st.session_state.notified_groups.add(group['id'])
+            if group['status'] == 'cancelled':
+                continue
+            st.toast(f"🧪 Balayage #{group['id']} terminé : {group['completed']}/{group['total']} image(s)", icon="🎉")
+
+def add_generation_job(workflow, model_maps, turbo_mode, use_cache=True, priority=PRIORITY_NORMAL):
+    """Ajoute un travail à la file persistante et réveille le worker ; terminé aussitôt si le résultat est en cache."""
+    # Le workflow est sérialisé tel quel : les modifications suivantes dans l'UI ne touchent pas ce travail
+    # Le cache est consulté avant l'insertion : un travail repris du cache n'entre jamais en file
+    cached = get_result_cache().get(workflow) if use_cache else None
+    job_id = get_job_store().add(workflow, owner=st.session_state.client_id, turbo_mode=turbo_mode, priority=priority, cached=cached)
+    if cached:
+        st.session_state.notified_jobs.add(job_id)
+        st.toast(f"♻️ Workflow identique déjà généré : résultat repris du cache (#{job_id})", icon="⚡")
+        return
+    start_job_worker().wake()
     st.toast(f"🎯 Génération ajoutée à la file (#{job_id})", icon="➕")
 
-def render_generation_queue():
-    """Render the generation queue with modern, clean styling."""
-    jobs = st.session_state.generation_jobs
-
-    if not jobs:
+def add_sweep_jobs(workflow, axes, turbo_mode, use_cache=True, priority=PRIORITY_BATCH):
+    """Ajoute toute la matrice d'un balayage à la file, en une transaction, suivie comme un groupe."""
+    jobs = expand_sweep(workflow, axes)
+    if len(jobs) > Config.SWEEP_MAX_JOBS:
+        st.error(f"Balayage trop grand : {len(jobs)} combinaisons (max {Config.SWEEP_MAX_JOBS}).")
         return
+    cache = get_result_cache()
+    cached = [cache.get(job_wf) if use_cache else None for job_wf, _ in jobs]
+    hits = sum(1 for images in cached if images)
+    group_id = get_job_store().add_group(jobs, [[axis, values] for axis, values in axes.items() if values],
+                                         owner=st.session_state.client_id, turbo_mode=turbo_mode, priority=priority, cached=cached)
+    start_job_worker().wake()
+    st.toast(f"🧪 Balayage #{group_id} : {len(jobs)} génération(s) ajoutée(s) à la file"
+             + (f", dont {hits} reprise(s) du cache" if hits else ""), icon="➕")
+
+# Actions de la file en callbacks : appliquées avant la relance du fragment, qui affiche donc déjà le nouvel état
+def _cancel_group(group_id: int):
+    cancelled = start_job_worker().cancel_group(group_id)
+    st.toast(f"🚫 Balayage #{group_id} : {cancelled} génération(s) annulée(s)")
+
+def _cancel_job(job_id: int):
+    start_job_worker().cancel(job_id)
+
+def _prioritize_job(job_id: int):
+    start_job_worker().set_priority(job_id, PRIORITY_URGENT)
+
+def _clear_finished():
+    get_job_store().archive_finished(FINISHED_STATUSES, owner=st.session_state.client_id)
+
+def render_sweep_groups(groups):
+    for group in groups:
+        with st.container(border=True):
+            done = group['completed'] + group['failed'] + group['cancelled']
+            st.markdown(f"**🧪 Balayage #{group['id']}** - {done}/{group['total']} terminée(s)"
+                        + (f" · ❌ {group['failed']} échec(s)" if group['failed'] else "")
+                        + (f" · 🚫 {group['cancelled']} annulée(s)" if group['cancelled'] else ""))
+            if group['status'] == 'running':
+                # Les travaux en cours comptent pour leur avancement partiel
+                st.progress(min(1.0, (done + group['running_progress']) / group['total']))
+                st.button("✖️ Annuler le balayage", key=f"cancel_group_{group['id']}", on_click=_cancel_group, args=(group['id'],))
+            elif group.get('sheet') and Path(group['sheet']).exists():
+                with st.expander("🖼️ Planche contact", expanded=False):
+                    sheet = get_thumbnail_memory_cache().get(group['sheet'], Config.QUEUE_SHEET_PREVIEW_SIZE)
+                    if sheet:
+                        st.image(sheet, use_container_width=True)
+                    st.download_button("📥 Télécharger", data=lambda p=group['sheet']: Path(p).read_bytes(),
+                                       file_name=Path(group['sheet']).name, mime="image/png", key=f"dl_sheet_{group['id']}")
+            elif group['status'] == 'failed':
+                st.error("Échec de toutes les générations du balayage")
+
+def render_job_actions(job):
+    """Annuler (en file ou en attente dans ComfyUI), interrompre (en exécution) ou faire passer devant."""
+    state = get_job_registry().get(job['prompt_id']) if job.get('prompt_id') else None
+    executing = job['status'] == 'running' and state is not None and state['status'] == 'running'
+    c1, c2 = st.columns(2)
+    with c1:
+        st.button("⏹️ Interrompre" if executing else "✖️ Annuler", key=f"cancel_{job['id']}", use_container_width=True,
+                  on_click=_cancel_job, args=(job['id'],))
+    with c2:
+        if job['status'] == 'queued' and job['priority'] != PRIORITY_URGENT:
+            st.button("⏫ Prioriser", key=f"prio_{job['id']}", use_container_width=True, help="Passer en voie urgente",
+                      on_click=_prioritize_job, args=(job['id'],))
+
+@st.fragment(run_every=Config.QUEUE_REFRESH_INTERVAL)
+def render_generation_queue():
+    """
+    File de génération, relancée seule toutes les QUEUE_REFRESH_INTERVAL secondes : l'avancement suit le worker
+    sans réexécuter le reste de la page (modèles, sélecteurs, validation du workflow).
+    """
+    update_job_statuses()
+    active_jobs = st.session_state.generation_jobs
+    sweep_groups = st.session_state.sweep_groups
 
-    # Clean up completed jobs older than 5 minutes
-    now = datetime.now()
-    st.session_state.generation_jobs = [
-        job for job in jobs
-        if not (job['status'] == 'completed' and
-                job.get('start_time') and
-                (now - job['start_time']).seconds > 300)
-    ]
-
-    active_jobs = [job for job in st.session_state.generation_jobs
-                   if job['status'] in ['queued', 'running', 'completed']]
-
-    if not active_jobs:
+    if not active_jobs and not sweep_groups:
         return
 
     st.markdown("---")
@@ -290,12 +374,26 @@ def render_generation_queue():
     with col_title:
         st.subheader("🎨 File de Génération")
     with col_clear:
-        if st.button("🗑️ Vider", key="clear_completed", help="Supprimer les générations terminées"):
-            st.session_state.generation_jobs = [
-                job for job in st.session_state.generation_jobs
-                if job['status'] != 'completed'
-            ]
-            st.rerun()
+        st.button("🗑️ Vider", key="clear_completed", help="Retirer les générations terminées de la file", on_click=_clear_finished)
+
+    pool = get_backend_pool()
+    multi_backend = len(pool.backends) > 1
+    if multi_backend:
+        st.caption(" · ".join(
+            f"{'🟢' if b['healthy'] else '🔴'} {urlsplit(b['url']).netloc} ({b['running'] + b['pending'] + b['inflight']} en file)"
+            for b in pool.status()
+        ))
+    for lane in get_admission_controller().status():
+        host = f"{urlsplit(lane['url']).netloc} · " if multi_backend else ""
+        latency = f" · {lane['latency']:.0f} s/travail" if lane['latency'] else ""
+        st.caption(f"⚙️ {host}{lane['limit']} génération(s) en parallèle — {lane['reason']}{latency}")
+    worker = get_job_worker()
+    if worker and worker.model_swaps:
+        st.caption(f"♻️ {worker.model_swaps} chargement(s) de modèles · ~{worker.swaps_avoided} évité(s) par rapport à l'ordre d'arrivée")
+    if worker and worker.preemptions:
+        st.caption(f"⏫ {worker.preemptions} soumission(s) moins prioritaire(s) remise(s) en file au profit de travaux plus prioritaires")
+
+    render_sweep_groups(sweep_groups)
 
     for job in active_jobs:
         with st.container(border=True):
@@ -306,43 +404,65 @@ def render_generation_queue():
                     'queued': '⏳',
                     'running': '⚡',
                     'completed': '✅',
-                    'failed': '❌'
+                    'failed': '❌',
+                    'cancelled': '🚫'
                 }.get(job['status'], '❓')
 
                 status_text = {
                     'queued': 'En attente',
                     'running': 'En cours',
                     'completed': 'Terminée',
-                    'failed': 'Échouée'
+                    'failed': 'Échouée',
+                    'cancelled': 'Annulée'
                 }.get(job['status'], 'Inconnue')
 
-                st.markdown(f"**{status_emoji} Génération #{job['id']}** - {status_text}")
+                lane = f" · {PRIORITY_LABELS[job['priority']]}" if job['priority'] != PRIORITY_NORMAL else ""
+                st.markdown(f"**{status_emoji} Génération #{job['id']}** - {status_text}{lane}")
 
                 if job['status'] == 'running' and job.get('start_time'):
                     elapsed = (datetime.now() - job['start_time']).seconds
-                    st.caption(f"Temps écoulé: {elapsed}s")
+                    on_backend = f" · {urlsplit(job['backend']).netloc}" if multi_backend and job.get('backend') else ""
+                    st.caption(f"Temps écoulé: {elapsed}s{on_backend}")
+
+                if job.get('cached'):
+                    st.caption("♻️ Résultat repris du cache (workflow identique déjà généré)")
+
+                if job.get('batch_offset') is not None and job['status'] in ('running', 'completed'):
+                    # Seule la première image du lot garde exactement sa seed, les suivantes ont le bruit du lot
+                    st.caption("🔗 Regroupé dans un lot avec des générations identiques (seeds dérivées du lot)")
 
                 if job['status'] == 'completed' and job.get('image_name'):
-                    st.caption(f"Image: {job['image_name']}")
+                    extra = len(job.get('images', [])) - 1
+                    st.caption(f"Image: {job['image_name']}" + (f" (+{extra} dans le lot)" if extra > 0 else ""))
+
+                if job['status'] == 'failed' and job.get('error'):
+                    st.caption(job['error'])
+
+                if job['status'] in ACTIVE_STATUSES:
+                    render_job_actions(job)
 
             with col_progress:
                 if job['status'] == 'running':
                     st.progress(job['progress'], text=".1%")
-                elif job['status'] == 'completed' and job.get('image'):
-                    # Show thumbnail
-                    st.image(job['image'], width=80, caption="")
+                    if job.get('prompt_id') and (preview := get_preview_buffer().get(job['prompt_id'])):
+                        st.image(preview, width=120, caption="Aperçu")
+                elif job['status'] == 'completed' and job.get('image') and \
+                        (thumb := get_thumbnail_memory_cache().get(job['image'], Config.QUEUE_THUMBNAIL_SIZE)):
+                    # Miniature partagée entre sessions : l'image pleine taille n'est jamais chargée par la file
+                    st.image(thumb, width=80, caption="")
                 elif job['status'] == 'failed':
                     st.error("Échec")
 
 def render():
     st.title("🎮 Studio Zenith Pro")
     if 'client_id' not in st.session_state:
-        st.session_state.client_id = str(uuid.uuid4())
+        # Propriétaire des travaux de la session, conservé dans l'URL : un rechargement de la page retrouve sa file
+        st.session_state.client_id = st.query_params.get("session") or str(uuid.uuid4())
+    st.query_params["session"] = st.session_state.client_id
     if 'workflow_version' not in st.session_state:
         st.session_state.workflow_version = 0
 
     initialize_generation_queue()
-    update_job_statuses()
 
     # On affiche le conteneur de détails en premier s'il est activé
     if 'show_preset_details' in st.session_state and st.session_state.show_preset_details:
@@ -355,6 +475,8 @@ def render():
         selected_wf_file = st.selectbox("Workflow de base", files, key="selectbox_workflow")
     with col2:
         turbo_mode = st.toggle("🚀 MODE TURBO")
+        bypass_cache = st.toggle("♻️ Ignorer le cache", key="bypass_result_cache",
+                                 help="Régénérer même si un workflow identique (seed comprise) a déjà produit ces images")
     with col3:
         if 'active_workflow' in st.session_state:
             render_presets_popover(st.session_state.active_workflow)
@@ -371,6 +493,7 @@ def render():
         render_prompt_inputs(wf_in_session, wf_version)
         render_model_selectors(wf_in_session, model_maps, wf_version)
         render_advanced_settings(wf_in_session, wf_version)
+        sweep_axes = render_sweep_settings(wf_in_session, model_maps, wf_version)
         st.divider()
         validation_errors = validate_workflow_models(wf_in_session, model_maps)
         if validation_errors:
@@ -382,9 +505,19 @@ def render():
         else:
             generate_disabled = False
 
-        if st.button("🚀 LANCER LA GÉNÉRATION", type="primary", use_container_width=True, disabled=generate_disabled):
+        in_sweep = sweep_axes is not None
+        priority = st.radio("Priorité", list(PRIORITY_LABELS), index=PRIORITY_BATCH if in_sweep else PRIORITY_NORMAL,
+                            format_func=PRIORITY_LABELS.get, horizontal=True, key=f"job_priority_{'sweep' if in_sweep else 'single'}",
+                            help="Les générations urgentes passent devant et reprennent la place des lots pas encore commencés")
+        if in_sweep:
+            if st.button("🧪 LANCER LE BALAYAGE", type="primary", use_container_width=True, disabled=generate_disabled or not sweep_axes):
+                try:
+                    add_sweep_jobs(wf_in_session, sweep_axes, turbo_mode, use_cache=not bypass_cache, priority=priority)
+                except Exception as e:
+                    st.error(f"Erreur lors de l'ajout à la file : {e}")
+        elif st.button("🚀 LANCER LA GÉNÉRATION", type="primary", use_container_width=True, disabled=generate_disabled):
             try:
-                add_generation_job(wf_in_session, model_maps, turbo_mode)
+                add_generation_job(wf_in_session, model_maps, turbo_mode, use_cache=not bypass_cache, priority=priority)
             except Exception as e:
                 st.error(f"Erreur lors de l'ajout à la file : {e}")
 
@@ -0,0 +1,135 @@
+# utils/admission.py (V1.0 - Contrôle d'admission AIMD de la file de génération)
+import threading
+import time
+from config import Config
+from utils.system import get_system_resources
+
+LATENCY_SMOOTHING = 0.3    # poids d'un nouvel échantillon dans la moyenne mobile
+BASELINE_DRIFT = 0.05      # la référence remonte lentement vers les latences observées
+DECREASE_FACTOR = 0.5
+
+
+class _Lane:
+    """Limite et mesures d'une instance."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.reason = "démarrage"
+        self.latency = None        # moyenne mobile soumission → fin (secondes)
+        self.baseline = None       # latence de référence, sans file d'attente
+        self.evaluated_check = None
+        self.last_decrease = 0.0
+
+
+class AdmissionController:
+    """
+    Nombre de travaux en parallèle par instance ComfyUI, ajusté façon AIMD à chaque contrôle du pool :
+    +1 tant que le GPU manque de travail prêt, division par deux sur un signal de pression
+    (file ComfyUI trop profonde, VRAM presque pleine, RAM locale saturée, latence qui dérive, échec).
+    """
+
+    def __init__(self, initial: int = None, minimum: int = None, maximum: int = None):
+        self.minimum = minimum or Config.ADMISSION_MIN
+        self.maximum = maximum or Config.ADMISSION_MAX
+        self.initial = min(self.maximum, max(self.minimum, initial or Config.ADMISSION_INITIAL))
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+    def _lane(self, url: str) -> _Lane:
+        if url not in self._lanes:
+            self._lanes[url] = _Lane(self.initial)
+        return self._lanes[url]
+
+    def limit(self, url: str) -> int:
+        with self._lock:
+            return self._lane(url).limit
+
+    def record_latency(self, url: str, seconds: float):
+        with self._lock:
+            lane = self._lane(url)
+            lane.latency = seconds if lane.latency is None else lane.latency + LATENCY_SMOOTHING * (seconds - lane.latency)
+            if lane.baseline is None or seconds < lane.baseline:
+                lane.baseline = seconds
+            else:
+                lane.baseline += BASELINE_DRIFT * (seconds - lane.baseline)
+
+    def record_failure(self, url: str):
+        with self._lock:
+            self._decrease(self._lane(url), "échec de soumission", force=True)
+
+    def _decrease(self, lane: _Lane, reason: str, force: bool = False):
+        # Une seule réduction par « aller-retour » : le temps que les soumissions précédentes produisent leur effet
+        now = time.time()
+        if force or now - lane.last_decrease >= max(Config.BACKEND_CHECK_INTERVAL, lane.latency or 0):
+            lane.limit = max(self.minimum, int(lane.limit * DECREASE_FACTOR))
+            lane.last_decrease = now
+            lane.reason = f"↓ {reason}"
+        else:
+            lane.reason = f"= {reason} (réduction récente)"
+
+    def _pressure(self, backend, resources: dict | None, lane: _Lane) -> str | None:
+        """Premier signal de surcharge trouvé, ou None."""
+        if backend.queue_pending > Config.ADMISSION_MAX_BACKLOG:
+            return f"file ComfyUI profonde ({backend.queue_pending} en attente)"
+        vram_ratio = backend.vram_free_ratio
+        if vram_ratio is None and backend.is_local and resources and resources.get('gpu_info'):
+            gpu = resources['gpu_info'][0]
+            if gpu['memory_total']:
+                vram_ratio = 1 - gpu['memory_used'] / gpu['memory_total']
+        if vram_ratio is not None and vram_ratio < Config.ADMISSION_MIN_VRAM_FREE:
+            return f"VRAM libre {vram_ratio:.0%}"
+        if backend.is_local and resources and resources['ram_percent'] > Config.ADMISSION_MAX_RAM:
+            return f"RAM locale {resources['ram_percent']:.0f} %"
+        if lane.latency and lane.baseline and lane.latency > lane.baseline * Config.ADMISSION_LATENCY_FACTOR:
+            return f"latence {lane.latency:.0f} s (référence {lane.baseline:.0f} s)"
+        return None
+
+    def update(self, pool, running: dict, waiting: int):
+        """
+        Réévalue chaque instance dont le pool a publié un nouveau contrôle (/queue, /system_stats).
+        `running` : travaux en cours par URL d'instance ; `waiting` : travaux encore en attente d'admission.
+        """
+        with self._lock:
+            fresh = [b for b in pool.backends.values() if b.healthy and b.last_check != self._lane(b.url).evaluated_check]
+            for b in pool.backends.values():
+                if not b.healthy:
+                    self._lane(b.url).reason = "instance hors ligne"
+        if not fresh:
+            return
+        resources = get_system_resources(interval=None) if any(b.is_local for b in fresh) else None
+
+        with self._lock:
+            for backend in fresh:
+                lane = self._lane(backend.url)
+                lane.evaluated_check = backend.last_check
+                pressure = self._pressure(backend, resources, lane)
+                if pressure:
+                    self._decrease(lane, pressure)
+                elif backend.queue_pending >= Config.ADMISSION_TARGET_BACKLOG:
+                    lane.reason = f"GPU saturé ({backend.queue_pending} prompt(s) prêt(s))"
+                elif not waiting:
+                    lane.reason = "aucun travail en attente"
+                elif waiting <= lane.limit - running.get(backend.url, 0):
+                    lane.reason = "limite non atteinte"
+                elif lane.limit >= self.maximum:
+                    lane.reason = "plafond atteint"
+                else:
+                    lane.limit += 1
+                    lane.reason = "↑ GPU sous-alimenté"
+
+    def status(self) -> list[dict]:
+        with self._lock:
+            return [{'url': url, 'limit': lane.limit, 'reason': lane.reason, 'latency': lane.latency}
+                    for url, lane in self._lanes.items()]
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
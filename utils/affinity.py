@@ -0,0 +1,55 @@
+# utils/affinity.py (V1.1 - Ordonnancement par affinité de modèles, dans chaque voie de priorité)
+
+MODEL_INPUTS = ("ckpt_name", "vae_name", "lora_name")
+
+
+def model_signature(wf: dict) -> tuple:
+    """Modèles chargés par un workflow (checkpoints, VAE, LoRA) : deux travaux de même signature ne rechargent rien."""
+    found = {name: [] for name in MODEL_INPUTS}
+    for node in wf.values():
+        if not isinstance(node, dict):
+            continue
+        for name in MODEL_INPUTS:
+            value = node.get("inputs", {}).get(name)
+            if isinstance(value, str):
+                found[name].append(value)
+    return tuple(tuple(sorted(found[name])) for name in MODEL_INPUTS)
+
+
+def order_by_affinity(jobs: list[dict], loaded: set, bypassed: dict, max_bypass: int) -> list[dict]:
+    """
+    Réordonne une fenêtre de la file à l'intérieur de chaque voie de priorité : d'abord les travaux dont les modèles
+    sont déjà chargés sur une instance, puis les autres regroupés par signature (dans l'ordre de leur première apparition).
+    Un travail doublé `max_bypass` fois repasse en tête de sa voie, dans l'ordre d'arrivée : aucun ne peut attendre indéfiniment.
+    """
+    if max_bypass <= 0:
+        return sorted(jobs, key=lambda job: (job['priority'], job['id']))
+    first_seen = {}
+    for job in jobs:
+        first_seen.setdefault(model_signature(job['workflow']), len(first_seen))
+
+    def key(job):
+        if bypassed.get(job['id'], 0) >= max_bypass:
+            return (job['priority'], 0, 0, job['id'])
+        signature = model_signature(job['workflow'])
+        return (job['priority'], 1 if signature in loaded else 2, first_seen[signature], job['id'])
+
+    return sorted(jobs, key=key)
+
+
+def record_bypasses(candidates: list[dict], started_ids: set, bypassed: dict) -> dict:
+    """
+    Compte un dépassement pour chaque travail resté en file alors qu'un travail plus récent de la même voie a démarré
+    (passer derrière une voie plus prioritaire n'est pas un dépassement).
+    """
+    newest = {}
+    for job in candidates:
+        if job['id'] in started_ids:
+            newest[job['priority']] = max(newest.get(job['priority'], 0), job['id'])
+    updated = {}
+    for job in candidates:
+        if job['id'] in started_ids:
+            continue
+        count = bypassed.get(job['id'], 0)
+        updated[job['id']] = count + 1 if job['id'] < newest.get(job['priority'], 0) else count
+    return updated
@@ -1,6 +1,7 @@
-# utils/ai_logic.py (V1.4)
+# utils/ai_logic.py (V1.5)
 import requests
 from config import Config
+from utils.http_client import get_http_client
 
 class ZenithAI:
     @staticmethod
@@ -8,7 +9,7 @@ class ZenithAI:
         """Communique avec l'API d'Ollama de manière sécurisée."""
         payload = {"model": Config.OLLAMA_MODEL, "messages": messages, "stream": False}
         try:
-            response = requests.post(Config.OLLAMA_URL, json=payload, timeout=30)
+            response = get_http_client().post(Config.OLLAMA_URL, endpoint="ollama.chat", json=payload)
             response.raise_for_status()  # Lève une exception pour les codes d'erreur HTTP (4xx, 5xx)
             return response.json().get("message", {}).get("content", "Réponse vide.")
         except requests.exceptions.Timeout:
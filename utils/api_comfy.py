@@ -1,108 +1,171 @@
-# utils/api_comfy.py (V2.5 - Correction du UnboundLocalError)
-import requests
-import websocket
-import json
+# utils/api_comfy.py (V2.11 - Sorties rendues sous forme de chemin ou d'octets, ouvertes par l'appelant)
 import time
 from pathlib import Path
 from PIL import Image
 from io import BytesIO
 from config import Config
-from urllib.parse import quote
+from urllib.parse import quote, urlsplit
+from utils.comfy_events import get_event_bus, get_job_registry
+from utils.http_client import get_http_client
 
-def send_to_comfy(prompt: dict, client_id: str) -> str:
-    """Envoie le workflow (prompt) à l'API de ComfyUI."""
-    url = f"{Config.COMFYUI_URL}/prompt"
+HISTORY_RETRY_MIN_DELAY = 0.25
+HISTORY_RETRY_MAX_DELAY = 4.0
+
+def send_to_comfy(prompt: dict, client_id: str, base_url: str = None) -> str:
+    """Envoie le workflow (prompt) à l'API de ComfyUI (instance `base_url`, la principale par défaut)."""
+    url = f"{base_url or Config.COMFYUI_URL}/prompt"
     payload = {"prompt": prompt, "client_id": client_id}
     try:
-        response = requests.post(url, json=payload, timeout=10)
+        response = get_http_client().post(url, endpoint="comfy.prompt", json=payload)
         response.raise_for_status()
         return response.json().get('prompt_id', 'NO_ID')
     except Exception as e:
         print(f"Erreur de connexion à ComfyUI: {e}")
         return "ERROR_CONNECTION"
 
-def track_progress(prompt_id: str, client_id: str, console, progress, preview_map):
-    """Suit l'avancement de la génération via WebSocket."""
-    ws_url = f"ws://{Config.COMFYUI_URL.split('//')[1]}/ws?clientId={client_id}"
+def get_queue_prompts(base_url: str = None) -> tuple[set, set] | None:
+    """(prompts en exécution, prompts en attente) d'après /queue, ou None si l'instance ne répond pas."""
+    try:
+        response = get_http_client().get(f"{base_url or Config.COMFYUI_URL}/queue", endpoint="comfy.queue", retries=0)
+        response.raise_for_status()
+        queue = response.json()
+        # Chaque élément : [numéro, prompt_id, prompt, extra_data, sorties]
+        return ({item[1] for item in queue.get('queue_running', [])}, {item[1] for item in queue.get('queue_pending', [])})
+    except Exception as e:
+        print(f"Erreur lors de la lecture de la file ComfyUI: {e}")
+        return None
+
+def delete_from_queue(prompt_ids: list[str], base_url: str = None) -> bool:
+    """Retire des prompts encore en attente de la file ComfyUI (sans effet sur celui en cours d'exécution)."""
     try:
-        ws = websocket.create_connection(ws_url)
-        with console.status("Génération en cours...", expanded=True) as status:
-            while True:
-                out = ws.recv()
-                if isinstance(out, str):
-                    message = json.loads(out)
-                    if message['type'] == 'executing' and message['data']['node'] is None and message['data']['prompt_id'] == prompt_id:
-                        status.update(label="✅ Workflow terminé. Récupération de l'image...")
-                        time.sleep(0.5)
-                        ws.close()
-                        break
-                    elif message['type'] == 'progress':
-                        # --- CORRECTION DE L'ERREUR ---
-                        # On décompose l'opération en étapes claires pour éviter le UnboundLocalError
-                        data = message['data']
-                        p_val = data['value']
-                        p_max = data['max']
-                        # --- FIN DE LA CORRECTION ---
-                        
-                        progress.progress(p_val / p_max)
-                        status.update(label=f"Génération en cours... (Étape {p_val}/{p_max})")
+        response = get_http_client().post(f"{base_url or Config.COMFYUI_URL}/queue", endpoint="comfy.queue", json={"delete": prompt_ids})
+        response.raise_for_status()
+        return True
     except Exception as e:
-        console.error(f"Erreur WebSocket: {e}")
-    finally:
-        if 'ws' in locals() and ws.connected:
-            ws.close()
+        print(f"Erreur lors de la suppression de la file ComfyUI: {e}")
+        return False
+
+def interrupt_prompt(prompt_id: str, base_url: str = None) -> bool:
+    """Interrompt l'exécution en cours ; les versions récentes de ComfyUI ne l'arrêtent que si c'est bien ce prompt."""
+    try:
+        response = get_http_client().post(f"{base_url or Config.COMFYUI_URL}/interrupt", endpoint="comfy.interrupt", json={"prompt_id": prompt_id})
+        response.raise_for_status()
+        return True
+    except Exception as e:
+        print(f"Erreur lors de l'interruption de ComfyUI: {e}")
+        return False
+
+def track_progress(prompt_id: str, client_id: str, console, progress, preview_map, timeout: float = 3600, base_url: str = None):
+    """Suit l'avancement de la génération via le WebSocket partagé du client (aucune connexion dédiée)."""
+    bus, registry = get_event_bus(client_id, base_url), get_job_registry()
+    registry.register(prompt_id, base_url)
+    deadline, version = time.monotonic() + timeout, -1
+    with console.status("Génération en cours...", expanded=True) as status:
+        while (remaining := deadline - time.monotonic()) > 0:
+            state = registry.wait_for_update(prompt_id, version, timeout=min(remaining, 5))
+            if state is None or state['version'] == version:
+                if not bus.connected: status.update(label="Reconnexion à ComfyUI...")
+                continue
+            version = state['version']
+            if state['status'] == 'completed':
+                status.update(label="✅ Workflow terminé. Récupération de l'image...")
+                return
+            if state['status'] == 'failed':
+                console.error(f"Erreur de génération : {state['error']}")
+                return
+            if state['max']:
+                progress.progress(state['progress'])
+                status.update(label=f"Génération en cours... (Étape {state['value']}/{state['max']})")
+    console.error("Délai dépassé pendant le suivi de la génération.")
 
-def get_latest_image(prompt_id: str) -> tuple:
+def _output_images(prompt_id: str, deadline: float, base_url: str = None) -> list[dict]:
     """
-    Récupère l'image finale, avec des tentatives répétées et une journalisation détaillée pour contrer la race condition.
+    Descripteurs des images de sortie du prompt : d'abord ceux poussés par le WebSocket (messages `executed`),
+    sinon /history interrogé avec un backoff exponentiel jusqu'à `deadline`.
     """
-    max_retries = 8
-    retry_delay = 1
+    state = get_job_registry().get(prompt_id)
+    if state and state['status'] == 'completed':
+        # Des sorties WebSocket sans aucune image 'output' (aperçus, fichiers temporaires) renvoient à /history
+        images = [img for img in state['outputs'] if img.get('type') == 'output']
+        if images:
+            return images
 
-    for attempt in range(max_retries):
-        print(f"\n--- [get_latest_image] Tentative {attempt + 1}/{max_retries} ---")
+    delay, attempt = HISTORY_RETRY_MIN_DELAY, 0
+    while True:
+        attempt += 1
         try:
-            url = f"{Config.COMFYUI_URL}/history/{prompt_id}"
-            response = requests.get(url, timeout=10)
+            response = get_http_client().get(f"{base_url or Config.COMFYUI_URL}/history/{prompt_id}", endpoint="comfy.history")
             response.raise_for_status()
-            history = response.json()
-            prompt_history = history.get(prompt_id)
-
-            if prompt_history and 'outputs' in prompt_history:
-                outputs = prompt_history.get('outputs', {})
-                for node_id, node_output in outputs.items():
-                    if 'images' in node_output:
-                        for image_data in node_output['images']:
-                            if image_data['type'] == 'output':
-                                print("✅ Image trouvée dans l'historique !")
-                                source_path = Config.OUTPUT_DIR / image_data.get('subfolder', '') / image_data['filename']
-                                image_url = f"{Config.COMFYUI_URL}/view?filename={quote(image_data['filename'])}&subfolder={quote(image_data.get('subfolder', ''))}&type={image_data['type']}"
-                                
-                                print(f"Téléchargement de l'image depuis : {image_url}")
-                                img_response = requests.get(image_url, timeout=10)
-                                img_response.raise_for_status()
-                                
-                                return Image.open(BytesIO(img_response.content)), image_data['filename'], source_path
-            
-            print("Image non trouvée dans l'historique pour cette tentative.")
-
+            prompt_history = response.json().get(prompt_id) or {}
+            images = [img for out in prompt_history.get('outputs', {}).values() for img in out.get('images', []) if img.get('type') == 'output']
+            if images:
+                return images
         except Exception as e:
-            print(f"Erreur durant la tentative {attempt + 1}: {e}")
+            print(f"Erreur durant la tentative {attempt}: {e}")
+        if time.monotonic() + delay > deadline:
+            return []
+        time.sleep(delay)
+        delay = min(delay * 2, HISTORY_RETRY_MAX_DELAY)
+
+def _is_local_backend(base_url: str = None) -> bool:
+    """OUTPUT_DIR n'est le dossier de sortie que de l'instance principale (première de COMFYUI_URLS)."""
+    return (base_url or Config.COMFYUI_URL).rstrip("/") == Config.COMFYUI_URLS[0]
+
+def _fetch_output_image(image_data: dict, base_url: str = None) -> tuple:
+    """
+    Localise une image de sortie : (chemin sur disque ou octets téléchargés via /view, nom, chemin source).
+    Aucun fichier n'est laissé ouvert ; l'appelant ouvre l'image avec `open_output_image` dans un bloc `with`.
+    """
+    subfolder = image_data.get('subfolder', '')
+    local = _is_local_backend(base_url)
+    source_path = Config.OUTPUT_DIR / subfolder / image_data['filename'] if Config.OUTPUT_DIR and local else None
+    if Config.OUTPUT_RETRIEVAL != "http" and source_path and source_path.exists():
+        return source_path, image_data['filename'], source_path
+    if Config.OUTPUT_RETRIEVAL == "local" and local:
+        raise FileNotFoundError(f"{image_data['filename']} introuvable dans {Config.OUTPUT_DIR}")
+    image_url = f"{base_url or Config.COMFYUI_URL}/view?filename={quote(image_data['filename'])}&subfolder={quote(subfolder)}&type={image_data['type']}"
+    img_response = get_http_client().get(image_url, endpoint="comfy.view")
+    img_response.raise_for_status()
+    if not local:
+        # Sortie d'une instance distante : conservée localement pour la galerie et le stockage
+        source_path = Config.LOG_DIR / "remote_outputs" / urlsplit(base_url).netloc.replace(":", "_") / subfolder / image_data['filename']
+        source_path.parent.mkdir(parents=True, exist_ok=True)
+        source_path.write_bytes(img_response.content)
+    return img_response.content, image_data['filename'], source_path
 
-        print(f"Nouvelle tentative dans {retry_delay} seconde(s)...")
-        time.sleep(retry_delay)
+def open_output_image(source) -> Image.Image:
+    """Ouvre une source rendue par get_output_images (chemin ou octets), à utiliser dans un bloc `with`."""
+    return Image.open(BytesIO(source) if isinstance(source, bytes) else source)
+
+def get_output_images(prompt_id: str, timeout: float = 15, base_url: str = None) -> list[tuple]:
+    """
+    Retourne toutes les images d'un prompt (lot complet) sous forme de [(source, nom, chemin source)],
+    `source` étant le chemin sur disque ou le contenu téléchargé (voir open_output_image).
+    Les sorties d'une instance distante sont copiées sous LOG_DIR/remote_outputs.
+    """
+    results = []
+    for image_data in _output_images(prompt_id, time.monotonic() + timeout, base_url):
+        try:
+            results.append(_fetch_output_image(image_data, base_url))
+        except Exception as e:
+            print(f"Impossible de récupérer {image_data.get('filename')}: {e}")
+    if not results:
+        print(f"--- Échec de la récupération des images du prompt {prompt_id}. ---")
+    return results
 
-    print("--- Échec final de la récupération de l'image après plusieurs tentatives. ---")
-    return None, None, None
+def get_latest_image(prompt_id: str, base_url: str = None) -> tuple:
+    """Première image du prompt (compatibilité) ; voir get_output_images pour un lot complet."""
+    images = get_output_images(prompt_id, base_url=base_url)
+    return images[0] if images else (None, None, None)
 
-def poll_job_status(prompt_id: str) -> dict:
+def poll_job_status(prompt_id: str, base_url: str = None) -> dict:
     """
     Poll the status of a ComfyUI job via the history API.
     Returns a dict with status info.
     """
     try:
-        url = f"{Config.COMFYUI_URL}/history/{prompt_id}"
-        response = requests.get(url, timeout=5)
+        url = f"{base_url or Config.COMFYUI_URL}/history/{prompt_id}"
+        response = get_http_client().get(url, endpoint="comfy.history")
         response.raise_for_status()
         history = response.json()
 
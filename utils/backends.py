@@ -0,0 +1,162 @@
+# utils/backends.py (V1.1 - Pool d'instances ComfyUI : santé, profondeur de file, VRAM, répartition)
+import itertools
+import threading
+import time
+from config import Config
+from utils.http_client import get_http_client
+
+FAILURES_BEFORE_DOWN = 2
+
+
+class Backend:
+    """Une instance ComfyUI et son dernier état connu."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True  # optimiste jusqu'au premier contrôle
+        self.queue_running = 0
+        self.queue_pending = 0
+        self.inflight = 0    # soumis depuis le dernier contrôle, pas encore visibles dans /queue
+        self.failures = 0
+        self.latency_ms = None
+        self.vram_free = None    # octets, d'après /system_stats (premier périphérique)
+        self.vram_total = None
+        self.last_check = None
+        self.last_error = None
+
+    @property
+    def load(self) -> int:
+        return self.queue_running + self.queue_pending + self.inflight
+
+    @property
+    def vram_free_ratio(self) -> float | None:
+        return self.vram_free / self.vram_total if self.vram_free is not None and self.vram_total else None
+
+    @property
+    def is_local(self) -> bool:
+        """L'instance principale est celle dont OUTPUT_DIR est le dossier de sortie."""
+        return self.url == Config.COMFYUI_URLS[0].rstrip("/")
+
+    def as_dict(self) -> dict:
+        return {'url': self.url, 'healthy': self.healthy, 'running': self.queue_running, 'pending': self.queue_pending,
+                'inflight': self.inflight, 'latency_ms': self.latency_ms, 'vram_free_ratio': self.vram_free_ratio,
+                'last_error': self.last_error}
+
+
+class BackendPool:
+    """
+    Répartit les travaux sur l'instance saine la moins chargée (/queue + soumissions en vol).
+    Un thread de fond contrôle chaque instance : marquée hors ligne après des échecs consécutifs,
+    remise en ligne au premier contrôle réussi.
+    """
+
+    def __init__(self, urls: list[str], check_interval: float = None):
+        self.backends = {b.url: b for b in (Backend(u) for u in urls)}
+        self.check_interval = check_interval or Config.BACKEND_CHECK_INTERVAL
+        self._lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, url: str | None) -> Backend:
+        """Instance associée à une URL (la principale si l'URL est inconnue ou absente)."""
+        return self.backends.get((url or "").rstrip("/")) or next(iter(self.backends.values()))
+
+    def check(self, backend: Backend) -> bool:
+        start = time.perf_counter()
+        try:
+            response = get_http_client().get(f"{backend.url}/queue", endpoint="comfy.queue", retries=0)
+            response.raise_for_status()
+            queue = response.json()
+            with self._lock:
+                backend.queue_running = len(queue.get('queue_running', []))
+                backend.queue_pending = len(queue.get('queue_pending', []))
+                backend.inflight, backend.failures, backend.healthy = 0, 0, True
+                backend.latency_ms, backend.last_error = (time.perf_counter() - start) * 1000, None
+        except Exception as e:
+            with self._lock:
+                backend.failures += 1
+                backend.last_error = str(e)
+                if backend.failures >= FAILURES_BEFORE_DOWN:
+                    backend.healthy = False
+        if backend.healthy:
+            self._check_vram(backend)
+        backend.last_check = time.time()
+        return backend.healthy
+
+    def _check_vram(self, backend: Backend):
+        """VRAM libre du GPU de l'instance ; facultatif, son absence ne rend pas l'instance indisponible."""
+        try:
+            response = get_http_client().get(f"{backend.url}/system_stats", endpoint="comfy.system_stats", retries=0)
+            response.raise_for_status()
+            devices = response.json().get('devices') or []
+            with self._lock:
+                if devices:
+                    backend.vram_free, backend.vram_total = devices[0].get('vram_free'), devices[0].get('vram_total')
+        except Exception:
+            pass
+
+    def refresh(self):
+        for backend in list(self.backends.values()):
+            self.check(backend)
+
+    def pick(self, allowed: set[str] = None) -> Backend | None:
+        """Instance saine la moins chargée (parmi `allowed` si fourni) ; None si aucune n'est disponible."""
+        with self._lock:
+            healthy = [b for b in self.backends.values() if b.healthy and (allowed is None or b.url in allowed)]
+            if not healthy:
+                return None
+            # À charge égale, on tourne entre les instances pour répartir un lot
+            offset = next(self._round_robin)
+            ranked = sorted(enumerate(healthy), key=lambda ib: (ib[1].load, (ib[0] - offset) % len(healthy)))
+            backend = ranked[0][1]
+            backend.inflight += 1
+            return backend
+
+    def release(self, backend: Backend):
+        """Annule une réservation faite par pick() quand la soumission a échoué."""
+        with self._lock:
+            backend.inflight = max(0, backend.inflight - 1)
+
+    def mark_failed(self, backend: Backend, error: str):
+        with self._lock:
+            backend.failures += 1
+            backend.last_error = error
+            if backend.failures >= FAILURES_BEFORE_DOWN:
+                backend.healthy = False
+
+    def any_healthy(self) -> bool:
+        return any(b.healthy for b in self.backends.values())
+
+    def status(self) -> list[dict]:
+        with self._lock:
+            return [b.as_dict() for b in self.backends.values()]
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="comfy-backends", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            if self._stop.wait(self.check_interval):
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_backend_pool() -> BackendPool:
+    """Pool construit depuis COMFYUI_URLS, contrôlé en arrière-plan (une seule fois par processus)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BackendPool(Config.COMFYUI_URLS)
+            _pool.start()
+        return _pool
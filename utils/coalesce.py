@@ -0,0 +1,75 @@
+# utils/coalesce.py (V1.1 - Regroupement des travaux qui ne diffèrent que par la seed, hors balayages)
+import copy
+import json
+
+SEED_INPUTS = ("seed", "noise_seed")
+OUTPUT_NODES = ("SaveImage", "PreviewImage")
+
+
+def _latent_nodes(wf: dict) -> list[dict]:
+    """Nœuds de latent vide dont batch_size fixe la taille du lot (EmptyLatentImage et variantes)."""
+    return [n for n in wf.values() if isinstance(n, dict) and n.get("class_type", "").startswith("Empty")
+            and isinstance(n.get("inputs", {}).get("batch_size"), int)]
+
+
+def batch_size(wf: dict) -> int:
+    latents = _latent_nodes(wf)
+    return latents[0]['inputs']['batch_size'] if len(latents) == 1 else 1
+
+
+def coalesce_key(wf: dict) -> str | None:
+    """
+    Forme canonique du workflow sans seeds ni taille de lot ; None si le graphe ne se prête pas au regroupement
+    (pas exactement un latent vide ou une sortie image : les images du lot ne pourraient pas être réattribuées).
+    """
+    if len(_latent_nodes(wf)) != 1:
+        return None
+    if sum(1 for n in wf.values() if isinstance(n, dict) and n.get("class_type") in OUTPUT_NODES) != 1:
+        return None
+    canonical = copy.deepcopy(wf)
+    for node in canonical.values():
+        if not isinstance(node, dict):
+            continue
+        inputs = node.get("inputs", {})
+        for name in SEED_INPUTS:
+            if not isinstance(inputs.get(name), list):  # une seed reliée à un autre nœud fait partie du graphe
+                inputs.pop(name, None)
+    _latent_nodes(canonical)[0]['inputs'].pop('batch_size')
+    return json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+
+
+def plan_batches(jobs: list[dict], max_batch: int) -> list[list[dict]]:
+    """
+    Répartit les travaux (ordre de la file) en soumissions : chaque travail rejoint le premier lot compatible
+    qui a encore de la place, sinon ouvre un nouveau lot. L'ordre des lots suit celui de leur premier travail.
+    Les travaux d'un balayage restent seuls : le lot tournerait avec la seed du premier travail alors que
+    la planche contact et les libellés affichent la seed de chacun.
+    """
+    batches, open_batches = [], {}
+    for job in jobs:
+        size = batch_size(job['workflow'])
+        key = coalesce_key(job['workflow']) if max_batch > 1 and job.get('group_id') is None else None
+        batch = open_batches.get(key) if key else None
+        if batch is not None and sum(batch_size(j['workflow']) for j in batch) + size <= max_batch:
+            batch.append(job)
+            continue
+        batches.append([job])
+        if key:
+            open_batches[key] = batches[-1]
+    return batches
+
+
+def merge_workflow(batch: list[dict]) -> dict:
+    """Workflow du premier travail, avec un lot couvrant toutes les images du groupe (seed du premier travail)."""
+    wf = copy.deepcopy(batch[0]['workflow'])
+    _latent_nodes(wf)[0]['inputs']['batch_size'] = sum(batch_size(job['workflow']) for job in batch)
+    return wf
+
+
+def batch_offsets(batch: list[dict]) -> list[int]:
+    """Position de la première image de chaque travail dans les sorties du lot regroupé."""
+    offsets, offset = [], 0
+    for job in batch:
+        offsets.append(offset)
+        offset += batch_size(job['workflow'])
+    return offsets
@@ -0,0 +1,137 @@
+# utils/comfy_async.py (V1.3 - Client ComfyUI asyncio multi-instances et façade synchrone, limites documentées)
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from utils.api_comfy import send_to_comfy, get_output_images
+from utils.comfy_events import get_event_bus, get_job_registry, TERMINAL_STATUSES
+
+
+class AsyncComfyClient:
+    """
+    Soumission et collecte concurrentes : les appels HTTP (pool keep-alive partagé) tournent dans un
+    exécuteur dédié, la fin des travaux est attendue sur le registre alimenté par le WebSocket du client.
+
+    Ce n'est pas un client HTTP asynchrone (aiohttp ne fait pas partie des dépendances) : les appels
+    synchrones d'api_comfy sont délégués à un ThreadPoolExecutor, avec les limites suivantes.
+    - Chaque requête en vol occupe un thread pendant toute sa durée.
+    - Au plus HTTP_POOL_SIZE requêtes tournent en même temps ; les suivantes attendent un thread libre.
+    - `fetch_outputs` garde son thread pendant les relances de /history (jusqu'à 15 s si les sorties tardent).
+    - Seule l'attente de fin (`wait_for`) est réellement non bloquante.
+    """
+
+    def __init__(self, client_id: str, executor: ThreadPoolExecutor = None):
+        self.client_id = client_id
+        self._executor = executor or _get_executor()
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def submit(self, prompt: dict, base_url: str = None) -> str:
+        prompt_id = await self._call(send_to_comfy, prompt, self.client_id, base_url)
+        if prompt_id != "ERROR_CONNECTION":
+            get_job_registry().register(prompt_id, base_url)
+        return prompt_id
+
+    async def submit_many(self, prompts: list[dict], base_urls: list[str] = None) -> list[str]:
+        """
+        Soumet tous les prompts en parallèle ; l'ordre des prompt_id suit celui des prompts.
+        `base_urls` (aligné sur `prompts`) désigne l'instance de chaque prompt, la principale par défaut.
+        """
+        base_urls = base_urls or [None] * len(prompts)
+        for base_url in set(base_urls):
+            get_event_bus(self.client_id, base_url)  # WebSocket ouvert avant l'envoi pour ne manquer aucun message
+        return list(await asyncio.gather(*(self.submit(p, u) for p, u in zip(prompts, base_urls))))
+
+    async def wait_for(self, prompt_id: str, timeout: float = 3600) -> dict | None:
+        """Attend un statut final (completed/failed) poussé par le WebSocket, sans occuper de thread."""
+        registry, loop = get_job_registry(), asyncio.get_running_loop()
+        done = asyncio.Event()
+
+        def on_update(pid, state):
+            if pid == prompt_id and state['status'] in TERMINAL_STATUSES:
+                loop.call_soon_threadsafe(done.set)
+
+        registry.subscribe(on_update)
+        try:
+            state = registry.get(prompt_id)
+            if not (state and state['status'] in TERMINAL_STATUSES):
+                try: await asyncio.wait_for(done.wait(), timeout)
+                except asyncio.TimeoutError: pass
+            return registry.get(prompt_id)
+        finally:
+            registry.unsubscribe(on_update)
+
+    async def fetch_outputs(self, prompt_id: str, base_url: str = None) -> list[tuple]:
+        return await self._call(get_output_images, prompt_id, 15, base_url)
+
+    async def collect(self, prompt_ids: list[str], base_urls: list[str] = None) -> dict:
+        """{prompt_id: [(source, nom, chemin)]} pour des travaux terminés, récupérés en parallèle."""
+        base_urls = base_urls or [None] * len(prompt_ids)
+        results = await asyncio.gather(*(self.fetch_outputs(pid, u) for pid, u in zip(prompt_ids, base_urls)))
+        return dict(zip(prompt_ids, results))
+
+    async def run_many(self, prompts: list[dict], base_urls: list[str] = None, timeout: float = 3600) -> dict:
+        """Soumet, attend puis collecte : {prompt_id: {'state': ..., 'images': [...]}}."""
+        base_urls = base_urls or [None] * len(prompts)
+        submitted = [(pid, u) for pid, u in zip(await self.submit_many(prompts, base_urls), base_urls) if pid != "ERROR_CONNECTION"]
+
+        async def finish(pid, base_url):
+            state = await self.wait_for(pid, timeout)
+            images = await self.fetch_outputs(pid, base_url) if state and state['status'] == 'completed' else []
+            return pid, {'state': state, 'images': images}
+
+        return dict(await asyncio.gather(*(finish(pid, u) for pid, u in submitted)))
+
+
+# --- Façade synchrone : une boucle asyncio dédiée, partagée par toutes les sessions Streamlit ---
+
+_loop = None
+_executor = None
+_loop_lock = threading.Lock()
+_clients = {}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Exécuteur partagé, dimensionné comme le pool de connexions HTTP."""
+    global _executor
+    with _loop_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.HTTP_POOL_SIZE, thread_name_prefix="comfy-async")
+        return _executor
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="comfy-async-loop", daemon=True).start()
+        return _loop
+
+
+def get_async_client(client_id: str) -> AsyncComfyClient:
+    executor = _get_executor()
+    with _loop_lock:
+        if client_id not in _clients:
+            _clients[client_id] = AsyncComfyClient(client_id, executor)
+        return _clients[client_id]
+
+
+def run_sync(coro, timeout: float = None):
+    """Exécute une coroutine sur la boucle dédiée depuis du code synchrone (script Streamlit)."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+
+def submit_prompts(prompts: list[dict], client_id: str, base_urls: list[str] = None) -> list[str]:
+    """Équivalent concurrent de `[send_to_comfy(p, client_id, u) for p, u in zip(prompts, base_urls)]`."""
+    if not prompts:
+        return []
+    return run_sync(get_async_client(client_id).submit_many(prompts, base_urls))
+
+
+def collect_outputs(prompt_ids: list[str], client_id: str, base_urls: list[str] = None) -> dict:
+    """Équivalent concurrent de `{pid: get_output_images(pid, base_url=u) for pid, u in zip(prompt_ids, base_urls)}`."""
+    if not prompt_ids:
+        return {}
+    return run_sync(get_async_client(client_id).collect(prompt_ids, base_urls))
@@ -0,0 +1,295 @@
+# utils/comfy_events.py (V1.2 - Un bus par client et par instance ComfyUI, aperçus latents)
+import json
+import random
+import struct
+import threading
+import time
+from collections import OrderedDict
+import websocket
+from config import Config
+
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+RECV_TIMEOUT = 1.0
+TERMINAL_STATUSES = ("completed", "failed")
+REGISTRY_RETENTION = 1800  # secondes de conservation des travaux terminés
+# Trames binaires ComfyUI : type d'événement (uint32 big-endian) puis charge utile
+PREVIEW_IMAGE = 1                  # uint32 format (1 = JPEG, 2 = PNG) + image
+PREVIEW_IMAGE_WITH_METADATA = 4    # uint32 longueur + JSON {prompt_id, node_id, ...} + image
+PREVIEW_FORMATS = {1: "jpeg", 2: "png"}
+
+
+class JobRegistry:
+    """
+    État des travaux ComfyUI indexé par prompt_id, partagé entre le thread du WebSocket et les sessions Streamlit.
+    Chaque mise à jour incrémente `version` et réveille les threads en attente dans `wait_for_update`.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._listeners = []
+        self.queue_remaining = None
+
+    @staticmethod
+    def _new_state() -> dict:
+        return {'status': 'queued', 'progress': 0.0, 'node': None, 'value': 0, 'max': 0,
+                'outputs': [], 'error': None, 'backend': None, 'updated': time.time(), 'version': 0}
+
+    def register(self, prompt_id: str, backend: str = None):
+        """Déclare un travail soumis (et l'instance qui l'exécute) ; conserve les messages déjà reçus."""
+        with self._cond:
+            state = self._jobs.setdefault(prompt_id, self._new_state())
+            if backend: state['backend'] = backend
+
+    def update(self, prompt_id: str, **fields) -> dict | None:
+        if not prompt_id:
+            return None
+        with self._cond:
+            state = self._jobs.setdefault(prompt_id, self._new_state())
+            # Un statut final est définitif (ComfyUI envoie encore `executing: None` après une erreur)
+            if state['status'] in TERMINAL_STATUSES:
+                fields.pop('status', None)
+            outputs = fields.pop('outputs', None)
+            if outputs: state['outputs'].extend(outputs)
+            state.update(fields, updated=time.time(), version=state['version'] + 1)
+            self._cond.notify_all()
+            snapshot, listeners = dict(state), list(self._listeners)
+        for listener in listeners:
+            listener(prompt_id, snapshot)
+        return snapshot
+
+    def subscribe(self, listener):
+        """`listener(prompt_id, state)` est appelé (hors verrou) après chaque mise à jour."""
+        with self._cond:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self._cond:
+            if listener in self._listeners: self._listeners.remove(listener)
+
+    def get(self, prompt_id: str) -> dict | None:
+        with self._cond:
+            state = self._jobs.get(prompt_id)
+            return dict(state, outputs=list(state['outputs'])) if state else None
+
+    def pending(self, backend: str = None) -> list[str]:
+        with self._cond:
+            return [pid for pid, s in self._jobs.items()
+                    if s['status'] not in TERMINAL_STATUSES and (backend is None or s['backend'] in (None, backend))]
+
+    def forget(self, prompt_id: str):
+        with self._cond:
+            self._jobs.pop(prompt_id, None)
+
+    def prune(self, max_age: float = REGISTRY_RETENTION):
+        limit = time.time() - max_age
+        with self._cond:
+            for pid in [pid for pid, s in self._jobs.items() if s['status'] in TERMINAL_STATUSES and s['updated'] < limit]:
+                del self._jobs[pid]
+
+    def wait_for_update(self, prompt_id: str, since_version: int, timeout: float = None) -> dict | None:
+        """Bloque jusqu'à ce que l'état du travail dépasse `since_version` (ou jusqu'au timeout)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._jobs.get(prompt_id, {}).get('version', 0) > since_version, timeout)
+        return self.get(prompt_id)
+
+
+def _ws_url(client_id: str, base_url: str = None) -> str:
+    base = (base_url or Config.COMFYUI_URL).rstrip("/")
+    scheme, _, host = base.partition("://")
+    return f"{'wss' if scheme == 'https' else 'ws'}://{host}/ws?clientId={client_id}"
+
+
+def parse_preview_frame(frame: bytes) -> tuple[str | None, bytes] | None:
+    """(prompt_id ou None, image encodée) d'une trame d'aperçu ; None pour les autres trames binaires."""
+    if len(frame) < 8:
+        return None
+    event, = struct.unpack(">I", frame[:4])
+    if event == PREVIEW_IMAGE:
+        return None, frame[8:]
+    if event == PREVIEW_IMAGE_WITH_METADATA:
+        size, = struct.unpack(">I", frame[4:8])
+        try:
+            metadata = json.loads(frame[8:8 + size])
+        except ValueError:
+            return None
+        return metadata.get('prompt_id'), frame[8 + size:]
+    return None
+
+
+class PreviewBuffer:
+    """
+    Dernier aperçu latent de chaque travail (images JPEG/PNG telles qu'envoyées par ComfyUI, non décodées).
+    Limité en nombre de travaux (les plus anciens sortent) et en cadence : au plus PREVIEW_FPS images par seconde
+    et par travail sont conservées, les autres trames sont ignorées.
+    """
+
+    def __init__(self, max_jobs: int = None, fps: float = None):
+        self.max_jobs = max_jobs or Config.PREVIEW_MAX_JOBS
+        self.min_interval = 1.0 / (fps or Config.PREVIEW_FPS)
+        self._previews = OrderedDict()  # prompt_id -> (horodatage, image)
+        self._lock = threading.Lock()
+
+    def put(self, prompt_id: str, image: bytes) -> bool:
+        now = time.time()
+        with self._lock:
+            previous = self._previews.get(prompt_id)
+            if previous and now - previous[0] < self.min_interval:
+                return False
+            self._previews[prompt_id] = (now, image)
+            self._previews.move_to_end(prompt_id)
+            while len(self._previews) > self.max_jobs:
+                self._previews.popitem(last=False)
+            return True
+
+    def get(self, prompt_id: str) -> bytes | None:
+        with self._lock:
+            entry = self._previews.get(prompt_id)
+            return entry[1] if entry else None
+
+    def discard(self, prompt_id: str):
+        with self._lock:
+            self._previews.pop(prompt_id, None)
+
+
+class ComfyEventBus:
+    """
+    Un WebSocket longue durée par client_id et par instance ComfyUI, consommé dans un thread dédié.
+    Les messages executing/progress/executed/execution_* alimentent le JobRegistry ;
+    en cas de coupure, reconnexion avec backoff exponentiel puis rattrapage des travaux via /history.
+    """
+
+    def __init__(self, client_id: str, registry: JobRegistry, base_url: str = None):
+        self.client_id, self.registry = client_id, registry
+        self.base_url = (base_url or Config.COMFYUI_URL).rstrip("/")
+        self.connected = False
+        self.last_error = None
+        self._current_prompt = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"comfy-ws-{self.client_id[:8]}", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        delay = RECONNECT_MIN_DELAY
+        while not self._stop.is_set():
+            ws = None
+            try:
+                ws = websocket.create_connection(_ws_url(self.client_id, self.base_url), timeout=10)
+                ws.settimeout(RECV_TIMEOUT)
+                self.connected, self.last_error, delay = True, None, RECONNECT_MIN_DELAY
+                self._reconcile()
+                while not self._stop.is_set():
+                    try:
+                        message = ws.recv()
+                    except websocket.WebSocketTimeoutException:
+                        continue
+                    if isinstance(message, str):
+                        self._dispatch(json.loads(message))
+                    elif message:
+                        self._on_preview(message)
+            except Exception as e:
+                self.last_error = str(e)
+            finally:
+                self.connected = False
+                if ws is not None:
+                    try: ws.close()
+                    except Exception: pass
+            # Backoff exponentiel avec gigue pour ne pas marteler un serveur redémarré
+            if self._stop.wait(delay * random.uniform(0.8, 1.2)):
+                break
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _reconcile(self):
+        """Après (re)connexion : les travaux terminés pendant la coupure n'enverront plus de message."""
+        from utils.api_comfy import poll_job_status
+        for prompt_id in self.registry.pending(self.base_url):
+            status = poll_job_status(prompt_id, self.base_url)
+            if status['status'] == 'completed':
+                outputs = [img for out in status['data'].get('outputs', {}).values() for img in out.get('images', [])]
+                self.registry.update(prompt_id, status='completed', progress=1.0, outputs=outputs)
+            elif status['status'] == 'failed':
+                self.registry.update(prompt_id, status='failed', error=status.get('error'))
+
+    def _on_preview(self, frame: bytes):
+        """Trame binaire : aperçu du sampler en cours (ComfyUI lancé avec --preview-method)."""
+        parsed = parse_preview_frame(frame)
+        if parsed is None:
+            return
+        prompt_id, image = parsed
+        prompt_id = prompt_id or self._current_prompt  # les trames sans métadonnées concernent le prompt en cours
+        if prompt_id and image:
+            _previews.put(prompt_id, image)
+
+    def _dispatch(self, message: dict):
+        kind, data = message.get('type'), message.get('data') or {}
+        prompt_id = data.get('prompt_id')
+        if kind == 'status':
+            self.registry.queue_remaining = data.get('status', {}).get('exec_info', {}).get('queue_remaining')
+        elif kind == 'execution_start':
+            self._current_prompt = prompt_id
+            self.registry.update(prompt_id, status='running')
+        elif kind == 'executing':
+            if data.get('node') is None:
+                # Fin du workflow (node None) : l'exécution du prompt est terminée
+                if prompt_id:
+                    self.registry.update(prompt_id, status='completed', progress=1.0, node=None)
+                    _previews.discard(prompt_id)
+                self._current_prompt = None
+            else:
+                self._current_prompt = prompt_id or self._current_prompt
+                self.registry.update(self._current_prompt, status='running', node=data['node'])
+        elif kind == 'progress':
+            # Les anciennes versions de ComfyUI n'envoient pas le prompt_id avec la progression
+            prompt_id = prompt_id or self._current_prompt
+            if prompt_id and data.get('max'):
+                self.registry.update(prompt_id, status='running', value=data['value'], max=data['max'], progress=data['value'] / data['max'])
+        elif kind == 'executed':
+            images = (data.get('output') or {}).get('images', [])
+            if prompt_id and images: self.registry.update(prompt_id, outputs=images)
+        elif kind == 'execution_success':
+            self.registry.update(prompt_id, status='completed', progress=1.0)
+            _previews.discard(prompt_id)
+        elif kind == 'execution_error':
+            error = f"{data.get('node_type', '')}: {data.get('exception_message', 'Erreur inconnue')}".strip(": ")
+            self.registry.update(prompt_id, status='failed', error=error)
+            _previews.discard(prompt_id)
+        elif kind == 'execution_interrupted':
+            self.registry.update(prompt_id, status='failed', error="Génération interrompue")
+            _previews.discard(prompt_id)
+
+
+_registry = JobRegistry()
+_previews = PreviewBuffer()
+_buses = {}
+_buses_lock = threading.Lock()
+
+
+def get_job_registry() -> JobRegistry:
+    return _registry
+
+
+def get_preview_buffer() -> PreviewBuffer:
+    return _previews
+
+
+def get_event_bus(client_id: str, base_url: str = None) -> ComfyEventBus:
+    """Retourne (et démarre si besoin) le bus d'événements de ce client_id sur l'instance `base_url`."""
+    key = (client_id, (base_url or Config.COMFYUI_URL).rstrip("/"))
+    with _buses_lock:
+        bus = _buses.get(key)
+        if bus is None:
+            bus = _buses[key] = ComfyEventBus(client_id, _registry, key[1])
+    bus.start()
+    return bus
@@ -0,0 +1,317 @@
+# utils/fs_watcher.py (V1.4 - Fichiers signalés une fois leur écriture terminée, en mode inotify aussi)
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from config import Config
+from utils.model_inventory import MODEL_EXTENSIONS as MODEL_SUFFIXES
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # watchdog non installé : on bascule sur le polling
+    Observer, FileSystemEventHandler = None, object
+
+IMAGE_SUFFIXES = (".png",)
+DEBOUNCE_SECONDS = 0.5
+
+
+class _WatchRoot:
+    """Dossier surveillé, avec l'état nécessaire au mode polling."""
+
+    def __init__(self, tag: str, path: Path, recursive: bool, suffixes: tuple):
+        self.tag, self.path, self.recursive, self.suffixes = tag, Path(path), recursive, suffixes
+        self.dir_mtimes = {}   # dossier -> mtime_ns
+        self.listings = {}     # dossier -> ({fichier: (taille, mtime_ns)}, [sous-dossiers])
+        self.unstable = {}     # chemin -> (taille, mtime_ns) des fichiers récemment apparus
+        self.settling = {}     # mode inotify : chemin créé/modifié -> (taille, mtime_ns) au dernier contrôle, None si pas encore vu
+
+    def matches(self, path: str) -> bool:
+        return path.lower().endswith(self.suffixes)
+
+    def poll(self) -> tuple[set, set]:
+        """Ne relit que les dossiers dont le mtime a changé ; retourne (créés/modifiés, supprimés)."""
+        created, deleted, visited = set(), set(), set()
+        # Un fichier juste apparu peut être en cours d'écriture : on le revérifie jusqu'à ce qu'il soit stable
+        for path, sig in list(self.unstable.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                self.unstable.pop(path)
+                continue
+            if (st.st_size, st.st_mtime_ns) == sig:
+                self.unstable.pop(path)
+            else:
+                self.unstable[path] = (st.st_size, st.st_mtime_ns)
+                created.add(path)
+
+        stack = [str(self.path)]
+        while stack:
+            directory = stack.pop()
+            visited.add(directory)
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            old_files, subdirs = self.listings.get(directory, ({}, []))
+            if self.dir_mtimes.get(directory) != mtime:
+                files, subdirs = {}, []
+                try:
+                    with os.scandir(directory) as it:
+                        for entry in it:
+                            try:
+                                if entry.is_dir():
+                                    if self.recursive: subdirs.append(entry.path)
+                                elif self.matches(entry.name):
+                                    st = entry.stat()
+                                    files[entry.name] = (st.st_size, st.st_mtime_ns)
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+                for name, sig in files.items():
+                    if old_files.get(name) != sig:
+                        path = os.path.join(directory, name)
+                        created.add(path)
+                        self.unstable[path] = sig
+                deleted.update(os.path.join(directory, n) for n in old_files if n not in files)
+                self.dir_mtimes[directory], self.listings[directory] = mtime, (files, subdirs)
+            stack.extend(subdirs)
+
+        for directory in [d for d in self.listings if d not in visited]:
+            deleted.update(os.path.join(directory, n) for n in self.listings.pop(directory)[0])
+            self.dir_mtimes.pop(directory, None)
+        return created, deleted
+
+
+class _EventForwarder(FileSystemEventHandler):
+    def __init__(self, watcher, root: _WatchRoot):
+        self.watcher, self.root = watcher, root
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            # Un dossier de modèles déplacé ou supprimé : on resynchronise ce tag par polling
+            if event.event_type in ("deleted", "moved"): self.watcher.request_resync(self.root.tag)
+            return
+        if event.event_type in ("created", "modified") and self.root.matches(event.src_path):
+            # Fichier peut-être encore en cours d'écriture : signalé à la fermeture ou quand il ne bouge plus
+            self.watcher.defer(self.root.tag, event.src_path)
+        elif event.event_type == "closed" and self.root.matches(event.src_path):
+            self.watcher.push(self.root.tag, event.src_path, None)
+        elif event.event_type == "deleted" and self.root.matches(event.src_path):
+            self.watcher.push(self.root.tag, None, event.src_path)
+        elif event.event_type == "moved":
+            # Un renommage publie un fichier déjà complet (écriture dans un fichier temporaire puis rename)
+            dest = getattr(event, 'dest_path', None)
+            self.watcher.push(
+                self.root.tag,
+                dest if dest and self.root.matches(dest) else None,
+                event.src_path if self.root.matches(event.src_path) else None,
+            )
+
+
+class FsWatcher:
+    """
+    Surveille des dossiers (inotify via watchdog si disponible, sinon polling des mtimes)
+    et transmet aux abonnés des lots de fichiers créés/supprimés, regroupés par tag.
+    """
+
+    def __init__(self, poll_interval: float = None, force_polling: bool = None):
+        self.poll_interval = poll_interval or Config.FS_WATCH_POLL_INTERVAL
+        self.use_polling = (force_polling if force_polling is not None else Config.FS_WATCH_FORCE_POLLING) or Observer is None
+        self._roots = {}
+        self._subscribers = []
+        self._events = queue.Queue()
+        self._versions = {}
+        self._created_counts = {}
+        self._resync = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._observer = None
+        self._threads = []
+
+    @property
+    def mode(self) -> str:
+        return "polling" if self.use_polling else "inotify"
+
+    def watch(self, tag: str, path: Path, recursive: bool = False, suffixes: tuple = IMAGE_SUFFIXES):
+        if not path or not Path(path).exists() or tag in self._roots:
+            return
+        root = _WatchRoot(tag, path, recursive, suffixes)
+        self._roots[tag] = root
+        if self._observer is not None:
+            self._observer.schedule(_EventForwarder(self, root), str(root.path), recursive=recursive)
+
+    def subscribe(self, callback):
+        """`callback(tag, root_path, created: set[Path], deleted: set[Path])`, appelé depuis le thread du watcher."""
+        self._subscribers.append(callback)
+
+    def push(self, tag: str, created: str | None, deleted: str | None):
+        with self._lock:
+            root = self._roots[tag]
+            for path in (created, deleted):
+                if path: root.settling.pop(path, None)
+        self._events.put((tag, created, deleted))
+
+    def defer(self, tag: str, path: str):
+        """Attend que le fichier soit stable avant de le signaler (voir _WatchRoot.settle)."""
+        with self._lock:
+            self._roots[tag].settling[path] = None
+
+    def request_resync(self, tag: str):
+        with self._lock:
+            self._resync.add(tag)
+
+    def version(self, tag: str) -> int:
+        """Compteur incrémenté à chaque lot de changements (permet aux pages de détecter les nouveautés)."""
+        with self._lock:
+            return self._versions.get(tag, 0)
+
+    def created_count(self, tag: str) -> int:
+        with self._lock:
+            return self._created_counts.get(tag, 0)
+
+    def start(self):
+        if self._threads:
+            return
+        if not self.use_polling:
+            self._observer = Observer()
+            for root in self._roots.values():
+                self._observer.schedule(_EventForwarder(self, root), str(root.path), recursive=root.recursive)
+            self._observer.daemon = True
+            self._observer.start()
+            self._threads.append(threading.Thread(target=self._dispatch_loop, name="fs-watcher-dispatch", daemon=True))
+        self._threads.append(threading.Thread(target=self._poll_loop, name="fs-watcher-poll", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def _emit(self, tag: str, created: set, deleted: set):
+        if not created and not deleted:
+            return
+        root = self._roots[tag]
+        with self._lock:
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+            self._created_counts[tag] = self._created_counts.get(tag, 0) + len(created - deleted)
+        for callback in list(self._subscribers):
+            try:
+                callback(tag, root.path, {Path(p) for p in created}, {Path(p) for p in deleted})
+            except Exception as e:
+                print(f"Erreur dans un abonné du watcher ({tag}): {e}")
+
+    def _settle(self):
+        """
+        Mode inotify, pour les fichiers sans événement de fermeture : signalés quand leur taille et leur date
+        n'ont pas bougé depuis le contrôle précédent (un intervalle de polling).
+        """
+        with self._lock:
+            snapshot = [(tag, path, sig) for tag, root in self._roots.items() for path, sig in root.settling.items()]
+        if not snapshot:
+            return
+        current = {}
+        for _, path, _ in snapshot:
+            try:
+                st = os.stat(path)
+                current[path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                current[path] = None
+        with self._lock:
+            for tag, path, sig in snapshot:
+                settling = self._roots[tag].settling
+                if path not in settling or settling[path] != sig:
+                    continue  # nouvel événement entre-temps : on attend le contrôle suivant
+                if current[path] is None:
+                    settling.pop(path)
+                elif current[path] == sig:
+                    settling.pop(path)
+                    self._events.put((tag, path, None))
+                else:
+                    settling[path] = current[path]
+
+    def _dispatch_loop(self):
+        """Regroupe les événements inotify par rafales (un fichier PNG est créé puis écrit en plusieurs fois)."""
+        while not self._stop.is_set():
+            try:
+                first = self._events.get(timeout=1)
+            except queue.Empty:
+                continue
+            batch, deadline = [first], time.monotonic() + DEBOUNCE_SECONDS
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    batch.append(self._events.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            changes = {}
+            for tag, created, deleted in batch:
+                c, d = changes.setdefault(tag, (set(), set()))
+                if deleted: d.add(deleted); c.discard(deleted)
+                if created: c.add(created); d.discard(created)
+            for tag, (created, deleted) in changes.items():
+                self._emit(tag, created, deleted)
+
+    def _poll_loop(self):
+        """Mode polling : source principale. Mode inotify : seulement les resynchronisations demandées (dossier déplacé)."""
+        if self.use_polling:
+            for root in list(self._roots.values()):
+                root.poll()  # état initial, sans émettre d'événements
+                root.unstable.clear()
+        while not self._stop.wait(self.poll_interval):
+            with self._lock:
+                resync, self._resync = self._resync, set()
+            self._settle()
+            for tag, root in list(self._roots.items()):
+                if self.use_polling or tag in resync:
+                    created, deleted = root.poll()
+                    self._emit(tag, created, deleted)
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def get_fs_watcher() -> FsWatcher | None:
+    return _watcher
+
+
+def start_fs_watcher() -> FsWatcher:
+    """
+    Démarre (une seule fois par processus) la surveillance des sorties ComfyUI, de la galerie et des modèles,
+    et branche les index en mémoire/SQLite sur les événements.
+    """
+    global _watcher
+    with _watcher_lock:
+        if _watcher is not None:
+            return _watcher
+        from utils.gallery_index import get_gallery_index, load_hidden_names
+        from utils.thumbnails import get_thumbnail_service
+        from utils import system
+
+        watcher = FsWatcher()
+        watcher.watch("outputs", Config.OUTPUT_DIR)
+        if Config.GALLERY_PATH:
+            watcher.watch("gallery", Config.GALLERY_PATH)
+        if Config.BASE_PATH:
+            watcher.watch("models", Config.BASE_PATH / "models", recursive=True, suffixes=MODEL_SUFFIXES)
+
+        def on_images(tag, root, created, deleted):
+            if tag not in ("outputs", "gallery"):
+                return
+            get_gallery_index().apply_changes(root, {p.name for p in created if p.parent == root}, {p.name for p in deleted if p.parent == root},
+                                              hidden_loader=load_hidden_names)
+            for path in created:
+                if path.parent == root: get_thumbnail_service().submit(root, path.name)
+
+        def on_models(tag, root, created, deleted):
+            if tag == "models":
+                system.apply_model_changes(created, deleted)
+
+        watcher.subscribe(on_images)
+        watcher.subscribe(on_models)
+        watcher.start()
+        _watcher = watcher
+        return watcher
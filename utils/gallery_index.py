@@ -0,0 +1,352 @@
+# utils/gallery_index.py (V1.1 - Index SQLite persistant de la galerie)
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from config import Config
+from utils.png_meta import read_png_metadata
+from utils.metadata_search import build_search_clause, extract_generation_params, index_terms
+
+IMAGE_SUFFIXES = (".png",)
+
+
+def load_hidden_names() -> list:
+    """Noms des images masquées (HIDDEN_FILES_DB), liste vide si le fichier est absent ou illisible."""
+    try:
+        with open(Config.HIDDEN_FILES_DB, 'r', encoding='utf-8') as f: return json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError): return []
+
+# Chaque entrée est appliquée une seule fois, suivie par PRAGMA user_version.
+_MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS images (
+        id INTEGER PRIMARY KEY,
+        dir TEXT NOT NULL,
+        name TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        width INTEGER,
+        height INTEGER,
+        hidden INTEGER NOT NULL DEFAULT 0,
+        prompt TEXT,
+        UNIQUE(dir, name)
+    );
+    CREATE INDEX IF NOT EXISTS idx_images_dir_mtime ON images(dir, mtime DESC);
+    CREATE INDEX IF NOT EXISTS idx_images_name ON images(name);
+    CREATE TABLE IF NOT EXISTS dirs (
+        path TEXT PRIMARY KEY,
+        mtime_ns INTEGER NOT NULL
+    );
+    """,
+    """
+    ALTER TABLE images ADD COLUMN content_hash TEXT;
+    """,
+    """
+    ALTER TABLE images ADD COLUMN sampler TEXT;
+    ALTER TABLE images ADD COLUMN scheduler TEXT;
+    ALTER TABLE images ADD COLUMN seed INTEGER;
+    ALTER TABLE images ADD COLUMN steps INTEGER;
+    ALTER TABLE images ADD COLUMN cfg REAL;
+    ALTER TABLE images ADD COLUMN params_indexed INTEGER NOT NULL DEFAULT 0;
+    CREATE INDEX IF NOT EXISTS idx_images_params_pending ON images(params_indexed) WHERE params_indexed = 0;
+    CREATE TABLE IF NOT EXISTS image_terms (
+        term TEXT NOT NULL,
+        field TEXT NOT NULL,
+        image_id INTEGER NOT NULL,
+        PRIMARY KEY (term, field, image_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_image_terms_image ON image_terms(image_id);
+    -- Les prompts (plusieurs Ko) sortent de la table images pour garder les parcours de filtrage compacts
+    CREATE TABLE IF NOT EXISTS image_prompts (
+        image_id INTEGER PRIMARY KEY,
+        prompt TEXT NOT NULL
+    );
+    INSERT OR REPLACE INTO image_prompts (image_id, prompt) SELECT id, prompt FROM images WHERE prompt IS NOT NULL;
+    ALTER TABLE images DROP COLUMN prompt;
+    """,
+    """
+    ALTER TABLE images ADD COLUMN ahash INTEGER;
+    ALTER TABLE images ADD COLUMN dhash INTEGER;
+    ALTER TABLE images ADD COLUMN phash INTEGER;
+    """,
+]
+
+
+def _read_image_metadata(path: Path):
+    """Lit dimensions et prompt embarqué depuis les chunks PNG, sans décoder les pixels."""
+    try:
+        meta = read_png_metadata(path)
+        return meta['width'], meta['height'], meta['text'].get('prompt')
+    except Exception as e:
+        print(f"Erreur de lecture des métadonnées de {path.name}: {e}")
+        return None, None, None
+
+
+class GalleryIndex:
+    """
+    Index persistant des images de la galerie.
+    Un dossier n'est rescanné que si son mtime a changé (création, suppression ou renommage de fichier) ;
+    le tri, la recherche et l'état masqué sont ensuite servis par SQLite sans toucher au disque.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        # Les comptes par requête sont réutilisés tant que le contenu indexé ne change pas (pagination)
+        self._generation = 0
+        self._hash_generation = 0
+        self._count_cache = {}
+        self._migrate()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self):
+        conn = self._conn()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for i, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+            with conn:
+                conn.executescript(script)
+                conn.execute(f"PRAGMA user_version = {i}")
+
+    @staticmethod
+    def _dir_key(source_dir: Path) -> str:
+        return str(Path(source_dir).resolve())
+
+    def sync(self, source_dir: Path, hidden_loader=None, force=False) -> int:
+        """
+        Met à jour l'index de `source_dir` de manière incrémentale.
+        `hidden_loader` (optionnel) retourne la liste des noms masqués à appliquer aux nouvelles entrées.
+        Retourne le nombre d'entrées ajoutées, modifiées ou supprimées.
+        """
+        dir_key = self._dir_key(source_dir)
+        try:
+            dir_mtime = os.stat(source_dir).st_mtime_ns
+        except OSError:
+            return 0
+
+        conn = self._conn()
+        row = conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (dir_key,)).fetchone()
+        if row and row['mtime_ns'] == dir_mtime and not force:
+            self.index_pending_params()
+            return 0
+
+        with self._sync_lock:
+            known = {r['name']: (r['size'], r['mtime']) for r in conn.execute("SELECT name, size, mtime FROM images WHERE dir = ?", (dir_key,))}
+            seen, changed = set(), []
+            with os.scandir(source_dir) as it:
+                for entry in it:
+                    if not entry.name.lower().endswith(IMAGE_SUFFIXES):
+                        continue
+                    try:
+                        if not entry.is_file(): continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    seen.add(entry.name)
+                    if known.get(entry.name) != (st.st_size, st.st_mtime):
+                        changed.append((entry.name, st.st_size, st.st_mtime))
+
+            removed = [name for name in known if name not in seen]
+            hidden = set(hidden_loader() if hidden_loader and changed else [])
+
+            with conn:
+                rows = self._upsert(conn, source_dir, changed, hidden)
+                self._delete(conn, dir_key, removed)
+                conn.execute("INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)", (dir_key, dir_mtime))
+            self.index_pending_params()
+            if rows or removed:
+                self._invalidate()
+            return rows + len(removed)
+
+    def apply_changes(self, source_dir: Path, created, deleted, hidden_loader=None) -> int:
+        """
+        Applique une liste de fichiers créés/supprimés signalée par le watcher, sans rescanner le dossier.
+        Le mtime du dossier est enregistré pour que le prochain `sync` soit immédiat.
+        `hidden_loader` joue le même rôle que pour `sync` : un nom déjà masqué reste masqué.
+        """
+        dir_key = self._dir_key(source_dir)
+        changed = []
+        for name in created:
+            if not name.lower().endswith(IMAGE_SUFFIXES): continue
+            try:
+                st = os.stat(Path(source_dir) / name)
+            except OSError:
+                deleted = set(deleted) | {name}
+                continue
+            changed.append((name, st.st_size, st.st_mtime))
+        with self._sync_lock:
+            conn = self._conn()
+            with conn:
+                rows = self._upsert(conn, source_dir, changed, set(hidden_loader() if hidden_loader and changed else []))
+                self._delete(conn, dir_key, deleted)
+                try:
+                    conn.execute("INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)", (dir_key, os.stat(source_dir).st_mtime_ns))
+                except OSError:
+                    pass
+        self.index_pending_params()
+        self._invalidate()
+        return rows + len(deleted)
+
+    def _upsert(self, conn, source_dir: Path, changed, hidden: set) -> int:
+        dir_key = self._dir_key(source_dir)
+        for name, size, mtime in changed:
+            width, height, prompt = _read_image_metadata(Path(source_dir) / name)
+            image_id = conn.execute(
+                """INSERT INTO images (dir, name, size, mtime, width, height, hidden)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(dir, name) DO UPDATE SET
+                       size = excluded.size, mtime = excluded.mtime,
+                       width = excluded.width, height = excluded.height,
+                       content_hash = NULL, ahash = NULL, dhash = NULL, phash = NULL, params_indexed = 0
+                   RETURNING id""",
+                (dir_key, name, size, mtime, width, height, int(name in hidden)),
+            ).fetchone()[0]
+            if prompt:
+                conn.execute("INSERT OR REPLACE INTO image_prompts (image_id, prompt) VALUES (?, ?)", (image_id, prompt))
+            else:
+                conn.execute("DELETE FROM image_prompts WHERE image_id = ?", (image_id,))
+        return len(changed)
+
+    @staticmethod
+    def _delete(conn, dir_key: str, names):
+        params = [(dir_key, n) for n in names]
+        conn.executemany("DELETE FROM image_terms WHERE image_id = (SELECT id FROM images WHERE dir = ? AND name = ?)", params)
+        conn.executemany("DELETE FROM image_prompts WHERE image_id = (SELECT id FROM images WHERE dir = ? AND name = ?)", params)
+        conn.executemany("DELETE FROM images WHERE dir = ? AND name = ?", params)
+
+    def _invalidate(self):
+        self._generation += 1
+        self._count_cache.clear()
+
+    def index_pending_params(self, batch_size: int = 500) -> int:
+        """Alimente l'index inversé à partir des prompts déjà stockés (sans relire les fichiers)."""
+        conn, done = self._conn(), 0
+        while True:
+            pending = conn.execute("""SELECT i.id, p.prompt FROM images i LEFT JOIN image_prompts p ON p.image_id = i.id
+                   WHERE i.params_indexed = 0 LIMIT ?""", (batch_size,)).fetchall()
+            if not pending:
+                if done:
+                    self._invalidate()
+                return done
+            with conn:
+                for row in pending:
+                    params = extract_generation_params(row['prompt']) if row['prompt'] else {}
+                    conn.execute("DELETE FROM image_terms WHERE image_id = ?", (row['id'],))
+                    conn.executemany("INSERT OR IGNORE INTO image_terms (term, field, image_id) VALUES (?, ?, ?)",
+                                     [(term, field, row['id']) for term, field in index_terms(params)])
+                    conn.execute(
+                        "UPDATE images SET sampler = ?, scheduler = ?, seed = ?, steps = ?, cfg = ?, params_indexed = 1 WHERE id = ?",
+                        (params.get('sampler'), params.get('scheduler'), params.get('seed'), params.get('steps'), params.get('cfg'), row['id']),
+                    )
+            done += len(pending)
+
+    def _where(self, source_dir: Path, search: str = None, show_hidden: bool = False):
+        clauses, params = ["dir = ?"], [self._dir_key(source_dir)]
+        if not show_hidden:
+            clauses.append("hidden = 0")
+        if search:
+            search_sql, search_params = build_search_clause(search)
+            if search_sql:
+                clauses.append(search_sql)
+                params += search_params
+        return " AND ".join(clauses), params
+
+    def query(self, source_dir: Path, search: str = None, show_hidden: bool = False, limit: int = None, offset: int = 0) -> list[dict]:
+        """Retourne les images du dossier triées de la plus récente à la plus ancienne."""
+        where, params = self._where(source_dir, search, show_hidden)
+        sql = f"SELECT id, name, size, mtime, width, height, hidden, content_hash, phash FROM images WHERE {where} ORDER BY mtime DESC, name"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        return [dict(r) for r in self._conn().execute(sql, params)]
+
+    def count(self, source_dir: Path, search: str = None, show_hidden: bool = False) -> int:
+        key = (self._dir_key(source_dir), search or "", show_hidden, self._generation)
+        if key not in self._count_cache:
+            where, params = self._where(source_dir, search, show_hidden)
+            if len(self._count_cache) > 256:
+                self._count_cache.clear()
+            self._count_cache[key] = self._conn().execute(f"SELECT COUNT(*) FROM images WHERE {where}", params).fetchone()[0]
+        return self._count_cache[key]
+
+    def get(self, source_dir: Path, name: str) -> dict | None:
+        row = self._conn().execute(
+            "SELECT i.*, p.prompt FROM images i LEFT JOIN image_prompts p ON p.image_id = i.id WHERE i.dir = ? AND i.name = ?",
+            (self._dir_key(source_dir), name),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def set_hidden(self, names, hidden: bool):
+        """Applique l'état masqué à tous les fichiers portant ces noms, quel que soit le dossier."""
+        with self._conn() as conn:
+            conn.executemany("UPDATE images SET hidden = ? WHERE name = ?", [(int(hidden), n) for n in names])
+        self._invalidate()
+
+    def missing_hashes(self, source_dir: Path, limit: int = None) -> list[str]:
+        """Noms des images dont les empreintes (contenu ou perceptuelles) ne sont pas encore connues, les plus récentes d'abord."""
+        sql = "SELECT name FROM images WHERE dir = ? AND (content_hash IS NULL OR phash IS NULL) ORDER BY mtime DESC"
+        params = [self._dir_key(source_dir)]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [r['name'] for r in self._conn().execute(sql, params)]
+
+    def set_image_hashes(self, source_dir: Path, name: str, hashes: dict):
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE images SET content_hash = ?, ahash = ?, dhash = ?, phash = ? WHERE dir = ? AND name = ?",
+                (hashes['content_hash'], hashes.get('ahash'), hashes.get('dhash'), hashes.get('phash'), self._dir_key(source_dir), name),
+            )
+        self._hash_generation += 1
+
+    def perceptual_hashes(self, source_dir: Path, search: str = None, show_hidden: bool = False) -> list[tuple[int, int]]:
+        """Couples (id, pHash ou None) des images filtrées, les plus récentes d'abord."""
+        where, params = self._where(source_dir, search, show_hidden)
+        sql = f"SELECT id, phash FROM images WHERE {where} ORDER BY mtime DESC, name"
+        return [(r[0], r[1]) for r in self._conn().execute(sql, params)]
+
+    def get_many(self, ids: list[int]) -> list[dict]:
+        """Entrées de l'index dans l'ordre des identifiants donnés."""
+        rows = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            sql = f"SELECT id, name, size, mtime, width, height, hidden, content_hash, phash FROM images WHERE id IN ({', '.join('?' for _ in chunk)})"
+            rows.update({r['id']: dict(r) for r in self._conn().execute(sql, chunk)})
+        return [rows[i] for i in ids if i in rows]
+
+    @property
+    def generation(self) -> tuple[int, int]:
+        """Change quand le contenu indexé ou les empreintes perceptuelles changent (clé de cache)."""
+        return self._generation, self._hash_generation
+
+    def known_hashes(self) -> set[str]:
+        return {r[0] for r in self._conn().execute("SELECT DISTINCT content_hash FROM images WHERE content_hash IS NOT NULL")}
+
+    def remove(self, source_dir: Path, names):
+        with self._conn() as conn:
+            self._delete(conn, self._dir_key(source_dir), names)
+        self._invalidate()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_gallery_index() -> GalleryIndex:
+    """Retourne l'index partagé par toutes les sessions du processus."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = GalleryIndex(Config.GALLERY_INDEX_DB)
+        return _index
@@ -0,0 +1,132 @@
+# utils/http_client.py (V1.2 - Client HTTP partagé : connexions persistantes, retries, métriques)
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+
+# Délais (connexion, lecture) par point d'appel, surchargeables avec timeout=...
+ENDPOINT_TIMEOUTS = {
+    "comfy.prompt": (3, 10),
+    "comfy.history": (3, 5),
+    "comfy.view": (3, 30),
+    "comfy.queue": (3, 5),
+    "comfy.system_stats": (3, 5),
+    "comfy.interrupt": (3, 5),
+    "ollama.chat": (3, 30),
+    "ollama.tags": (3, 5),
+    "civitai.search": (5, 30),
+    "hf.search": (5, 30),
+    "model.head": (3, 5),
+    "model.download": (5, 60),
+}
+DEFAULT_TIMEOUT = (5, 30)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+RETRY_STATUSES = (429, 502, 503, 504)
+RETRY_BASE_DELAY = 0.2
+RETRY_MAX_DELAY = 5.0
+
+
+class _EndpointStats:
+    __slots__ = ("calls", "errors", "retries", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.calls = self.errors = self.retries = 0
+        self.total_ms = self.max_ms = 0.0
+
+
+class HttpClient:
+    """
+    Une session requests (pool keep-alive) par hôte, partagée par tous les threads.
+    Les méthodes idempotentes sont rejouées avec un backoff exponentiel à gigue complète
+    sur erreur réseau ou statut 429/502/503/504 ; les exceptions de requests remontent telles quelles.
+    """
+
+    def __init__(self, retries: int = None, pool_size: int = None):
+        self.retries = Config.HTTP_RETRIES if retries is None else retries
+        self.pool_size = pool_size or Config.HTTP_POOL_SIZE
+        self._sessions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _session(self, url: str) -> requests.Session:
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount(host, adapter)
+                self._sessions[host] = session
+            return session
+
+    def _record(self, endpoint: str, elapsed_ms: float, error: bool = False, retry: bool = False):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, _EndpointStats())
+            if retry:
+                stats.retries += 1
+                return
+            stats.calls += 1
+            stats.errors += error
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+    def request(self, method: str, url: str, endpoint: str = "other", retries: int = None, **kwargs) -> requests.Response:
+        method = method.upper()
+        kwargs.setdefault("timeout", ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+        if retries is None:
+            # Un POST n'est jamais rejoué implicitement (ex. /prompt créerait un doublon)
+            retries = self.retries if method in IDEMPOTENT_METHODS else 0
+        session = self._session(url)
+
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._record(endpoint, (time.perf_counter() - start) * 1000, error=True)
+                if attempt >= retries:
+                    raise
+            else:
+                elapsed = (time.perf_counter() - start) * 1000
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    self._record(endpoint, elapsed, error=response.status_code >= 400)
+                    return response
+                self._record(endpoint, elapsed, error=True)
+                response.close()
+            self._record(endpoint, 0, retry=True)
+            time.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+
+    def get(self, url: str, endpoint: str = "other", **kwargs) -> requests.Response:
+        return self.request("GET", url, endpoint, **kwargs)
+
+    def post(self, url: str, endpoint: str = "other", **kwargs) -> requests.Response:
+        return self.request("POST", url, endpoint, **kwargs)
+
+    def head(self, url: str, endpoint: str = "other", **kwargs) -> requests.Response:
+        kwargs.setdefault("allow_redirects", False)  # même défaut que requests.head
+        return self.request("HEAD", url, endpoint, **kwargs)
+
+    def stats(self) -> dict:
+        """{endpoint: {'calls', 'errors', 'retries', 'avg_ms', 'max_ms'}}"""
+        with self._lock:
+            return {
+                name: {'calls': s.calls, 'errors': s.errors, 'retries': s.retries,
+                       'avg_ms': s.total_ms / s.calls if s.calls else 0.0, 'max_ms': s.max_ms}
+                for name, s in sorted(self._stats.items())
+            }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
@@ -0,0 +1,121 @@
+# utils/image_hash.py (V1.1 - Empreintes perceptuelles et quasi-doublons groupés autour d'un représentant)
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+PHASH_SIZE = 32
+DEFAULT_DUPLICATE_THRESHOLD = 6
+
+
+def _to_signed64(bits: np.ndarray) -> int:
+    """Empaquette 64 booléens en entier signé 64 bits (type INTEGER de SQLite)."""
+    value = int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), "big")
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _gray(img: Image.Image, size: tuple) -> np.ndarray:
+    return np.asarray(img.convert("L").resize(size, Image.Resampling.LANCZOS), dtype=np.float64)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def average_hash(img: Image.Image) -> int:
+    pixels = _gray(img, (HASH_SIZE, HASH_SIZE))
+    return _to_signed64(pixels > pixels.mean())
+
+
+def difference_hash(img: Image.Image) -> int:
+    pixels = _gray(img, (HASH_SIZE + 1, HASH_SIZE))
+    return _to_signed64(pixels[:, 1:] > pixels[:, :-1])
+
+
+def perceptual_hash(img: Image.Image) -> int:
+    pixels = _gray(img, (PHASH_SIZE, PHASH_SIZE))
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    return _to_signed64(low > np.median(low.ravel()[1:]))
+
+
+def compute_hashes(img: Image.Image) -> dict:
+    return {'ahash': average_hash(img), 'dhash': difference_hash(img), 'phash': perceptual_hash(img)}
+
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(values)
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        return _POPCOUNT_TABLE[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+def hamming_distances(hashes: np.ndarray, target: int) -> np.ndarray:
+    """Distances de Hamming entre `target` et un tableau d'empreintes int64, en un seul passage vectorisé."""
+    return _popcount(hashes.view(np.uint64) ^ np.int64(target).view(np.uint64)).astype(np.int32)
+
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+class BKTree:
+    """Arbre BK sur la distance de Hamming : requêtes par rayon sans comparer toute la collection."""
+
+    def __init__(self):
+        self.root = None  # (hash, [ids], {distance: noeud})
+
+    def add(self, value: int, item):
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = (value, [item], {})
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> list:
+        """Retourne [(distance, item)] pour tous les éléments à moins de `radius`."""
+        found, stack = [], [self.root] if self.root else []
+        while stack:
+            node_value, items, children = stack.pop()
+            d = hamming(value, node_value)
+            if d <= radius:
+                found.extend((d, item) for item in items)
+            stack.extend(child for dist, child in children.items() if d - radius <= dist <= d + radius)
+        return found
+
+
+def cluster_duplicates(items: list[tuple], threshold: int = DEFAULT_DUPLICATE_THRESHOLD) -> list[list]:
+    """
+    Regroupe les éléments `(id, hash)` à moins de `threshold` bits du représentant de leur groupe.
+    Le représentant est le premier élément (dans l'ordre d'entrée) pas encore placé ; pas de fermeture
+    transitive : si A~B et B~C, C ne rejoint A que s'il est lui-même proche de A.
+    Les éléments sans empreinte (hash None) restent seuls dans leur groupe.
+    """
+    tree, order = BKTree(), {}
+    for i, (item_id, value) in enumerate(items):
+        if value is not None: tree.add(value, item_id)
+        order[item_id] = i
+    groups, placed = [], set()
+    for item_id, value in items:
+        if item_id in placed: continue
+        placed.add(item_id)
+        members = [] if value is None else [other for _, other in tree.search(value, threshold) if other not in placed]
+        placed.update(members)
+        groups.append([item_id] + sorted(members, key=order.get))
+    return groups
@@ -0,0 +1,286 @@
+# utils/job_store.py (V1.8 - File de génération persistante : priorités, balayages, lots regroupés, cache, file par session)
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from config import Config
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+# Voies de priorité : la plus petite valeur passe en premier
+PRIORITY_URGENT, PRIORITY_NORMAL, PRIORITY_BATCH = 0, 1, 2
+PRIORITY_LABELS = {PRIORITY_URGENT: "⚡ Urgente", PRIORITY_NORMAL: "Normale", PRIORITY_BATCH: "🐢 Lot"}
+
+# Chaque entrée est appliquée une seule fois, suivie par PRAGMA user_version.
+_MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner TEXT,
+        workflow TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        progress REAL NOT NULL DEFAULT 0,
+        prompt_id TEXT,
+        backend TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        turbo_mode INTEGER NOT NULL DEFAULT 0,
+        images TEXT NOT NULL DEFAULT '[]',
+        created REAL NOT NULL,
+        started REAL,
+        finished REAL,
+        archived INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id);
+    CREATE INDEX IF NOT EXISTS idx_jobs_prompt ON jobs(prompt_id);
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS job_groups (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner TEXT,
+        axes TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'running',
+        sheet TEXT,
+        created REAL NOT NULL,
+        finished REAL,
+        archived INTEGER NOT NULL DEFAULT 0
+    );
+    ALTER TABLE jobs ADD COLUMN group_id INTEGER REFERENCES job_groups(id);
+    ALTER TABLE jobs ADD COLUMN labels TEXT NOT NULL DEFAULT '{}';
+    CREATE INDEX IF NOT EXISTS idx_jobs_group ON jobs(group_id);
+    """,
+    """
+    ALTER TABLE jobs ADD COLUMN batch_offset INTEGER;
+    """,
+    """
+    ALTER TABLE jobs ADD COLUMN cached INTEGER NOT NULL DEFAULT 0;
+    """,
+    """
+    ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 1;
+    UPDATE jobs SET priority = 2 WHERE group_id IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, priority, id);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs(owner, archived, id);
+    CREATE INDEX IF NOT EXISTS idx_groups_owner ON job_groups(owner, archived);
+    """,
+]
+
+_JSON_COLUMNS = ("workflow", "images", "labels", "axes")
+
+
+def _row_to_job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    for column in _JSON_COLUMNS:
+        if column in job: job[column] = json.loads(job[column])
+    if 'turbo_mode' in job: job['turbo_mode'] = bool(job['turbo_mode'])
+    return job
+
+
+class JobStore:
+    """
+    Travaux de génération persistés dans SQLite : survivent à la fermeture de l'onglet et au redémarrage.
+    Le worker de fond écrit les transitions d'état, les pages Streamlit ne font que lire.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._migrate()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self):
+        conn = self._conn()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for i, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+            with conn:
+                conn.executescript(script)
+                conn.execute(f"PRAGMA user_version = {i}")
+
+    def client_id(self) -> str:
+        """client_id WebSocket stable entre redémarrages : ComfyUI continue d'adresser les messages des prompts repris."""
+        with self._conn() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'client_id'").fetchone()
+            if row:
+                return row[0]
+            value = str(uuid.uuid4())
+            conn.execute("INSERT INTO meta (key, value) VALUES ('client_id', ?)", (value,))
+            return value
+
+    @staticmethod
+    def _cached_columns(images: list[dict] | None, now: float) -> tuple:
+        """(status, progress, images, cached, started, finished) : un résultat repris du cache est inséré déjà terminé."""
+        if images:
+            return ("completed", 1.0, json.dumps(images), 1, now, now)
+        return ("queued", 0.0, json.dumps([]), 0, None, None)
+
+    def add(self, workflow: dict, owner: str = None, turbo_mode: bool = False, priority: int = PRIORITY_NORMAL,
+            cached: list[dict] = None) -> int:
+        """
+        Ajoute un travail ; avec `cached` (images d'une exécution identique), il est inséré directement terminé,
+        sans jamais passer par la file : le worker ne peut pas le soumettre entre l'insertion et la reprise du cache.
+        """
+        now = time.time()
+        with self._conn() as conn:
+            cur = conn.execute(
+                "INSERT INTO jobs (owner, workflow, turbo_mode, created, priority, status, progress, images, cached, started, finished) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (owner, json.dumps(workflow), int(turbo_mode), now, priority, *self._cached_columns(cached, now)),
+            )
+            return cur.lastrowid
+
+    def add_group(self, jobs: list[tuple[dict, dict]], axes: list, owner: str = None, turbo_mode: bool = False,
+                  priority: int = PRIORITY_BATCH, cached: list = None) -> int:
+        """
+        Enregistre un balayage et tous ses travaux [(workflow, labels)] dans une seule transaction.
+        `cached` : images déjà produites pour chaque travail (ou None), alignées sur `jobs`.
+        """
+        now = time.time()
+        cached = cached or [None] * len(jobs)
+        with self._conn() as conn:
+            group_id = conn.execute(
+                "INSERT INTO job_groups (owner, axes, total, created) VALUES (?, ?, ?, ?)",
+                (owner, json.dumps(axes), len(jobs), now),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO jobs (owner, workflow, turbo_mode, created, group_id, labels, priority, status, progress, images, cached, started, finished) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(owner, json.dumps(wf), int(turbo_mode), now, group_id, json.dumps(labels), priority, *self._cached_columns(images, now))
+                 for (wf, labels), images in zip(jobs, cached)],
+            )
+            return group_id
+
+    def update(self, job_id: int, **fields):
+        if not fields:
+            return
+        for column in _JSON_COLUMNS:
+            if column in fields: fields[column] = json.dumps(fields[column])
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._conn() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+
+    def get(self, job_id: int) -> dict | None:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def previous_workflow(self, job_id: int) -> dict | None:
+        """Workflow du travail ajouté juste avant (successeur naturel en ordre d'arrivée)."""
+        row = self._conn().execute("SELECT workflow FROM jobs WHERE id < ? ORDER BY id DESC LIMIT 1", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def by_status(self, *statuses: str, limit: int = None) -> list[dict]:
+        """Travaux par voie de priorité puis dans l'ordre de soumission (le plus ancien d'abord)."""
+        sql = f"SELECT * FROM jobs WHERE status IN ({', '.join('?' for _ in statuses)}) ORDER BY priority, id"
+        params = list(statuses)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [_row_to_job(r) for r in self._conn().execute(sql, params)]
+
+    def by_prompt(self, prompt_id: str) -> list[dict]:
+        """Travaux actifs partageant une soumission ComfyUI (lot regroupé)."""
+        rows = self._conn().execute("SELECT * FROM jobs WHERE prompt_id = ? AND status = 'running' ORDER BY id", (prompt_id,))
+        return [_row_to_job(r) for r in rows]
+
+    def active_in_group(self, group_id: int) -> list[dict]:
+        rows = self._conn().execute("SELECT * FROM jobs WHERE group_id = ? AND status IN ('queued', 'running') ORDER BY id", (group_id,))
+        return [_row_to_job(r) for r in rows]
+
+    def best_queued_priority(self) -> int | None:
+        return self._conn().execute("SELECT MIN(priority) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def requeue(self, job_id: int):
+        """Remet un travail soumis en attente (préemption, lot défait) sans compter d'échec."""
+        self.update(job_id, status="queued", prompt_id=None, backend=None, batch_offset=None, started=None, progress=0.0)
+
+    def count(self, *statuses: str) -> int:
+        sql = f"SELECT COUNT(*) FROM jobs WHERE status IN ({', '.join('?' for _ in statuses)})"
+        return self._conn().execute(sql, statuses).fetchone()[0]
+
+    def count_by_backend(self, *statuses: str) -> dict:
+        """Soumissions par instance : les travaux regroupés dans un même lot partagent leur prompt_id."""
+        sql = f"SELECT backend, COUNT(DISTINCT COALESCE(prompt_id, id)) FROM jobs WHERE status IN ({', '.join('?' for _ in statuses)}) GROUP BY backend"
+        return dict(self._conn().execute(sql, statuses).fetchall())
+
+    def recent(self, owner: str = None, limit: int = None) -> list[dict]:
+        """
+        Travaux visibles dans la file (non archivés), les plus récents en dernier ; sans le workflow.
+        Avec `owner`, seulement ceux de cette session (le worker, lui, traite ceux de toutes les sessions).
+        """
+        limit = limit or Config.JOB_HISTORY_LIMIT
+        rows = self._conn().execute(
+            "SELECT id, owner, status, progress, prompt_id, backend, attempts, error, turbo_mode, images, created, started, finished, batch_offset, cached, priority, group_id "
+            "FROM jobs WHERE archived = 0 AND group_id IS NULL AND (? IS NULL OR owner = ?) ORDER BY id DESC LIMIT ?", (owner, owner, limit)
+        ).fetchall()
+        return [_row_to_job(r) for r in reversed(rows)]
+
+    def group_jobs(self, group_id: int) -> list[dict]:
+        """Travaux d'un balayage dans l'ordre de la matrice ; sans le workflow."""
+        rows = self._conn().execute(
+            "SELECT id, status, progress, error, images, labels FROM jobs WHERE group_id = ? ORDER BY id", (group_id,)
+        ).fetchall()
+        return [_row_to_job(r) for r in rows]
+
+    def recent_groups(self, owner: str = None) -> list[dict]:
+        """Balayages visibles dans la file (ceux de `owner` s'il est donné), avec le décompte de leurs travaux."""
+        rows = self._conn().execute(
+            "SELECT g.*, SUM(j.status = 'completed') AS completed, SUM(j.status = 'failed') AS failed, "
+            "SUM(j.status = 'cancelled') AS cancelled, "
+            "COALESCE(SUM(CASE WHEN j.status = 'running' THEN j.progress END), 0) AS running_progress "
+            "FROM job_groups g LEFT JOIN jobs j ON j.group_id = g.id WHERE g.archived = 0 AND (? IS NULL OR g.owner = ?) GROUP BY g.id ORDER BY g.id",
+            (owner, owner)
+        ).fetchall()
+        return [_row_to_job(r) for r in rows]
+
+    def groups_done(self) -> list[dict]:
+        """Balayages en cours dont plus aucun travail n'est actif : prêts pour la planche contact."""
+        rows = self._conn().execute(
+            "SELECT * FROM job_groups g WHERE g.status = 'running' AND NOT EXISTS "
+            "(SELECT 1 FROM jobs j WHERE j.group_id = g.id AND j.status IN ('queued', 'running'))"
+        ).fetchall()
+        return [_row_to_job(r) for r in rows]
+
+    def update_group(self, group_id: int, **fields):
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._conn() as conn:
+            conn.execute(f"UPDATE job_groups SET {assignments} WHERE id = ?", [*fields.values(), group_id])
+
+    def archive_finished(self, statuses=("completed",), owner: str = None) -> int:
+        """Retire de la file affichée les travaux et balayages terminés, de `owner` s'il est donné (ils restent dans l'historique)."""
+        with self._conn() as conn:
+            conn.execute("UPDATE job_groups SET archived = 1 WHERE archived = 0 AND status != 'running' AND (? IS NULL OR owner = ?)", (owner, owner))
+            return conn.execute(
+                f"UPDATE jobs SET archived = 1 WHERE archived = 0 AND status IN ({', '.join('?' for _ in statuses)}) AND (? IS NULL OR owner = ?)",
+                (*statuses, owner, owner)
+            ).rowcount
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Retourne la file persistante partagée par le worker et toutes les sessions."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore(Config.JOB_STORE_DB)
+        return _store
@@ -0,0 +1,340 @@
+# utils/job_worker.py (V1.9 - Worker de fond : priorités, préemption vérifiée sur /queue, annulation, admission, affinité, lots regroupés)
+import threading
+import time
+from config import Config
+from utils.admission import get_admission_controller
+from utils.affinity import model_signature, order_by_affinity, record_bypasses
+from utils.api_comfy import delete_from_queue, get_queue_prompts, interrupt_prompt, poll_job_status
+from utils.backends import get_backend_pool
+from utils.coalesce import batch_offsets, batch_size, merge_workflow, plan_batches
+from utils.comfy_async import submit_prompts, collect_outputs
+from utils.comfy_events import get_event_bus, get_job_registry
+from utils.job_store import get_job_store, ACTIVE_STATUSES
+from utils.result_cache import get_result_cache
+from utils.sweep import build_contact_sheet
+from utils.system import copy_to_gallery, copy_to_local_storage
+
+STALE_AFTER = 30.0  # secondes sans message WebSocket avant une vérification /history de secours
+
+
+class JobWorker:
+    """
+    Fait avancer la file persistante indépendamment des reruns Streamlit : soumet les travaux en attente,
+    reporte l'état poussé par les WebSockets et finalise les travaux terminés (images, copies).
+    Au démarrage, les travaux en cours sont repris par leur prompt_id.
+    """
+
+    def __init__(self, store=None, pool=None, interval: float = None):
+        self.store = store or get_job_store()
+        self.pool = pool or get_backend_pool()
+        self.interval = interval or Config.JOB_WORKER_INTERVAL
+        self.client_id = self.store.client_id()
+        self.registry = get_job_registry()
+        self.admission = get_admission_controller()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.RLock()  # les actions de l'UI (annulation) ne croisent pas un tick en cours
+        self._last_checked = {}
+        self._loaded = {}       # instance -> signature des modèles de la dernière soumission
+        self._bypassed = {}     # travail en file -> nombre de fois où un travail plus récent est passé devant
+        self.model_swaps = 0
+        self.swaps_avoided = 0  # estimation : changements de modèle en ordre d'arrivée moins changements effectifs
+        self.preemptions = 0
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="job-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        """Traite la file sans attendre le prochain intervalle (nouveau travail ajouté)."""
+        self._wake.set()
+
+    def _run(self):
+        self._resume()
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Erreur du worker de génération : {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _resume(self):
+        """Les travaux interrompus par un redémarrage sont redéclarés ; chaque bus les rattrape via /history à la connexion."""
+        for job in self.store.by_status("running"):
+            self.registry.register(job['prompt_id'], job['backend'])
+            get_event_bus(self.client_id, job['backend'])
+
+    def tick(self):
+        with self._lock:
+            self._track()
+            self._finish_groups()
+            self._start_pending()
+
+    # --- Actions sur les travaux (appelées depuis l'UI) ---
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Annule un travail : retiré de la file locale, ou de la file ComfyUI s'il y attend (/queue delete),
+        ou interrompu s'il s'exécute (/interrupt). Les autres travaux d'un lot regroupé repartent en file.
+        """
+        with self._lock:
+            job = self.store.get(job_id)
+            if not job or job['status'] not in ACTIVE_STATUSES:
+                return False
+            if job['status'] == "running":
+                self._stop_prompt(job['prompt_id'], job['backend'])
+                for other in self.store.by_prompt(job['prompt_id']):
+                    if other['id'] != job_id:
+                        self.store.requeue(other['id'])
+            self.store.update(job_id, status="cancelled", finished=time.time())
+        self.wake()
+        return True
+
+    def cancel_group(self, group_id: int) -> int:
+        """Annule tous les travaux encore actifs d'un balayage ; les travaux hors balayage d'un même lot repartent en file."""
+        with self._lock:
+            jobs = self.store.active_in_group(group_id)
+            ids = {job['id'] for job in jobs}
+            for prompt_id, backend in {(j['prompt_id'], j['backend']) for j in jobs if j['status'] == "running"}:
+                self._stop_prompt(prompt_id, backend)
+                for other in self.store.by_prompt(prompt_id):
+                    if other['id'] not in ids:
+                        self.store.requeue(other['id'])
+            for job in jobs:
+                self.store.update(job['id'], status="cancelled", finished=time.time())
+        self.wake()
+        return len(jobs)
+
+    def set_priority(self, job_id: int, priority: int):
+        with self._lock:
+            self.store.update(job_id, priority=priority)
+        self.wake()
+
+    def _stop_prompt(self, prompt_id: str, backend: str):
+        """
+        Retire le prompt de la file ComfyUI s'il y attend encore, sinon l'interrompt. Le registre peut être en retard
+        sur un prompt qui vient de démarrer : /queue est relu après la suppression, qui est alors sans effet.
+        """
+        state = self.registry.get(prompt_id)
+        if state and state['status'] == "running":
+            interrupt_prompt(prompt_id, backend)
+            return
+        queue = get_queue_prompts(backend)
+        if queue is None:
+            delete_from_queue([prompt_id], backend)  # instance injoignable : rien ne permet de savoir s'il a démarré
+            return
+        if prompt_id in queue[1]:
+            delete_from_queue([prompt_id], backend)
+            queue = get_queue_prompts(backend)
+        if queue is not None and prompt_id in queue[0]:
+            interrupt_prompt(prompt_id, backend)
+
+    def _preempt(self, slots: dict) -> dict:
+        """
+        Toutes les places sont prises et un travail plus prioritaire attend : une soumission moins prioritaire
+        encore en attente côté ComfyUI (pas commencée, donc rien de perdu) est retirée et remise en file.
+        Une seule par tick pour ne pas vider la file ComfyUI d'un coup.
+        """
+        best = self.store.best_queued_priority()
+        if best is None or any(n > 0 for n in slots.values()):
+            return slots
+        candidates = [job for job in self.store.by_status("running") if job['priority'] > best and job['backend'] in slots]
+        for job in sorted(candidates, key=lambda j: (-j['priority'], -j['id'])):
+            prompt_id, backend = job['prompt_id'], job['backend']
+            state = self.registry.get(prompt_id)
+            if state is None or state['status'] != "queued":
+                continue  # déjà en exécution : on ne jette pas le travail du GPU
+            # ComfyUI répond OK à la suppression même si le prompt a démarré entre-temps (elle est alors sans effet) :
+            # on ne supprime qu'un prompt vu en attente dans /queue, et on ne remet en file que s'il n'y figure plus du tout
+            queue = get_queue_prompts(backend)
+            if queue is None or prompt_id not in queue[1]:
+                continue
+            if not delete_from_queue([prompt_id], backend):
+                continue
+            queue = get_queue_prompts(backend)
+            state = self.registry.get(prompt_id)
+            if queue is None or prompt_id in queue[0] or prompt_id in queue[1] or (state and state['status'] != "queued"):
+                continue  # démarré (ou état incertain) : le suivi normal récupérera ses sorties
+            for other in self.store.by_prompt(prompt_id):
+                self.store.requeue(other['id'])
+            self.registry.forget(prompt_id)
+            self.preemptions += 1
+            slots[backend] += 1
+            break
+        return slots
+
+    def _free_slots(self) -> dict:
+        """Places libres par instance saine : limite d'admission moins travaux déjà soumis."""
+        running = self.store.count_by_backend("running")
+        self.admission.update(self.pool, running, self.store.count("queued"))
+        return {url: self.admission.limit(url) - running.get(url, 0) for url, b in self.pool.backends.items() if b.healthy}
+
+    def _start_pending(self):
+        slots = self._preempt(self._free_slots())
+        total = sum(max(0, n) for n in slots.values())
+        if total <= 0:
+            return
+        # Fenêtre de la file réordonnée par affinité ; chaque place accueille un lot de travaux ne différant que par la seed
+        window = max(total * max(1, Config.COALESCE_MAX_BATCH), Config.AFFINITY_WINDOW)
+        candidates = self.store.by_status("queued", limit=window)
+        ordered = order_by_affinity(candidates, set(self._loaded.values()), self._bypassed, Config.AFFINITY_MAX_BYPASS)
+        to_start, backends = [], []
+        for batch in plan_batches(ordered, Config.COALESCE_MAX_BATCH)[:total]:
+            signature = model_signature(batch[0]['workflow'])
+            free = {url for url, n in slots.items() if n > 0}
+            # Une instance qui a déjà ces modèles en mémoire est préférée, si elle a une place
+            backend = self.pool.pick({url for url in free if self._loaded.get(url) == signature}) or self.pool.pick(free)
+            if backend is None:
+                break  # aucune instance disponible : les travaux restent en attente
+            slots[backend.url] -= 1
+            to_start.append(batch)
+            backends.append(backend)
+        if not to_start:
+            return
+
+        workflows = [merge_workflow(batch) if len(batch) > 1 else batch[0]['workflow'] for batch in to_start]
+        prompt_ids = submit_prompts(workflows, self.client_id, [b.url for b in backends])
+        started = set()
+        for batch, backend, prompt_id in zip(to_start, backends, prompt_ids):
+            if prompt_id != "ERROR_CONNECTION":
+                self._count_swaps(batch, backend.url)
+                offsets = batch_offsets(batch) if len(batch) > 1 else [None]
+                for job, offset in zip(batch, offsets):
+                    self.store.update(job['id'], status="running", prompt_id=prompt_id, backend=backend.url,
+                                      started=time.time(), batch_offset=offset)
+                    started.add(job['id'])
+                continue
+            self.pool.release(backend)
+            self.pool.mark_failed(backend, "Échec de soumission")
+            self.admission.record_failure(backend.url)
+            for job in batch:
+                attempts = job['attempts'] + 1
+                # Nouvelle tentative sur une autre instance tant que toutes n'ont pas été essayées
+                if attempts >= len(self.pool.backends):
+                    self.store.update(job['id'], attempts=attempts, status="failed", error="Connexion à ComfyUI échouée", finished=time.time())
+                    started.add(job['id'])
+                else:
+                    self.store.update(job['id'], attempts=attempts)
+        self._bypassed = record_bypasses(candidates, started, self._bypassed)
+
+    def _count_swaps(self, batch: list[dict], url: str):
+        """
+        Bilan des rechargements : en ordre d'arrivée, chaque travail suivrait le travail ajouté juste avant lui ;
+        ici seul le premier travail du lot peut changer les modèles chargés sur l'instance.
+        """
+        signature = model_signature(batch[0]['workflow'])
+        swapped = self._loaded.get(url) != signature
+        fifo_swaps = 0
+        for job in batch:
+            previous = self.store.previous_workflow(job['id'])
+            fifo_swaps += previous is None or model_signature(previous) != signature
+        self.model_swaps += swapped
+        self.swaps_avoided += fifo_swaps - swapped
+        self._loaded[url] = signature
+
+    def _check_stale(self, job: dict, state: dict) -> dict:
+        """Secours si aucun message n'arrive (WebSocket coupé, message perdu) : une requête /history espacée."""
+        now, prompt_id = time.time(), job['prompt_id']
+        if now - max(state['updated'], self._last_checked.get(prompt_id, 0)) < STALE_AFTER:
+            return state
+        self._last_checked[prompt_id] = now
+        status = poll_job_status(prompt_id, job['backend'])
+        if status['status'] == 'completed':
+            outputs = [img for out in status['data'].get('outputs', {}).values() for img in out.get('images', [])]
+            return self.registry.update(prompt_id, status='completed', progress=1.0, outputs=outputs)
+        if status['status'] == 'failed':
+            return self.registry.update(prompt_id, status='failed', error=status.get('error'))
+        return state
+
+    def _track(self):
+        by_prompt = {}
+        for job in self.store.by_status("running"):
+            by_prompt.setdefault(job['prompt_id'], []).append(job)
+        finished = []
+        for prompt_id, jobs in by_prompt.items():
+            lead = jobs[0]
+            get_event_bus(self.client_id, lead['backend'])
+            state = self.registry.get(prompt_id)
+            if state is None:
+                self.registry.register(prompt_id, lead['backend'])
+                continue
+            state = self._check_stale(lead, state)
+            if state['status'] == 'completed':
+                finished.append(jobs)
+            elif state['status'] == 'failed':
+                for job in jobs:
+                    self.store.update(job['id'], status="failed", error=state.get('error') or "Erreur inconnue", finished=time.time())
+            elif abs(state['progress'] - lead['progress']) >= 0.01:
+                for job in jobs:
+                    self.store.update(job['id'], progress=state['progress'])
+        if finished:
+            self._finalize(finished)
+
+    def _finalize(self, prompts: list[list[dict]]):
+        """
+        Récupère en parallèle toutes les images des soumissions terminées, les copie vers galerie et stockage
+        puis rend à chaque travail d'un lot regroupé sa part des images.
+        """
+        all_outputs = collect_outputs([jobs[0]['prompt_id'] for jobs in prompts], self.client_id, [jobs[0]['backend'] for jobs in prompts])
+        for jobs in prompts:
+            lead = jobs[0]
+            images = []
+            for _, name, path in all_outputs.get(lead['prompt_id']) or []:
+                if path:
+                    copy_to_gallery(path)
+                    copy_to_local_storage(path)
+                images.append({'name': name, 'path': str(path) if path else None})
+            self._last_checked.pop(lead['prompt_id'], None)
+            if lead['started']:
+                self.admission.record_latency(lead['backend'], time.time() - lead['started'])
+            for job in jobs:
+                own = images if job['batch_offset'] is None else images[job['batch_offset']:job['batch_offset'] + batch_size(job['workflow'])]
+                if own:
+                    self.store.update(job['id'], status="completed", progress=1.0, images=own, finished=time.time())
+                    if job['batch_offset'] is None:  # dans un lot regroupé, les images ne correspondent pas à la seed du travail
+                        get_result_cache().put(job['workflow'], own)
+                else:
+                    self.store.update(job['id'], status="failed", error="Échec de récupération de l'image", finished=time.time())
+
+    def _finish_groups(self):
+        """Assemble la planche contact de chaque balayage dont tous les travaux sont terminés."""
+        for group in self.store.groups_done():
+            jobs = self.store.group_jobs(group['id'])
+            cells = [(job['labels'], job['images'][0]['path'] if job['images'] else None) for job in jobs]
+            if any(job['status'] == "completed" for job in jobs):
+                status = "completed"
+            else:
+                status = "cancelled" if any(job['status'] == "cancelled" for job in jobs) else "failed"
+            sheet = None
+            if status == "completed":
+                try:
+                    sheet = str(build_contact_sheet(group['axes'], cells, Config.SWEEP_DIR / f"sweep_{group['id']}.png"))
+                except Exception as e:
+                    print(f"Erreur lors de la création de la planche contact du balayage #{group['id']} : {e}")
+            self.store.update_group(group['id'], status=status, sheet=sheet, finished=time.time())
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_job_worker() -> JobWorker | None:
+    return _worker
+
+
+def start_job_worker() -> JobWorker:
+    """Démarre (une seule fois par processus) le worker qui fait avancer la file persistante."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = JobWorker()
+            _worker.start()
+        return _worker
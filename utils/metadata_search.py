@@ -0,0 +1,173 @@
+# utils/metadata_search.py (V1.0 - Recherche dans les métadonnées de génération)
+import json
+import re
+import shlex
+from pathlib import PurePosixPath
+
+TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+MIN_TOKEN_LENGTH = 2
+MAX_LINK_DEPTH = 6
+
+# Champs textuels : correspondance par préfixe sur les jetons de l'index inversé
+TERM_FIELDS = {"pos": "pos", "prompt": "pos", "neg": "neg", "negative": "neg", "ckpt": "ckpt", "model": "ckpt", "lora": "lora"}
+# Champs scalaires : colonnes de la table images
+TEXT_COLUMNS = {"sampler": "sampler", "scheduler": "scheduler", "name": "name"}
+NUMERIC_COLUMNS = {"seed": "seed", "steps": "steps", "cfg": "cfg", "width": "width", "w": "width", "height": "height", "h": "height"}
+FREE_TEXT_FIELDS = ("pos", "ckpt", "lora", "sampler", "scheduler")
+NUMERIC_RE = re.compile(r"^(>=|<=|>|<|=)?(-?\d+(?:\.\d+)?)$")
+RANGE_RE = re.compile(r"^(-?\d+(?:\.\d+)?)\.\.(-?\d+(?:\.\d+)?)$")
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) >= MIN_TOKEN_LENGTH]
+
+
+def _model_tokens(model_name: str) -> list[str]:
+    """Jetons d'un nom de modèle : nom complet sans extension puis ses morceaux (dossier inclus)."""
+    path = PurePosixPath(model_name.replace("\\", "/"))
+    stem = path.stem.lower()
+    return [stem] + tokenize(str(path.with_suffix("")))
+
+
+def _scalar(value):
+    return value if isinstance(value, (str, int, float)) and not isinstance(value, bool) else None
+
+
+def _collect_texts(nodes: dict, link, depth=0) -> list[str]:
+    """Suit un lien [node_id, sortie] jusqu'aux encodeurs de texte (ConditioningCombine, etc.)."""
+    if not isinstance(link, list) or not link or depth > MAX_LINK_DEPTH:
+        return []
+    node = nodes.get(str(link[0]))
+    if not node:
+        return []
+    inputs = node.get('inputs', {})
+    texts = [v for k, v in inputs.items() if k in ("text", "text_g", "text_l") and isinstance(v, str)]
+    if texts:
+        return texts
+    found = []
+    for value in inputs.values():
+        found += _collect_texts(nodes, value, depth + 1)
+    return found
+
+
+def extract_generation_params(prompt) -> dict:
+    """Extrait prompts, modèles et réglages du sampler d'un workflow API ComfyUI."""
+    if isinstance(prompt, str):
+        try: prompt = json.loads(prompt)
+        except json.JSONDecodeError: return {}
+    if not isinstance(prompt, dict):
+        return {}
+    nodes = {str(nid): n for nid, n in prompt.items() if isinstance(n, dict)}
+    params = {'pos': [], 'neg': [], 'ckpt': [], 'lora': []}
+
+    samplers = [n for n in nodes.values() if "KSampler" in n.get("class_type", "") or "SamplerCustom" in n.get("class_type", "")]
+    if samplers:
+        inputs = samplers[0].get('inputs', {})
+        seed = _scalar(inputs.get('seed', inputs.get('noise_seed')))
+        params['seed'] = int(seed) if isinstance(seed, (int, float)) else None
+        params['steps'] = _scalar(inputs.get('steps'))
+        params['cfg'] = _scalar(inputs.get('cfg'))
+        params['sampler'] = _scalar(inputs.get('sampler_name'))
+        params['scheduler'] = _scalar(inputs.get('scheduler'))
+        params['pos'] = _collect_texts(nodes, inputs.get('positive'))
+        params['neg'] = _collect_texts(nodes, inputs.get('negative'))
+
+    if not params['pos'] and not params['neg']:
+        for node in nodes.values():
+            title, text = node.get("_meta", {}).get("title", "").lower(), node.get('inputs', {}).get('text')
+            if isinstance(text, str):
+                params['neg' if "negative" in title else 'pos'].append(text)
+
+    for node in nodes.values():
+        inputs = node.get('inputs', {})
+        for key in ("ckpt_name", "unet_name"):
+            if isinstance(inputs.get(key), str): params['ckpt'].append(inputs[key])
+        if isinstance(inputs.get('lora_name'), str): params['lora'].append(inputs['lora_name'])
+    return params
+
+
+def index_terms(params: dict) -> set[tuple[str, str]]:
+    """Couples (jeton, champ) à insérer dans l'index inversé."""
+    terms = set()
+    for field in ("pos", "neg"):
+        for text in params.get(field, []):
+            terms.update((t, field) for t in tokenize(text))
+    for field in ("ckpt", "lora"):
+        for name in params.get(field, []):
+            terms.update((t, field) for t in _model_tokens(name))
+    for field in ("sampler", "scheduler"):
+        if isinstance(params.get(field), str):
+            terms.update((t, field) for t in tokenize(params[field]))
+    return terms
+
+
+def _prefix_clause(fields: tuple, token: str):
+    placeholders = ", ".join("?" for _ in fields)
+    sql = f"id IN (SELECT image_id FROM image_terms WHERE term >= ? AND term < ? AND field IN ({placeholders}))"
+    return sql, [token, token + "\uffff", *fields]
+
+
+def _all_tokens_clause(fields: tuple, tokens: list[str]):
+    clauses, params = [], []
+    for token in tokens:
+        sql, args = _prefix_clause(fields, token)
+        clauses.append(sql)
+        params += args
+    return " AND ".join(clauses), params
+
+
+def _numeric_clause(column: str, value: str):
+    if m := RANGE_RE.match(value):
+        return f"{column} BETWEEN ? AND ?", [float(m.group(1)), float(m.group(2))]
+    if m := NUMERIC_RE.match(value):
+        return f"{column} {m.group(1) or '='} ?", [float(m.group(2))]
+    return None, []
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_search_clause(query: str):
+    """
+    Traduit une requête utilisateur en clause SQL sur la table images.
+    Syntaxe : mots libres, `-mot` pour exclure, `champ:valeur` (ckpt, lora, neg, pos, sampler, scheduler, name)
+    et filtres numériques `steps:>30`, `cfg:7`, `seed:123`, `width:1024`, `steps:20..30`, `dim:1024x1024`.
+    """
+    try:
+        parts = shlex.split(query)
+    except ValueError:
+        parts = query.split()
+
+    clauses, params = [], []
+    for part in parts:
+        negate = part.startswith("-") and len(part) > 1
+        if negate: part = part[1:]
+        field, sep, value = part.partition(":")
+        field = field.lower()
+        sql, args = None, []
+
+        if sep and field == "dim" and re.match(r"^\d+x\d+$", value.lower()):
+            w, h = value.lower().split("x")
+            sql, args = "width = ? AND height = ?", [int(w), int(h)]
+        elif sep and field in NUMERIC_COLUMNS:
+            sql, args = _numeric_clause(NUMERIC_COLUMNS[field], value)
+        elif sep and field in TEXT_COLUMNS:
+            sql, args = f"lower({TEXT_COLUMNS[field]}) LIKE ? ESCAPE '\\'", [f"%{_escape_like(value.lower())}%"]
+        elif sep and field in TERM_FIELDS:
+            sql, args = _all_tokens_clause((TERM_FIELDS[field],), tokenize(value) or [value.lower()])
+        else:
+            # Mot libre : nom de fichier, prompt positif, modèles, sampler ou scheduler
+            text = part.lower()
+            name_sql, name_args = "name LIKE ? ESCAPE '\\'", [f"%{_escape_like(text)}%"]
+            tokens = tokenize(text)
+            if tokens:
+                terms_sql, terms_args = _all_tokens_clause(FREE_TEXT_FIELDS, tokens)
+                sql, args = f"({name_sql} OR ({terms_sql}))", name_args + terms_args
+            else:
+                sql, args = name_sql, name_args
+
+        if sql:
+            clauses.append(f"NOT ({sql})" if negate else f"({sql})")
+            params += args
+    return " AND ".join(clauses), params
@@ -0,0 +1,204 @@
+# utils/model_inventory.py (V1.1 - Inventaire des modèles persistant, revalidé par les dates de modification des dossiers)
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from config import Config
+
+MODEL_EXTENSIONS = (".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf")
+# Un dossier modifié il y a moins de RACY_DELAY secondes est relu au contrôle suivant :
+# un fichier ajouté juste après la lecture pourrait ne pas changer sa date de modification.
+RACY_DELAY = 2.0
+
+# Chaque entrée est appliquée une seule fois, suivie par PRAGMA user_version.
+_MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS model_dirs (
+        root TEXT NOT NULL,
+        rel_dir TEXT NOT NULL,
+        mtime_ns INTEGER,
+        subdirs TEXT NOT NULL,
+        files TEXT NOT NULL,
+        PRIMARY KEY (root, rel_dir)
+    );
+    """,
+]
+
+
+class ModelMap(dict):
+    """{chemin relatif: nom de fichier} trié, avec la position de chaque modèle pour les sélecteurs. Partagé : ne pas modifier."""
+
+    def __init__(self, items=()):
+        super().__init__(sorted(items))
+        self.options = tuple(self)
+        self._positions = {key: i for i, key in enumerate(self.options)}
+
+    def position(self, key, default: int = 0) -> int:
+        return self._positions.get(key, default)
+
+
+class ModelInventory:
+    """
+    Listes des modèles par type (checkpoints, loras, ...), partagées par toutes les sessions et persistées sur disque.
+    Chaque dossier est mémorisé avec sa date de modification, ses sous-dossiers et ses fichiers : un contrôle ne coûte
+    qu'un stat par dossier et ne relit que ceux qui ont changé. Les événements du watcher forcent la relecture
+    des dossiers touchés sans attendre le contrôle périodique.
+    """
+
+    def __init__(self, db_path: Path, model_types=None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_types = list(model_types or Config.MODEL_TYPES)
+        self.version = 0
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._dirs = {}       # (racine du type, dossier relatif) -> [mtime_ns, sous-dossiers, fichiers]
+        self._maps = {}       # type -> ModelMap, remplacée (jamais modifiée) à chaque changement
+        self._dirty = set()
+        self._last_check = 0.0
+        self._migrate()
+        self._load()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self):
+        conn = self._conn()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for i, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+            with conn:
+                conn.executescript(script)
+                conn.execute(f"PRAGMA user_version = {i}")
+
+    @staticmethod
+    def _root(m_type: str) -> Path | None:
+        return Config.BASE_PATH / "models" / m_type if Config.BASE_PATH else None
+
+    @classmethod
+    def path(cls, m_type: str, rel_path: str) -> Path | None:
+        """Chemin absolu d'un modèle à partir de sa clé dans ModelMap."""
+        root = cls._root(m_type)
+        return root / rel_path if root is not None else None
+
+    def _load(self):
+        """Reprend l'inventaire du dernier lancement : les pages s'affichent sans attendre un parcours complet."""
+        for root, rel_dir, mtime_ns, subdirs, files in self._conn().execute("SELECT root, rel_dir, mtime_ns, subdirs, files FROM model_dirs"):
+            self._dirs[(root, rel_dir)] = [mtime_ns, json.loads(subdirs), json.loads(files)]
+        for m_type in self.model_types:
+            self._rebuild(m_type)
+
+    def _rebuild(self, m_type: str):
+        root = self._root(m_type)
+        found = []
+        if root is not None:
+            for (dir_root, rel_dir), (_, _, files) in self._dirs.items():
+                if dir_root == str(root):
+                    found.extend((f"{rel_dir}/{name}" if rel_dir else name, name) for name in files)
+        self._maps[m_type] = ModelMap(found)
+
+    def _list_dir(self, path: Path) -> tuple[list, list]:
+        subdirs, files = [], []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+                elif os.path.splitext(entry.name)[1].lower() in MODEL_EXTENSIONS:
+                    files.append(entry.name)
+        return sorted(subdirs), sorted(files)
+
+    def _sync_type(self, m_type: str) -> bool:
+        """Revalide l'arborescence d'un type ; vrai si la liste de ses modèles a changé."""
+        root = self._root(m_type)
+        if root is None:
+            return False
+        key_root, seen, changed, updates, stack = str(root), set(), False, [], [""]
+        while stack:
+            rel_dir = stack.pop()
+            key = (key_root, rel_dir)
+            entry = self._dirs.get(key)
+            try:
+                mtime_ns = os.stat(root / rel_dir).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(key)
+            if entry is None or entry[0] != mtime_ns or key in self._dirty:
+                try:
+                    subdirs, files = self._list_dir(root / rel_dir)
+                except OSError as e:
+                    print(f"Erreur lors de la lecture de {root / rel_dir}: {e}")
+                    if entry is None:
+                        continue
+                else:
+                    racy = time.time() - mtime_ns / 1e9 < RACY_DELAY
+                    new = [None if racy else mtime_ns, subdirs, files]
+                    changed |= entry is None or entry[2] != files
+                    if new != entry:
+                        self._dirs[key] = entry = new
+                        updates.append((key_root, rel_dir, new[0], json.dumps(subdirs), json.dumps(files)))
+            stack.extend(f"{rel_dir}/{d}" if rel_dir else d for d in entry[1])
+
+        removed = [key for key in self._dirs if key[0] == key_root and key not in seen]
+        for key in removed:
+            changed |= bool(self._dirs.pop(key)[2])
+        self._dirty = {key for key in self._dirty if key[0] != key_root}
+        if updates or removed:
+            with self._conn() as conn:
+                conn.executemany("INSERT OR REPLACE INTO model_dirs (root, rel_dir, mtime_ns, subdirs, files) VALUES (?, ?, ?, ?, ?)", updates)
+                conn.executemany("DELETE FROM model_dirs WHERE root = ? AND rel_dir = ?", removed)
+        return changed
+
+    def refresh(self, force: bool = False):
+        """Contrôle les dossiers au plus une fois par MODEL_INVENTORY_CHECK_INTERVAL, sauf événement du watcher en attente."""
+        with self._lock:
+            if not force and not self._dirty and time.time() - self._last_check < Config.MODEL_INVENTORY_CHECK_INTERVAL:
+                return
+            self._last_check = time.time()
+            for m_type in self.model_types:
+                if self._sync_type(m_type) or m_type not in self._maps:
+                    self._rebuild(m_type)
+                    self.version += 1
+
+    def maps(self, model_types=None) -> dict:
+        """{type: ModelMap} ; les listes sont partagées entre sessions et reconstruites seulement quand un dossier change."""
+        model_types = list(model_types or self.model_types)
+        with self._lock:
+            new_types = [m_type for m_type in model_types if m_type not in self.model_types]
+            self.model_types.extend(new_types)
+        self.refresh(force=bool(new_types))
+        with self._lock:
+            return {m_type: self._maps.get(m_type, ModelMap()) for m_type in model_types}
+
+    def invalidate(self, paths):
+        """Marque les dossiers contenant ces fichiers (et leurs parents) pour relecture au prochain accès."""
+        with self._lock:
+            for path in paths:
+                for m_type in self.model_types:
+                    root = self._root(m_type)
+                    if root is None:
+                        continue
+                    try:
+                        parts = Path(path).parent.relative_to(root).parts
+                    except ValueError:
+                        continue
+                    for depth in range(len(parts) + 1):
+                        self._dirty.add((str(root), "/".join(parts[:depth])))
+
+
+_inventory = None
+_inventory_lock = threading.Lock()
+
+
+def get_model_inventory() -> ModelInventory:
+    global _inventory
+    with _inventory_lock:
+        if _inventory is None:
+            _inventory = ModelInventory(Config.MODEL_INVENTORY_DB)
+        return _inventory
@@ -0,0 +1,216 @@
+# utils/model_metadata.py (V1.0 - En-têtes safetensors : architecture, rang des LoRA et métadonnées d'entraînement)
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from config import Config
+from utils.model_inventory import get_model_inventory
+
+# Au-delà, le fichier n'est pas un safetensors valide (les en-têtes réels font de quelques Ko à quelques Mo)
+MAX_HEADER_BYTES = 100 * 1024 * 1024
+ARCH_LABELS = {'sd15': "SD1.5", 'sd2': "SD2", 'sdxl': "SDXL", 'sd3': "SD3", 'flux': "Flux"}
+# Dimension du contexte texte vue par la cross-attention du UNet (entrée de attn2.to_k)
+CONTEXT_DIMS = {768: 'sd15', 1024: 'sd2', 2048: 'sdxl'}
+# (fragment de ss_base_model_version / modelspec.architecture, architecture), dans l'ordre de test
+METADATA_ARCHS = (("flux", 'flux'), ("sd3", 'sd3'), ("stable-diffusion-3", 'sd3'), ("xl", 'sdxl'), ("v2", 'sd2'), ("v1", 'sd15'))
+TRAINING_KEYS = ("ss_base_model_version", "ss_sd_model_name", "ss_network_module", "ss_network_dim", "ss_network_alpha",
+                 "ss_output_name", "ss_num_epochs", "ss_steps", "ss_learning_rate", "ss_resolution", "ss_training_comment",
+                 "modelspec.architecture", "modelspec.title")
+LORA_DOWN = (".lora_down.", ".lora_A.")
+
+# Chaque entrée est appliquée une seule fois, suivie par PRAGMA user_version.
+_MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS model_metadata (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        info TEXT NOT NULL
+    );
+    """,
+]
+
+
+def read_safetensors_header(path: Path) -> dict:
+    """En-tête JSON d'un fichier .safetensors (8 octets de longueur little-endian puis le JSON), sans lire les tenseurs."""
+    with open(path, 'rb') as f:
+        raw = f.read(8)
+        if len(raw) < 8:
+            raise ValueError("fichier tronqué")
+        (length,) = struct.unpack("<Q", raw)
+        if length > MAX_HEADER_BYTES:
+            raise ValueError(f"en-tête invalide ({length} octets annoncés)")
+        data = f.read(length)
+    if len(data) < length:
+        raise ValueError("en-tête tronqué")
+    header = json.loads(data)
+    if not isinstance(header, dict):
+        raise ValueError("en-tête invalide")
+    return header
+
+
+def _arch_from_metadata(metadata: dict) -> str | None:
+    value = str(metadata.get("ss_base_model_version") or metadata.get("modelspec.architecture") or "").lower()
+    return next((arch for needle, arch in METADATA_ARCHS if needle in value), None) if value else None
+
+
+def _arch_from_tensors(tensors: dict) -> str | None:
+    if any("double_blocks" in key or "single_transformer_blocks" in key for key in tensors):
+        return 'flux'
+    if any("joint_blocks" in key for key in tensors):
+        return 'sd3'
+    for key, tensor in tensors.items():
+        shape = tensor.get('shape') or ()
+        if "attn2" in key and "to_k" in key and len(shape) == 2 and not any(s in key for s in (".lora_up.", ".lora_B.", "alpha")):
+            return CONTEXT_DIMS.get(shape[1])
+    if any(key.startswith(("lora_te2_", "conditioner.embedders.1.")) for key in tensors):
+        return 'sdxl'
+    return None
+
+
+def describe_header(header: dict) -> dict:
+    """Architecture de base, type (LoRA ou modèle complet), rang et métadonnées d'entraînement utiles."""
+    metadata = header.get("__metadata__") or {}
+    tensors = {key: value for key, value in header.items() if key != "__metadata__" and isinstance(value, dict)}
+    ranks = Counter(value['shape'][0] for key, value in tensors.items() if any(s in key for s in LORA_DOWN) and value.get('shape'))
+    return {
+        'arch': _arch_from_metadata(metadata) or _arch_from_tensors(tensors),
+        'kind': 'lora' if ranks else 'model',
+        'rank': ranks.most_common(1)[0][0] if ranks else None,
+        'tensors': len(tensors),
+        'training': {key: metadata[key] for key in TRAINING_KEYS if key in metadata},
+    }
+
+
+class ModelMetadataCache:
+    """
+    Descriptions des fichiers safetensors, persistées et indexées par (chemin, taille, date de modification).
+    `get` ne fait aucune entrée/sortie : il rend la dernière description connue et confie la lecture
+    ou la revalidation à un pool de threads, au plus une fois par MODEL_INVENTORY_CHECK_INTERVAL.
+    """
+
+    def __init__(self, db_path: Path, max_workers: int = None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers or Config.MODEL_METADATA_WORKERS
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = set()
+        self._migrate()
+        self._entries = {
+            path: {'size': size, 'mtime_ns': mtime_ns, 'info': json.loads(info), 'checked': 0.0}
+            for path, size, mtime_ns, info in self._conn().execute("SELECT path, size, mtime_ns, info FROM model_metadata")
+        }
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self):
+        conn = self._conn()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for i, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+            with conn:
+                conn.executescript(script)
+                conn.execute(f"PRAGMA user_version = {i}")
+
+    def get(self, path) -> dict | None:
+        """Description connue du fichier (éventuellement en cours de revalidation), ou None si pas encore lue."""
+        path = str(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if (entry is None or time.time() - entry['checked'] >= Config.MODEL_INVENTORY_CHECK_INTERVAL) and path not in self._pending:
+                self._pending.add(path)
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="model-metadata")
+                self._executor.submit(self._refresh, path)
+            return entry['info'] if entry else None
+
+    def _refresh(self, path: str):
+        try:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                with self._lock:
+                    self._entries.pop(path, None)
+                with self._conn() as conn:
+                    conn.execute("DELETE FROM model_metadata WHERE path = ?", (path,))
+                return
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry and (entry['size'], entry['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                    entry['checked'] = time.time()
+                    return
+            try:
+                info = describe_header(read_safetensors_header(path))
+            except (OSError, ValueError) as e:
+                print(f"Erreur lors de la lecture de l'en-tête de {path}: {e}")
+                info = {'arch': None, 'kind': None, 'rank': None, 'error': str(e)}
+            with self._conn() as conn:
+                conn.execute("INSERT OR REPLACE INTO model_metadata (path, size, mtime_ns, info) VALUES (?, ?, ?, ?)",
+                             (path, stat.st_size, stat.st_mtime_ns, json.dumps(info)))
+            with self._lock:
+                self._entries[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'info': info, 'checked': time.time()}
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def wait(self):
+        """Attend la fin des lectures planifiées."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_model_metadata_cache() -> ModelMetadataCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ModelMetadataCache(Config.MODEL_METADATA_DB)
+        return _cache
+
+
+def model_info(m_type: str, rel_path: str) -> dict | None:
+    """Description d'un modèle de l'inventaire ; None tant qu'elle n'est pas lue ou si le format n'est pas safetensors."""
+    path = get_model_inventory().path(m_type, rel_path) if isinstance(rel_path, str) else None
+    if path is None or path.suffix.lower() != ".safetensors":
+        return None
+    return get_model_metadata_cache().get(path)
+
+
+def lora_compatible(info: dict | None, arch: str | None) -> bool:
+    """Une LoRA d'architecture inconnue (pas encore lue, métadonnées absentes) reste proposée."""
+    return not arch or not info or not info.get('arch') or info['arch'] == arch
+
+
+def model_details(info: dict | None) -> str:
+    """Résumé affiché sous un sélecteur (les libellés des options restent stables pendant la lecture en arrière-plan)."""
+    if not info or not info.get('arch'):
+        return ""
+    training = info.get('training', {})
+    parts = [ARCH_LABELS[info['arch']]]
+    if info.get('rank'):
+        parts.append(f"rang {info['rank']}" + (f" (alpha {training['ss_network_alpha']})" if 'ss_network_alpha' in training else ""))
+    if training.get('ss_num_epochs'):
+        parts.append(f"{training['ss_num_epochs']} époque(s)")
+    return " · ".join(parts)
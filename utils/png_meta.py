@@ -0,0 +1,88 @@
+# utils/png_meta.py (V1.0 - Lecture des métadonnées PNG sans décodage des pixels)
+import json
+import os
+import struct
+import zlib
+from functools import lru_cache
+from pathlib import Path
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+TEXT_CHUNKS = (b"tEXt", b"zTXt", b"iTXt")
+MAX_TEXT_CHUNK_SIZE = 64 * 1024 * 1024
+METADATA_CACHE_SIZE = 4096
+
+
+def _decode_text_chunk(chunk_type: bytes, data: bytes):
+    keyword, _, rest = data.partition(b"\x00")
+    key = keyword.decode("latin-1")
+    if chunk_type == b"tEXt":
+        return key, rest.decode("latin-1")
+    if chunk_type == b"zTXt":
+        return key, zlib.decompress(rest[1:]).decode("latin-1")
+    # iTXt : drapeau de compression, méthode, langue\0, mot-clé traduit\0, texte UTF-8
+    compressed = rest[0] == 1
+    _language, _, rest = rest[2:].partition(b"\x00")
+    _translated, _, text = rest.partition(b"\x00")
+    return key, (zlib.decompress(text) if compressed else text).decode("utf-8")
+
+
+def _read_chunks(path: Path) -> dict:
+    """Parcourt les chunks jusqu'au premier IDAT et retourne dimensions et textes embarqués."""
+    info = {'width': None, 'height': None, 'text': {}}
+    with open(path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError(f"{Path(path).name} n'est pas un fichier PNG")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, chunk_type = struct.unpack(">I4s", header)
+            if chunk_type in (b"IDAT", b"IEND"):
+                break
+            if chunk_type == b"IHDR":
+                info['width'], info['height'] = struct.unpack(">II", f.read(8))
+                f.seek(length - 8 + 4, os.SEEK_CUR)
+            elif chunk_type in TEXT_CHUNKS and length <= MAX_TEXT_CHUNK_SIZE:
+                data = f.read(length)
+                f.seek(4, os.SEEK_CUR)  # CRC
+                try:
+                    key, value = _decode_text_chunk(chunk_type, data)
+                    info['text'][key] = value
+                except (zlib.error, UnicodeDecodeError, IndexError):
+                    continue
+            else:
+                f.seek(length + 4, os.SEEK_CUR)
+    return info
+
+
+@lru_cache(maxsize=METADATA_CACHE_SIZE)
+def _cached_chunks(path_str: str, mtime_ns: int, size: int) -> dict:
+    return _read_chunks(Path(path_str))
+
+
+def read_png_metadata(path: Path) -> dict:
+    """
+    Retourne {'width', 'height', 'text'} pour un PNG, mis en cache par (chemin, mtime, taille).
+    Le dictionnaire retourné est partagé par le cache : ne pas le modifier.
+    """
+    st = os.stat(path)
+    return _cached_chunks(str(path), st.st_mtime_ns, st.st_size)
+
+
+def _parse_json(raw):
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+
+
+def read_generation_metadata(path: Path) -> dict:
+    """Retourne le workflow API ('prompt') et le workflow UI ('workflow') embarqués par ComfyUI, décodés en JSON."""
+    text = read_png_metadata(path)['text']
+    return {
+        'prompt': _parse_json(text.get('prompt')),
+        'workflow': _parse_json(text.get('workflow')),
+        'prompt_raw': text.get('prompt'),
+    }
@@ -0,0 +1,139 @@
+# utils/result_cache.py (V1.0 - Cache de résultats adressé par le contenu du workflow)
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from config import Config
+
+# Chaque entrée est appliquée une seule fois, suivie par PRAGMA user_version.
+_MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS results (
+        key TEXT PRIMARY KEY,
+        images TEXT NOT NULL,
+        bytes INTEGER NOT NULL,
+        created REAL NOT NULL,
+        last_used REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_results_last_used ON results(last_used);
+    """,
+]
+
+
+def _is_link(value, wf: dict) -> bool:
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], str) and value[0] in wf
+
+
+def workflow_key(wf: dict) -> str:
+    """
+    Empreinte canonique d'un workflow au format API : chaque nœud est haché avec ses entrées, les liens étant
+    remplacés par l'empreinte du nœud amont (les identifiants de nœuds n'interviennent pas), sans `_meta`.
+    """
+    memo = {}
+
+    def node_hash(node_id: str) -> str:
+        if node_id not in memo:
+            node = wf[node_id]
+            inputs = {name: ["@" + node_hash(value[0]), value[1]] if _is_link(value, wf) else value
+                      for name, value in node.get("inputs", {}).items()}
+            canonical = json.dumps({'class_type': node.get("class_type"), 'inputs': inputs}, sort_keys=True, separators=(",", ":"))
+            memo[node_id] = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        return memo[node_id]
+
+    nodes = sorted(node_hash(node_id) for node_id, node in wf.items() if isinstance(node, dict))
+    return hashlib.sha256("".join(nodes).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Associe l'empreinte d'un workflow déterministe (seed fixe) aux images déjà produites.
+    Le cache ne possède pas les fichiers : l'éviction (âge, taille cumulée) retire seulement la référence,
+    et une entrée dont une image a disparu du disque est ignorée puis supprimée.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._migrate()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self):
+        conn = self._conn()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for i, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+            with conn:
+                conn.executescript(script)
+                conn.execute(f"PRAGMA user_version = {i}")
+
+    def get(self, wf: dict) -> list[dict] | None:
+        """Images [{name, path}] d'une exécution précédente identique, ou None."""
+        key = workflow_key(wf)
+        row = self._conn().execute("SELECT images FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        images = json.loads(row[0])
+        with self._conn() as conn:
+            if not all(img.get('path') and os.path.exists(img['path']) for img in images):
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE results SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        return images
+
+    def put(self, wf: dict, images: list[dict]):
+        if not images or not all(img.get('path') for img in images):
+            return
+        size = sum(os.path.getsize(img['path']) for img in images if os.path.exists(img['path']))
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, images, bytes, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (workflow_key(wf), json.dumps(images), size, now, now),
+            )
+        self.evict()
+
+    def evict(self) -> int:
+        """Retire les entrées trop anciennes, puis les moins récemment utilisées au-delà du budget en octets."""
+        removed = 0
+        with self._conn() as conn:
+            removed += conn.execute(
+                "DELETE FROM results WHERE last_used < ?", (time.time() - Config.RESULT_CACHE_MAX_AGE_DAYS * 86400,)
+            ).rowcount
+            budget = Config.RESULT_CACHE_MAX_MB * 1024 * 1024
+            total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM results").fetchone()[0]
+            if total > budget:
+                for key, size in conn.execute("SELECT key, bytes FROM results ORDER BY last_used").fetchall():
+                    if total <= budget:
+                        break
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    total -= size
+                    removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        entries, size, hits = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0), COALESCE(SUM(hits), 0) FROM results").fetchone()
+        return {'entries': entries, 'bytes': size, 'hits': hits}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(Config.RESULT_CACHE_DB)
+        return _cache
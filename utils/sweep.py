@@ -0,0 +1,130 @@
+# utils/sweep.py (V1.0 - Balayage de paramètres : matrice de travaux et planche contact)
+import copy
+import itertools
+from pathlib import Path
+from PIL import Image, ImageDraw, ImageFont
+
+# Axe -> (type de nœud ciblé, entrées modifiées). Le premier nœud trouvé est modifié, comme dans les réglages avancés.
+SWEEP_AXES = {
+    'seed': ("sampler", ("seed",)),
+    'steps': ("sampler", ("steps",)),
+    'cfg': ("sampler", ("cfg",)),
+    'sampler_name': ("sampler", ("sampler_name",)),
+    'scheduler': ("sampler", ("scheduler",)),
+    'ckpt_name': ("checkpoint", ("ckpt_name",)),
+    'lora_strength': ("lora", ("strength_model", "strength_clip")),
+}
+AXIS_LABELS = {'seed': "seed", 'steps': "steps", 'cfg': "cfg", 'sampler_name': "sampler", 'scheduler': "scheduler",
+               'ckpt_name': "modèle", 'lora_strength': "LoRA"}
+CELL_SIZE = 320
+HEADER_HEIGHT = 28
+
+
+def parse_values(text: str, kind=int) -> list:
+    """
+    Valeurs d'un axe numérique : liste « 1, 2, 5 », plage « 1-4 » (entiers) ou « début:fin:pas » (bornes incluses).
+    Lève ValueError si la saisie est invalide.
+    """
+    values = []
+    for part in (p.strip() for p in (text or "").split(",")):
+        if not part:
+            continue
+        if part.count(":") == 2:
+            start, stop, step = (kind(x) for x in part.split(":"))
+            if step <= 0:
+                raise ValueError(f"Pas invalide : {part}")
+            values.extend(kind(round(start + i * step, 6)) for i in range(int((stop - start) / step + 1e-9) + 1))
+        elif kind is int and "-" in part[1:]:
+            start, stop = (int(x) for x in part.split("-", 1))
+            values.extend(range(start, stop + 1) if start <= stop else range(start, stop - 1, -1))
+        else:
+            values.append(kind(part))
+    return list(dict.fromkeys(values))
+
+
+def _target_node(wf: dict, target: str) -> dict | None:
+    for node in wf.values():
+        if not isinstance(node, dict):
+            continue
+        inputs, class_type = node.get("inputs", {}), node.get("class_type", "")
+        if (target == "sampler" and "KSampler" in class_type) or (target == "checkpoint" and "ckpt_name" in inputs) \
+                or (target == "lora" and "lora_name" in inputs):
+            return node
+    return None
+
+
+def available_axes(wf: dict) -> list[str]:
+    """Axes applicables au workflow (les nœuds ciblés existent)."""
+    return [axis for axis, (target, _) in SWEEP_AXES.items() if _target_node(wf, target)]
+
+
+def expand_sweep(wf: dict, axes: dict) -> list[tuple[dict, dict]]:
+    """
+    Produit cartésien des axes -> [(workflow, {axe: valeur})], le dernier axe variant le plus vite.
+    Un axe vide est ignoré (valeur courante du workflow).
+    """
+    axes = {axis: values for axis, values in axes.items() if values}
+    jobs = []
+    for combo in itertools.product(*axes.values()):
+        job_wf = copy.deepcopy(wf)
+        labels = dict(zip(axes, combo))
+        for axis, value in labels.items():
+            target, inputs = SWEEP_AXES[axis]
+            node = _target_node(job_wf, target)
+            for name in inputs:
+                node['inputs'][name] = value
+        jobs.append((job_wf, labels))
+    return jobs
+
+
+def format_value(axis: str, value) -> str:
+    if axis == 'ckpt_name':
+        return Path(str(value)).stem
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def format_labels(labels: dict, axes: list[str] = None) -> str:
+    return " · ".join(f"{AXIS_LABELS.get(a, a)}={format_value(a, labels[a])}" for a in (axes or labels) if a in labels)
+
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def build_contact_sheet(axes: list, cells: list, dest: Path) -> Path:
+    """
+    Grille étiquetée des résultats d'un balayage.
+    `axes` : [[axe, valeurs], ...] dans l'ordre du produit ; `cells` : [(labels, chemin image ou None)] dans le même ordre.
+    Colonnes = dernier axe variable, lignes = combinaisons des autres axes variables.
+    """
+    varying = [axis for axis, values in axes if len(values) > 1]
+    col_axis = varying[-1] if varying else None
+    row_axes = varying[:-1]
+    ncols = len(dict(axes)[col_axis]) if col_axis else 1
+    nrows = max(1, -(-len(cells) // ncols))
+    row_header = 220 if row_axes else 0
+    font = _font(14)
+
+    sheet = Image.new("RGB", (row_header + ncols * CELL_SIZE, HEADER_HEIGHT + nrows * CELL_SIZE), "white")
+    draw = ImageDraw.Draw(sheet)
+    for i, (labels, path) in enumerate(cells):
+        row, col = divmod(i, ncols)
+        x, y = row_header + col * CELL_SIZE, HEADER_HEIGHT + row * CELL_SIZE
+        if row == 0 and col_axis:
+            draw.text((x + 6, 6), format_labels(labels, [col_axis]), fill="black", font=font)
+        if col == 0 and row_axes:
+            draw.multiline_text((6, y + 6), "\n".join(format_labels(labels, [a]) for a in row_axes), fill="black", font=font)
+        try:
+            with Image.open(path) as img:
+                img.thumbnail((CELL_SIZE - 8, CELL_SIZE - 8))
+                sheet.paste(img.convert("RGB"), (x + (CELL_SIZE - img.width) // 2, y + (CELL_SIZE - img.height) // 2))
+        except Exception:
+            draw.rectangle((x + 4, y + 4, x + CELL_SIZE - 4, y + CELL_SIZE - 4), outline="red")
+            draw.text((x + 12, y + 12), "échec", fill="red", font=font)
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    sheet.save(dest, "PNG")
+    return dest
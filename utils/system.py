@@ -1,37 +1,38 @@
-# utils/system.py (V7.0 - Surveillance des ressources système)
+# utils/system.py (V8.1 - Listes de modèles servies par l'inventaire persistant)
 import json
 import shutil
 import psutil
 import GPUtil
 from pathlib import Path
 from config import Config
+from utils.model_inventory import get_model_inventory
 
-def get_model_maps(model_types=["checkpoints", "loras", "vae"]):
+def get_model_maps(model_types=None):
     """
     Liste simplement les modèles sans lire les métadonnées. C'est beaucoup plus rapide.
     La valeur contient maintenant juste le nom du fichier.
+    Les listes viennent de l'inventaire partagé (utils.model_inventory), persistant et revalidé par dossier.
     """
-    maps = {m_type: {} for m_type in model_types}
-    base_path = Config.BASE_PATH / "models"
-    for m_type in model_types:
-        type_path = base_path / m_type
-        if type_path.exists():
-            for f in type_path.rglob("*"):
-                if f.suffix in [".safetensors", ".ckpt", ".pt", ".bin"]:
-                    relative_path = str(f.relative_to(type_path)).replace("\\", "/")
-                    maps[m_type][relative_path] = f.name # La valeur est juste le nom
-    return maps
+    return get_model_inventory().maps(model_types)
+
+def apply_model_changes(created, deleted):
+    """Signale à l'inventaire les fichiers créés/supprimés sous models/ (événements du watcher)."""
+    get_model_inventory().invalidate(list(created) + list(deleted))
+
+# Entrée de nœud -> type de modèle ; certaines entrées génériques ne désignent un modèle que pour un type de nœud
+MODEL_INPUTS = {"ckpt_name": "checkpoints", "lora_name": "loras", "vae_name": "vae", "control_net_name": "controlnet"}
+NODE_MODEL_INPUTS = {("UpscaleModelLoader", "model_name"): "upscale_models"}
 
 def validate_workflow_models(workflow: dict, model_maps: dict) -> list[dict]:
-    """Vérifie si les modèles requis par le workflow existent dans les listes."""
+    """Vérifie si les modèles requis par le workflow existent dans les listes (types absents de model_maps ignorés)."""
     missing = []
-    type_map = {"ckpt_name": "checkpoints", "lora_name": "loras", "vae_name": "vae"}
     for node in workflow.values():
         if isinstance(node, dict) and 'inputs' in node:
             for key, path in node['inputs'].items():
-                if key in type_map and isinstance(path, str) and path not in model_maps.get(type_map[key], {}):
+                m_type = MODEL_INPUTS.get(key) or NODE_MODEL_INPUTS.get((node.get('class_type'), key))
+                if m_type in model_maps and isinstance(path, str) and path not in model_maps[m_type]:
                     if not any(d['name'] == path for d in missing):
-                        missing.append({"name": path, "type": type_map[key]})
+                        missing.append({"name": path, "type": m_type})
     return missing
 
 def update_workflow_paths(workflow: dict, model_maps: dict) -> dict:
@@ -64,27 +65,17 @@ def copy_to_local_storage(source_path: Path):
         print(f"Erreur lors de la copie vers le stockage local: {e}")
         return False
 
-def create_thumbnail(source_path: Path, size=(256, 256)):
-    """Crée une miniature de l'image source dans le dossier thumbnails de la galerie."""
-    if not Config.GALLERY_PATH or not source_path:
-        return False
-    try:
-        from PIL import Image
-        thumb_dir = Config.GALLERY_PATH / "thumbnails"
-        thumb_dir.mkdir(parents=True, exist_ok=True)
-        thumb_path = thumb_dir / source_path.name
-        with Image.open(source_path) as img:
-            img.thumbnail(size)
-            img.save(thumb_path)
-        return True
-    except Exception as e:
-        print(f"Erreur lors de la création de la miniature: {e}")
+def create_thumbnail(source_path: Path):
+    """Crée immédiatement les miniatures WebP de l'image dans le cache partagé (voir utils.thumbnails)."""
+    if not source_path:
         return False
+    from utils.thumbnails import create_thumbnails_now
+    return create_thumbnails_now(source_path) is not None
 
-def get_system_resources():
-    """Surveille les ressources système (CPU, RAM, GPU)."""
+def get_system_resources(interval=1):
+    """Surveille les ressources système (CPU, RAM, GPU). `interval=None` : mesure CPU non bloquante (depuis l'appel précédent)."""
     try:
-        cpu_percent = psutil.cpu_percent(interval=1)
+        cpu_percent = psutil.cpu_percent(interval=interval)
         memory = psutil.virtual_memory()
         ram_percent = memory.percent
         ram_available_gb = memory.available / (1024 ** 3)
@@ -0,0 +1,261 @@
+# utils/thumbnails.py (V1.3 - Échecs de miniature oubliés quand le fichier change)
+import argparse
+import hashlib
+import multiprocessing
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image
+from config import Config
+from utils.gallery_index import get_gallery_index
+from utils.image_hash import compute_hashes
+
+THUMBNAIL_FORMAT = "webp"
+THUMBNAIL_QUALITY = 80
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(path: Path) -> str:
+    """Empreinte BLAKE2b du contenu du fichier : un renommage ou une copie garde la même clé."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def thumbnail_path(digest: str, size: int) -> Path:
+    return Config.THUMBNAIL_DIR / digest[:2] / f"{digest}_{size}.{THUMBNAIL_FORMAT}"
+
+
+def _render_thumbnails(source: str, sizes: tuple, force: bool = False) -> dict:
+    """
+    Exécuté dans un processus du pool : calcule l'empreinte puis génère les tailles manquantes.
+    L'image n'est décodée qu'une fois, de la plus grande à la plus petite taille.
+    Les empreintes perceptuelles sont toujours calculées sur la plus petite miniature, pour rester comparables.
+    """
+    source_path = Path(source)
+    digest = content_hash(source_path)
+    targets = [(size, thumbnail_path(digest, size)) for size in sorted(sizes, reverse=True)]
+    missing = [(size, path) for size, path in targets if force or not path.exists()]
+
+    if missing:
+        missing[0][1].parent.mkdir(parents=True, exist_ok=True)
+        with Image.open(source_path) as img:
+            img.draft("RGB", (missing[0][0], missing[0][0]))
+            img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+            for size, path in missing:
+                img.thumbnail((size, size), Image.Resampling.LANCZOS)
+                tmp_path = path.with_suffix(".tmp")
+                img.save(tmp_path, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY, method=4)
+                tmp_path.replace(path)
+
+    with Image.open(targets[-1][1]) as smallest:
+        return {'content_hash': digest, **compute_hashes(smallest)}
+
+
+class ThumbnailService:
+    """
+    File de génération de miniatures partagée par le processus Streamlit.
+    Les empreintes calculées sont mémorisées dans l'index de la galerie pour éviter de relire les fichiers.
+    """
+
+    def __init__(self, sizes=None, max_workers=None):
+        self.sizes = tuple(sizes or Config.THUMBNAIL_SIZES)
+        self.max_workers = max_workers or Config.THUMBNAIL_WORKERS
+        self._executor = None
+        self._pending = set()
+        self._failed = {}   # clé -> (taille, mtime_ns) du fichier au moment de la tentative ratée
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # "spawn" : ne pas dupliquer les threads du serveur Streamlit dans les workers
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    @staticmethod
+    def _signature(path: Path) -> tuple | None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def submit(self, source_dir: Path, name: str, force: bool = False) -> bool:
+        """
+        Planifie la génération des miniatures d'une image. Retourne False si elle est déjà en cours,
+        ou si elle a déjà échoué sur ce même contenu (un fichier réécrit depuis l'échec, par exemple
+        une image lue pendant son écriture, est retenté).
+        """
+        key = (str(source_dir), name)
+        signature = self._signature(Path(source_dir) / name)
+        with self._lock:
+            if key in self._pending or (not force and key in self._failed and self._failed[key] == signature):
+                return False
+            self._failed.pop(key, None)
+            self._pending.add(key)
+            future = self._get_executor().submit(_render_thumbnails, str(Path(source_dir) / name), self.sizes, force)
+        future.add_done_callback(lambda f: self._on_done(source_dir, name, signature, f))
+        return True
+
+    def _on_done(self, source_dir: Path, name: str, signature: tuple | None, future):
+        key = (str(source_dir), name)
+        with self._lock:
+            self._pending.discard(key)
+        try:
+            get_gallery_index().set_image_hashes(source_dir, name, future.result())
+        except Exception as e:
+            with self._lock:
+                self._failed[key] = signature
+            print(f"Erreur lors de la création de la miniature de {name}: {e}")
+
+    def backfill(self, source_dir: Path, limit: int = None) -> int:
+        """Planifie toutes les images indexées dont les miniatures n'ont pas encore été produites."""
+        names = get_gallery_index().missing_hashes(source_dir, limit)
+        return sum(self.submit(source_dir, name) for name in names)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def get(self, entry: dict, size: int) -> Path | None:
+        """Chemin de la miniature d'une entrée de l'index si elle existe déjà."""
+        digest = entry.get('content_hash')
+        if not digest:
+            return None
+        path = thumbnail_path(digest, size)
+        return path if path.exists() else None
+
+    def rebuild(self, source_dir: Path, force: bool = True) -> int:
+        """Replanifie la génération des miniatures de toutes les images d'un dossier."""
+        index = get_gallery_index()
+        index.sync(source_dir, force=True)
+        names = [e['name'] for e in index.query(source_dir, show_hidden=True)]
+        return sum(self.submit(source_dir, name, force=force) for name in names)
+
+    def wait(self):
+        """Attend la fin des tâches planifiées (utilisé par la commande en ligne)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def prune_thumbnails(keep_hashes: set) -> int:
+    """Supprime les miniatures dont l'empreinte ne correspond plus à aucune image indexée."""
+    removed = 0
+    if not Config.THUMBNAIL_DIR.exists():
+        return 0
+    for path in Config.THUMBNAIL_DIR.glob(f"*/*.{THUMBNAIL_FORMAT}"):
+        if path.stem.rsplit("_", 1)[0] not in keep_hashes:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+class ThumbnailMemoryCache:
+    """
+    Miniatures encodées servies par la file de génération, partagées par toutes les sessions du processus.
+    LRU borné en octets : la mémoire reste constante quel que soit le nombre de travaux terminés,
+    les sessions ne gardent que des chemins. La clé inclut la date de modification (fichier réécrit = nouvelle entrée).
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes if max_bytes is not None else Config.QUEUE_THUMBNAIL_CACHE_MB * 1024 * 1024
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, size: int) -> bytes | None:
+        """Miniature WebP de `path` (plus grand côté `size`), ou None si l'image est illisible."""
+        try:
+            key = (str(path), os.stat(path).st_mtime_ns, size)
+        except OSError:
+            return None
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+        try:
+            with Image.open(path) as img:
+                img.draft("RGB", (size, size))
+                img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+                img.thumbnail((size, size), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                img.save(buffer, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY, method=4)
+        except Exception as e:
+            print(f"Erreur lors de la création de la miniature de {path}: {e}")
+            return None
+        data = buffer.getvalue()
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = data
+                self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+
+def create_thumbnails_now(source_path: Path, sizes=None) -> str | None:
+    """Génère les miniatures d'une image de façon synchrone dans le processus courant."""
+    try:
+        return _render_thumbnails(str(source_path), tuple(sizes or Config.THUMBNAIL_SIZES))['content_hash']
+    except Exception as e:
+        print(f"Erreur lors de la création de la miniature: {e}")
+        return None
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_thumbnail_service() -> ThumbnailService:
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ThumbnailService()
+        return _service
+
+
+_memory_cache = None
+
+
+def get_thumbnail_memory_cache() -> ThumbnailMemoryCache:
+    global _memory_cache
+    with _service_lock:
+        if _memory_cache is None:
+            _memory_cache = ThumbnailMemoryCache()
+        return _memory_cache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestion des miniatures de la galerie Zenith Pro")
+    parser.add_argument("--rebuild", action="store_true", help="Régénérer toutes les miniatures, même existantes")
+    parser.add_argument("source", nargs="?", help="Dossier d'images (par défaut : GALLERY_PATH ou OUTPUT_DIR)")
+    args = parser.parse_args()
+
+    Config.initialize_project()
+    source = Path(args.source) if args.source else (Config.GALLERY_PATH if Config.GALLERY_PATH and Config.GALLERY_PATH.exists() else Config.OUTPUT_DIR)
+    if not source or not source.exists():
+        parser.error(f"Dossier introuvable : {source}")
+
+    service = get_thumbnail_service()
+    if args.rebuild:
+        count = service.rebuild(source)
+    else:
+        get_gallery_index().sync(source)
+        count = service.backfill(source)
+    print(f"{count} image(s) planifiée(s) dans {source}")
+    service.wait()
+    if args.rebuild:
+        print(f"{prune_thumbnails(get_gallery_index().known_hashes())} miniature(s) orpheline(s) supprimée(s)")
+    print("Miniatures à jour.")
@@ -0,0 +1,70 @@
+# utils/zip_export.py (V1.0 - Export ZIP en flux)
+import io
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from config import Config
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _ChunkSink(io.RawIOBase):
+    """Flux non positionnable : zipfile y écrit, le générateur vide les octets au fur et à mesure."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def iter_zip_stream(files, text_entries=None, chunk_size: int = CHUNK_SIZE):
+    """
+    Génère une archive ZIP morceau par morceau, sans jamais garder plus d'un bloc de fichier en mémoire.
+    `files` : chemins à ajouter (stockés tels quels, les PNG sont déjà compressés).
+    `text_entries` : itérable optionnel de (nom dans l'archive, texte) compressés en DEFLATE.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as zf:
+        for path in files:
+            path = Path(path)
+            if not path.exists():
+                continue
+            info = zipfile.ZipInfo.from_file(path, arcname=path.name)
+            info.compress_type = zipfile.ZIP_STORED
+            with open(path, 'rb') as src, zf.open(info, mode="w", force_zip64=True) as dest:
+                while chunk := src.read(chunk_size):
+                    dest.write(chunk)
+                    if data := sink.drain(): yield data
+            if data := sink.drain(): yield data
+        for arcname, text in (text_entries or []):
+            zf.writestr(zipfile.ZipInfo(arcname, date_time=datetime.now().timetuple()[:6]), text, compress_type=zipfile.ZIP_DEFLATED)
+            if data := sink.drain(): yield data
+    if data := sink.drain(): yield data
+
+
+def export_zip(files, text_entries=None, dest: Path = None) -> Path:
+    """Écrit l'archive sur disque (dossier logs/exports par défaut) en flux et retourne son chemin."""
+    if dest is None:
+        export_dir = Config.LOG_DIR / "exports"
+        export_dir.mkdir(parents=True, exist_ok=True)
+        dest = export_dir / f"zenith_export_{datetime.now():%Y%m%d_%H%M%S}.zip"
+    tmp_path = dest.with_suffix(".part")
+    with open(tmp_path, 'wb') as f:
+        for chunk in iter_zip_stream(files, text_entries):
+            f.write(chunk)
+    tmp_path.replace(dest)
+    return dest